@@ -1,13 +1,55 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
 import json
+from functools import wraps
 from flask_cors import CORS
 from .backend import BackendSession
+from .jobs import TabBusyError
+from .sessions import SessionManager, session_memory
+from .transport import BINARY_MIMETYPE
 
 app  = Flask(__name__)
 CORS(app, resources={r'/*': {'origins': '*'}})
 host, port = 'localhost', 6969
 
-session = BackendSession(app)
+sessions = SessionManager(app)
+
+
+def get_session_id() -> str | None:
+    """Session id from the X-Session-Id header or from the session query parameter (for EventSource),
+    requests without it share the default session."""
+    return request.headers.get('X-Session-Id') or request.args.get('session')
+
+def with_session(lock: bool = True):
+    """Passes the session of the request as the first argument, the session lock is held during the call.
+    Requests changing a tab with a running fit job are rejected with 409."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # the session is not evicted until the request is handled
+            with sessions.use(get_session_id()) as session:
+                try:
+                    if not lock:
+                        return f(session, *args, **kwargs)
+                    with session.lock:
+                        return f(session, *args, **kwargs)
+                except TabBusyError as e:
+                    return Response(response=json.dumps(str(e)), status=409)
+        return wrapper
+    return decorator
+
+
+def get_transport() -> dict | None:
+    """Binary transport options from the query string (?format=binary&dtype=float32&compression=zlib&level=1),
+    None for JSON responses."""
+    if request.args.get('format') != 'binary':
+        return None
+    return dict(dtype=request.args.get('dtype'), compression=request.args.get('compression'),
+                level=request.args.get('level', type=int))
+
+def make_response(data, status: int = 201) -> Response:
+    if isinstance(data, bytes):
+        return Response(response=data, status=status, mimetype=BINARY_MIMETYPE)
+    return Response(response=json.dumps(data), status=status)
 
 
 # @app.route('/api')
@@ -20,48 +62,58 @@ def ping():
     return Response(response=json.dumps("pong"), status=201)
 
 @app.route("/api/get_datasets", methods=["GET"])
-def r_get_datasets():
-    return_data = session.get_datasets(session.datasets)
-    return Response(response=json.dumps(return_data), status=201)
+@with_session()
+def r_get_datasets(session: BackendSession):
+    return_data = session.get_datasets(session.datasets, get_transport(), request.args.get('since', type=int))
+    return make_response(return_data)
 
 
 @app.route("/api/post_datasets", methods=["POST"])
-def r_post_datasets():
+@with_session()
+def r_post_datasets(session: BackendSession):
     if request.method == "POST":
-        received_data = request.get_json()
-        return_data = session.post_datasets(received_data)
+        if request.mimetype == BINARY_MIMETYPE:
+            return_data = session.post_datasets_frame(request.get_data())
+        else:
+            return_data = session.post_datasets(request.get_json())
         return Response(response=json.dumps(return_data), status=201)
 
 
 @app.route("/api/add_dataset/<index>/<tab_index>", methods=["POST"])
-def r_add_dataset(index: str, tab_index: str):
+@with_session()
+def r_add_dataset(session: BackendSession, index: str, tab_index: str):
     if request.method == "POST":
         session.add_dataset(int(index), int(tab_index))
         return Response(status=201)
     
 @app.route("/api/remove_dataset/<index>/<tab_index>", methods=["POST"])
-def r_remove_dataset(index: str, tab_index: str):
+@with_session()
+def r_remove_dataset(session: BackendSession, index: str, tab_index: str):
     if request.method == "POST":
         session.remove_dataset(int(index), int(tab_index))
         return Response(status=201)
     
 
 @app.route("/api/perform/<operation>/<tab_index>", methods=["POST"])
-def r_perform_operation(operation: str, tab_index: str):
+@with_session()
+def r_perform_operation(session: BackendSession, operation: str, tab_index: str):
     if request.method == "POST":
         received_data = request.get_json()
-        return_data = session.perform_operation(operation, int(tab_index), **received_data)
-        return Response(response=json.dumps(return_data), status=201)
+        return_data = session.perform_operation(operation, int(tab_index), get_transport(),
+                                                request.args.get('since', type=int), **received_data)
+        return make_response(return_data)
     
 @app.route("/api/update_model_options/<tab_index>", methods=["POST"])
-def r_update_model_options(tab_index: str):
+@with_session()
+def r_update_model_options(session: BackendSession, tab_index: str):
     if request.method == "POST":
         received_data = request.get_json()
         return_data = session.update_model_options(int(tab_index), **received_data)
         return Response(response=json.dumps(return_data), status=201)
     
 @app.route("/api/estimate_chirp_params/<tab_index>", methods=["POST"])
-def r_estimate_chirp_params(tab_index: str):
+@with_session()
+def r_estimate_chirp_params(session: BackendSession, tab_index: str):
     if request.method == "POST":
         received_data = request.get_json()
         return_data = session.estimate_chirp_params(int(tab_index), **received_data)
@@ -69,43 +121,103 @@ def r_estimate_chirp_params(tab_index: str):
         return Response(response=json_data, status=201)
     
 @app.route("/api/update_model_param/<tab_index>", methods=["POST"])
-def r_update_model_param(tab_index: str):
+@with_session()
+def r_update_model_param(session: BackendSession, tab_index: str):
     if request.method == "POST":
         received_data = request.get_json()
         session.update_model_param(int(tab_index), received_data)
         return Response(status=201)
 
 @app.route("/api/transpose_dataset/<index>", methods=["POST"])
-def r_transpose(index: str):
+@with_session()
+def r_transpose(session: BackendSession, index: str):
     if request.method == "POST":
         session.transpose_dataset(int(index))
         return Response(status=201)
     
 @app.route("/api/fit_model/<tab_index>", methods=["POST"])
-def r_fit_model(tab_index: str):
+@with_session()
+def r_fit_model(session: BackendSession, tab_index: str):
+    if request.method == "POST":
+        received_data = request.get_json(silent=True) or {}
+        return_data = session.fit_model(int(tab_index), bool(received_data.get('warm_start', False)),
+                                        transport=get_transport())
+        return make_response(return_data)
+    
+@app.route("/api/fit_model_async/<tab_index>", methods=["POST"])
+@with_session()
+def r_fit_model_async(session: BackendSession, tab_index: str):
+    if request.method == "POST":
+        received_data = request.get_json(silent=True) or {}
+        return_data = session.submit_fit(int(tab_index), bool(received_data.get('warm_start', False)))
+        return Response(response=json.dumps(return_data), status=201)
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@with_session(lock=False)
+def r_get_job(session: BackendSession, job_id: str):
+    return_data = session.get_job(job_id)
+    if return_data is None:
+        return Response(status=404)
+    return Response(response=json.dumps(return_data), status=200)
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+@with_session(lock=False)
+def r_cancel_job(session: BackendSession, job_id: str):
     if request.method == "POST":
-        return_data = session.fit_model(int(tab_index))
+        return_data = session.cancel_job(job_id)
+        if return_data is None:
+            return Response(status=404)
         return Response(response=json.dumps(return_data), status=201)
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+@with_session(lock=False)
+def r_job_events(session: BackendSession, job_id: str):
+    job = session.jobs.get(job_id)
+    if job is None:
+        return Response(status=404)
+
+    def stream():
+        for state in job.events():
+            # comment line keeps the connection alive
+            yield ": keep-alive\n\n" if state is None else f"data: {json.dumps(state)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream", headers={'Cache-Control': 'no-cache'})
     
 @app.route("/api/simulate_model/<tab_index>", methods=["POST"])
-def r_simulate_model(tab_index: str):
+@with_session()
+def r_simulate_model(session: BackendSession, tab_index: str):
     if request.method == "POST":
-        return_data = session.simulate_model(int(tab_index))
-        return Response(response=json.dumps(return_data), status=201)
+        return_data = session.simulate_model(int(tab_index), get_transport())
+        return make_response(return_data)
     
 @app.route("/api/set_model/<tab_index>/<model_name>", methods=["POST"])
-def r_set_model(tab_index: str, model_name: str):
+@with_session()
+def r_set_model(session: BackendSession, tab_index: str, model_name: str):
     if request.method == "POST":
         session.set_model(int(tab_index), model_name)
         return Response(status=201)
     
     
+@app.route("/api/session", methods=["GET"])
+@with_session()
+def r_session_info(session: BackendSession):
+    return_data = dict(id=session.id, memory=session_memory(session), datasets=session.datasets.length(),
+                       tabs=len(session.tabs))
+    return Response(response=json.dumps(return_data), status=200)
+
+@app.route("/api/close_session", methods=["POST"])
+def r_close_session():
+    if request.method == "POST":
+        sessions.close(get_session_id() or 'default')
+        return Response(status=201)
+
 @app.route("/api/clear", methods=["POST"])
-def r_clear():
+@with_session()
+def r_clear(session: BackendSession):
     if request.method == "POST":
         session.clear()
         return Response(status=201)
 
 
 if __name__ == '__main__':
-    app.run(host, port)
\ No newline at end of file
+    app.run(host, port, threaded=True)
\ No newline at end of file
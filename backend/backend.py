@@ -1,5 +1,7 @@
 
 import sys, os
+import threading
+import time
 
 import numpy as np
 import base64
@@ -13,6 +15,10 @@ except ImportError:
     from pyTSA import Dataset, Datasets, FirstOrderModel, FirstOrderLPLModel, DelayedFluorescenceModel, FirstSecondOrderModel
 
 from lmfit import Parameters, Parameter
+from typing import Callable
+
+from .jobs import JobManager, TabBusyError
+from .transport import pack_frame, unpack_frame
 
 fname = "HAP-3tBuTPA toluene degassed.txt"
 # fname = "test.txt"
@@ -67,24 +73,39 @@ def put_matrix_data(arr: np.ndarray):
 
 class BackendSession(object):
 
-    def __init__(self, app):
+    def __init__(self, app, session_id: str = 'default'):
         self.datasets: Datasets = Datasets()
         self.tabs = [Datasets()]
         self.app = app
+        self.jobs = JobManager()
+
+        self.id = session_id
+        # held while a request of this session is handled, except of the fit jobs, which run without it,
+        # requests changing the tab of a running fit job are rejected by _check_idle
+        self.lock = threading.RLock()
+        self.last_access = time.time()
+        # number of requests using the session, guarded by the lock of the SessionManager
+        self.requests = 0
 
         # d = Dataset.from_file(fname, transpose=True, delimiter='\t')
         # self.datasets.append(d)
 
     def clear(self):
+        self.jobs.cancel_all()
         self.datasets.clear()
         self.tabs = [Datasets()]
 
+    def _check_idle(self, tab_index: int):
+        if self.jobs.running(tab_index):
+            raise TabBusyError(f"A fit is running for tab {tab_index}.")
+
     def _append_tabs(self, tab_index):
         if (tab_index >= len(self.tabs)):
             for i in range(tab_index - len(self.tabs) + 1):
                 self.tabs.append(Datasets())
 
     def add_dataset(self, index: int, tab_index: int):
+        self._check_idle(tab_index)
         self._append_tabs(tab_index)
         ds = self.tabs[tab_index]
         ds.append(self.datasets[index].copy(), key=index)
@@ -92,11 +113,14 @@ class BackendSession(object):
         # print(ds.model)
 
     def remove_dataset(self, index: int, tab_index: int):
+        self._check_idle(tab_index)
         self.tabs[tab_index].remove(key=index)
 
-    def perform_operation(self, op: str, tab_index: int, **kwargs):
+    def perform_operation(self, op: str, tab_index: int, transport: dict | None = None, since: int | None = None,
+                          **kwargs):
+        self._check_idle(tab_index)
         getattr(self.tabs[tab_index], op)(**kwargs)
-        return self.get_datasets(self.tabs[tab_index])
+        return self.get_datasets(self.tabs[tab_index], transport, since)
 
     def transpose_dataset(self, index: int):
         self.datasets[index].transpose()
@@ -111,26 +135,65 @@ class BackendSession(object):
 
         return ""
     
-    def get_datasets(self, datasets: Datasets):
+    def post_datasets_frame(self, buffer: bytes):
+        arrays, meta = unpack_frame(buffer)
+
+        for i, name in enumerate(meta['names']):
+            dataset = Dataset(arrays[f'{i}/matrix'].astype(np.float64), arrays[f'{i}/times'].astype(np.float64),
+                              arrays[f'{i}/wavelengths'].astype(np.float64), name=name)
+            self.datasets.append(dataset)
+
+        return ""
+    
+    def _changed_arrays(self, d: Dataset, since: int | None) -> dict[str, np.ndarray]:
+        """Arrays of the dataset that changed after the since version, all arrays if since is None."""
+        versions = d.versions
+        return {name: getattr(d, name) for name in ('times', 'wavelengths', 'matrix')
+                if since is None or versions[name] > since}
+
+    def get_datasets_frame(self, datasets: Datasets, transport: dict, since: int | None = None) -> bytes:
+        """Datasets packed to a binary frame, arrays are named '{index}/times', '{index}/wavelengths'
+        and '{index}/matrix'. Only arrays changed after the since version are included."""
+        arrays = {}
+        for i, d in enumerate(datasets):
+            arrays.update({f'{i}/{name}': arr for name, arr in self._changed_arrays(d, since).items()})
+
+        meta = dict(names=[d.name for d in datasets],
+                    datasets=[dict(uid=d.uid, version=d.version) for d in datasets],
+                    version=max((d.version for d in datasets), default=0))
+
+        return pack_frame(arrays, meta, **transport)
+    
+    def get_datasets(self, datasets: Datasets, transport: dict | None = None, since: int | None = None):
+        """All datasets, each with uid and version. If since version is given, the arrays that
+        did not change after it are omitted. Top level version is the version to ask for next time."""
+
+        if transport is not None:
+            return self.get_datasets_frame(datasets, transport, since)
+
         def _put_dataset(d: Dataset):
             obj = {
-                'times': arr2json(d.times),
-                'wavelengths': arr2json(d.wavelengths),
-                'matrix': put_matrix_data(d.matrix),
-                'name': d.name
+                'name': d.name,
+                'uid': d.uid,
+                'version': d.version
             }
 
+            for name, arr in self._changed_arrays(d, since).items():
+                obj[name] = put_matrix_data(arr) if name == 'matrix' else arr2json(arr)
+
             return obj
 
         data = {
             'data': {
-                'datasets': [_put_dataset(d) for d in datasets]
+                'datasets': [_put_dataset(d) for d in datasets],
+                'version': max((d.version for d in datasets), default=0)
             }
         }
 
         return data
     
     def set_model(self, tab_index: int, model_name: str):
+        self._check_idle(tab_index)
         self._append_tabs(tab_index)
 
         model_map = {
@@ -160,6 +223,7 @@ class BackendSession(object):
 
     
     def update_model_options(self, tab_index: int, **options):
+        self._check_idle(tab_index)
         self._append_tabs(tab_index)
         model = self.tabs[tab_index].model
 
@@ -167,11 +231,13 @@ class BackendSession(object):
         return self._get_fit_params(model.params)
     
     def estimate_chirp_params(self, tab_index: int, **data):
+        self._check_idle(tab_index)
         model = self.tabs[tab_index].model
         model.estimate_chirp(data['x'], data['y'])
         return self._get_fit_params(model.params)
 
     def update_model_param(self, tab_index: int, param_data: dict):
+        self._check_idle(tab_index)
         self._append_tabs(tab_index)
         
         model = self.tabs[tab_index].model
@@ -181,7 +247,7 @@ class BackendSession(object):
         model.params[name].value = float(param_data['value'])
         model.params[name].vary = not param_data['fixed']
 
-    def _put_fit_matrices(self, model: FirstOrderModel):
+    def _get_fit_matrices(self, model: FirstOrderModel) -> dict[str, np.ndarray]:
         # export interface IFitData {
         #   matrices: {
         #     CfitDAS: IMatrixData,
@@ -197,46 +263,84 @@ class BackendSession(object):
         #   chirpData?: string
         # }
         # print(model.C_opt.shape, model.ST_opt.shape, model.matrix_opt.shape)
-        data = dict(CfitDAS=put_matrix_data(model.C_opt if model.C_opt.ndim == 2 else model.C_opt[0]), 
-                    STfitDAS=put_matrix_data(model.ST_opt),
-                    Dfit=put_matrix_data(model.matrix_opt))
+        data = dict(CfitDAS=model.C_opt if model.C_opt.ndim == 2 else model.C_opt[0], 
+                    STfitDAS=model.ST_opt,
+                    Dfit=model.matrix_opt)
         
         if model.C_EAS is not None:
-            data.update(dict(CfitEAS=put_matrix_data(model.C_EAS if model.C_EAS.ndim == 2 else model.C_EAS[0])))
+            data.update(dict(CfitEAS=model.C_EAS if model.C_EAS.ndim == 2 else model.C_EAS[0]))
 
         if model.ST_EAS is not None:
-            data.update(dict(STfitEAS=put_matrix_data(model.ST_EAS)))
+            data.update(dict(STfitEAS=model.ST_EAS))
 
         if model.C_artifacts is not None:
-            data.update(dict(Cartifacts=put_matrix_data(model.C_artifacts if model.C_artifacts.ndim == 2 else model.C_artifacts[0])))
+            data.update(dict(Cartifacts=model.C_artifacts if model.C_artifacts.ndim == 2 else model.C_artifacts[0]))
 
         if model.ST_artifacts is not None:
-            data.update(dict(STartifacts=put_matrix_data(model.ST_artifacts)))
+            data.update(dict(STartifacts=model.ST_artifacts))
 
         # print(model.C_artifacts, model.ST_artifacts)
 
-        return dict(matrices=data, chirpData=arr2json(model.get_actual_chirp_data()))
+        return data
 
-    def fit_model(self, tab_index: int):
-        if self.tabs[tab_index].model.dataset is None:
-            return self._get_fit_params(self.tabs[tab_index].model.params)
-        
-        m = self.tabs[tab_index].model
-        m.fit()
+    def _put_fit_matrices(self, model: FirstOrderModel, transport: dict | None = None, params: Parameters | None = None):
+        """Fit matrices and chirp data (and params if given) as JSON serializable dictionary or
+        as a binary frame if transport options are given."""
+
+        matrices = self._get_fit_matrices(model)
+        chirp_data = model.get_actual_chirp_data()
+        params_data = {} if params is None else self._get_fit_params(params)
 
-        data: dict = self._put_fit_matrices(m)
-        data.update(self._get_fit_params(m.params))
+        if transport is not None:
+            return pack_frame(dict(matrices, chirpData=chirp_data), params_data, **transport)
 
+        data = dict(matrices={key: put_matrix_data(arr) for key, arr in matrices.items()}, chirpData=arr2json(chirp_data))
+        data.update(params_data)
         return data
+
+    def _fit(self, model: FirstOrderModel, warm_start: bool = False, iter_cb: Callable | None = None,
+             transport: dict | None = None):
+        if model.dataset is None:
+            return self._get_fit_params(model.params)
+
+        model.fit(warm_start=warm_start, iter_cb=iter_cb)
+
+        return self._put_fit_matrices(model, transport, model.params)
+
+    def fit_model(self, tab_index: int, warm_start: bool = False, iter_cb: Callable | None = None,
+                  transport: dict | None = None):
+        self._check_idle(tab_index)
+        return self._fit(self.tabs[tab_index].model, warm_start, iter_cb, transport)
+    
+    def submit_fit(self, tab_index: int, warm_start: bool = False) -> dict:
+        """Runs the fit in a worker thread, returns the job id. The session lock is not held during
+        the fit, other tabs and datasets of the session can be used, changes of the fitted tab are
+        rejected until the job is done."""
+        model = self.tabs[tab_index].model
+
+        def target(iter_cb):
+            return self._fit(model, warm_start, iter_cb)
+
+        job = self.jobs.submit(target, tab_index)
+        return dict(job_id=job.id)
+    
+    def get_job(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        return None if job is None else job.state()
+    
+    def cancel_job(self, job_id: str) -> dict | None:
+        job = self.jobs.cancel(job_id)
+        return None if job is None else job.state(include_result=False)
     
-    def simulate_model(self, tab_index: int):
+    def simulate_model(self, tab_index: int, transport: dict | None = None):
+        self._check_idle(tab_index)
         if self.tabs[tab_index].model.dataset is None:
             return self._get_fit_params(self.tabs[tab_index].model.params)
         
         m = self.tabs[tab_index].model
         m.simulate()
 
-        return self._put_fit_matrices(m)
+        return self._put_fit_matrices(m, transport)
 
 
 def get_data():
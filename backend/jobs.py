@@ -0,0 +1,166 @@
+import threading
+import time
+import traceback
+import uuid
+from enum import Enum, auto
+from typing import Callable, Iterator
+
+import numpy as np
+
+
+class JobStatus(Enum):
+    PENDING = auto()
+    RUNNING = auto()
+    FINISHED = auto()
+    CANCELLED = auto()
+    FAILED = auto()
+
+
+class TabBusyError(RuntimeError):
+    """Raised if a tab is changed or fitted while a fit job of the tab is running."""
+
+
+class FitJob(object):
+    """Fit running in a worker thread. Progress (iteration, cost and current params) is updated
+    from the lmfit iter_cb which also aborts the fit when cancellation was requested.
+
+    target is called as target(iter_cb) and its return value is stored as the job result."""
+
+    def __init__(self, target: Callable, tab_index: int):
+        self.id = uuid.uuid4().hex
+        self.tab_index = tab_index
+        self.status = JobStatus.PENDING
+        self.iteration = 0
+        self.cost: float | None = None
+        self.params: dict = {}
+        self.result = None
+        self.error: str | None = None
+        self.started: float | None = None
+        self.finished: float | None = None
+
+        # incremented with each change of the job state, event streams wait for it
+        self.version = 0
+
+        self._target = target
+        self._cancel_event = threading.Event()
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"fit-job-{self.id}", daemon=True)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.FINISHED, JobStatus.CANCELLED, JobStatus.FAILED)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Requests the cancellation, the fit is aborted at the next function evaluation."""
+        self._cancel_event.set()
+
+    def _update(self, **attrs):
+        with self._changed:
+            for key, value in attrs.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def _iter_cb(self, params, iter, resid, *args, **kws) -> bool:
+        self._update(iteration=iter, cost=0.5 * float(np.nansum(resid ** 2)), params=params.valuesdict())
+        return self._cancel_event.is_set()
+
+    def _run(self):
+        self._update(status=JobStatus.RUNNING, started=time.time())
+        try:
+            result = self._target(self._iter_cb)
+        except Exception:
+            self._update(status=JobStatus.FAILED, error=traceback.format_exc(), finished=time.time())
+            return
+
+        status = JobStatus.CANCELLED if self._cancel_event.is_set() else JobStatus.FINISHED
+        self._update(status=status, result=result, finished=time.time())
+
+    def state(self, include_result: bool = True) -> dict:
+        with self._changed:
+            obj = {
+                'job_id': self.id,
+                'tab_index': self.tab_index,
+                'status': self.status.name.lower(),
+                'iteration': self.iteration,
+                'cost': self.cost,
+                'params': self.params,
+                'error': self.error,
+                'elapsed': None if self.started is None else (self.finished or time.time()) - self.started
+            }
+
+            if include_result and self.done:
+                obj['result'] = self.result
+
+            return obj
+
+    def events(self, min_interval: float = 0.1, keep_alive: float = 15) -> Iterator[dict | None]:
+        """Yields the job state whenever it changes, at most once per min_interval seconds. None is yielded
+        if nothing changed within keep_alive seconds. The last yielded state is the final one."""
+
+        last_version = -1
+        while True:
+            with self._changed:
+                changed = self._changed.wait_for(lambda: self.version != last_version, timeout=keep_alive)
+                last_version = self.version
+
+            if not changed:
+                yield None
+                continue
+
+            done = self.done
+            yield self.state(include_result=done)
+            if done:
+                return
+
+            time.sleep(min_interval)
+
+
+class JobManager(object):
+    """Keeps track of fit jobs, one running job per tab is allowed."""
+
+    def __init__(self, max_finished: int = 32):
+        self.max_finished = max_finished
+        self.jobs: dict[str, FitJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, target: Callable, tab_index: int) -> FitJob:
+        with self._lock:
+            if self.running(tab_index):
+                raise TabBusyError(f"A fit is already running for tab {tab_index}.")
+
+            self._remove_finished()
+            job = FitJob(target, tab_index)
+            self.jobs[job.id] = job
+
+        job.start()
+        return job
+
+    def all_done(self) -> bool:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return all(job.done for job in jobs)
+
+    def running(self, tab_index: int) -> bool:
+        return any(job.tab_index == tab_index and not job.done for job in list(self.jobs.values()))
+
+    def get(self, job_id: str) -> FitJob | None:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> FitJob | None:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def cancel_all(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
+
+    def _remove_finished(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.max_finished + 1)]:
+            del self.jobs[job.id]
@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+
+from .backend import BackendSession
+
+
+DEFAULT_SESSION_ID = 'default'
+
+
+def nbytes(*objects) -> int:
+    """Size of numpy arrays held as attributes by the objects, each array (or its base) is counted once."""
+    seen = set()
+    total = 0
+    for obj in objects:
+        if obj is None:
+            continue
+        for value in vars(obj).values():
+            if isinstance(value, np.ndarray):
+                base = value if value.base is None else value.base
+                if id(base) not in seen and isinstance(base, np.ndarray):
+                    seen.add(id(base))
+                    total += base.nbytes
+    return total
+
+
+def session_memory(session: BackendSession) -> int:
+    """Approximate memory used by the datasets and models of the session in bytes."""
+    objects = list(session.datasets)
+    for tab in session.tabs:
+        objects.extend(tab)
+        objects.extend(d.model for d in tab)
+    return nbytes(*objects)
+
+
+class SessionManager(object):
+    """Registry of backend sessions keyed by session id. Each session has its own lock which is held
+    while a request is handled. Sessions idle for longer than idle_timeout seconds are evicted, if the
+    memory used by all sessions exceeds max_memory bytes, the least recently used idle sessions are
+    evicted first. Sessions in use by a request (see use) or with running fit jobs are never evicted."""
+
+    def __init__(self, app, idle_timeout: float = 3600, max_memory: int | None = None,
+                 eviction_interval: float = 60):
+        self.app = app
+        self.idle_timeout = idle_timeout
+        self.max_memory = max_memory
+        self.eviction_interval = eviction_interval
+
+        self.sessions: dict[str, BackendSession] = {}
+        self._lock = threading.Lock()
+        self._last_eviction = time.time()
+
+    def get(self, session_id: str | None = None) -> BackendSession:
+        """Returns the session, new session is created if it does not exist."""
+        with self._lock:
+            return self._get(session_id or DEFAULT_SESSION_ID)
+
+    @contextmanager
+    def use(self, session_id: str | None = None) -> Iterator[BackendSession]:
+        """The same as get, but the session cannot be evicted until the context is exited. Requests use it
+        to protect the session until its lock is acquired."""
+        with self._lock:
+            session = self._get(session_id or DEFAULT_SESSION_ID)
+            session.requests += 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                session.requests -= 1
+                session.last_access = time.time()
+
+    def _get(self, session_id: str) -> BackendSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = BackendSession(self.app, session_id)
+            self.sessions[session_id] = session
+
+        session.last_access = time.time()
+
+        if time.time() - self._last_eviction > self.eviction_interval:
+            self._evict(keep=session_id)
+
+        return session
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+
+        if session is None:
+            return False
+
+        session.jobs.cancel_all()
+        return True
+
+    def memory_usage(self) -> dict[str, int]:
+        with self._lock:
+            sessions = list(self.sessions.items())
+        return {session_id: session_memory(session) for session_id, session in sessions}
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def _evictable(self, session: BackendSession) -> bool:
+        # requests are counted from get until the end, the lock is held while a request is handled
+        if session.requests > 0 or not session.lock.acquire(blocking=False):
+            return False
+        session.lock.release()
+        return session.jobs.all_done()
+
+    def _evict(self, keep: str | None = None):
+        self._last_eviction = now = time.time()
+
+        candidates = sorted(((session.last_access, session_id) for session_id, session in self.sessions.items()
+                             if session_id != keep and self._evictable(session)))
+
+        for last_access, session_id in candidates:
+            if now - last_access > self.idle_timeout:
+                del self.sessions[session_id]
+
+        if self.max_memory is None:
+            return
+
+        memory = {session_id: session_memory(session) for session_id, session in self.sessions.items()}
+        total = sum(memory.values())
+
+        for last_access, session_id in candidates:
+            if total <= self.max_memory:
+                break
+            if session_id in self.sessions:
+                total -= memory[session_id]
+                del self.sessions[session_id]
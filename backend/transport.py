@@ -0,0 +1,91 @@
+"""Compact binary framing of numpy arrays, an alternative to base64 encoded arrays in JSON.
+
+Frame layout:
+
+    b'TSAF' | uint32 header length (little endian) | JSON header (utf-8) | payload
+
+The header holds the (JSON serializable) metadata and for each array its name, dtype, shape, order,
+offset and size in the payload and the codec used to compress it.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+try:  # python >= 3.14
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+
+MAGIC = b'TSAF'
+_PREFIX = struct.Struct('<4sI')
+
+# codec name: (compress(data, level), decompress(data))
+CODECS = {
+    'zlib': (lambda data, level: zlib.compress(data, 1 if level is None else level), zlib.decompress),
+}
+
+if zstd is not None:
+    CODECS['zstd'] = (lambda data, level: zstd.compress(data, level), zstd.decompress)
+
+BINARY_MIMETYPE = 'application/octet-stream'
+
+
+def pack_frame(arrays: dict[str, np.ndarray], meta: dict | None = None, dtype: str | None = None,
+               compression: str | None = None, level: int | None = None) -> bytes:
+    """Packs the arrays and metadata into a binary frame. Floating point arrays are converted
+    to dtype (eg. 'float32') if it is given. compression is one of CODECS or None."""
+
+    if compression is not None and compression not in CODECS:
+        raise ValueError(f"Unknown compression '{compression}', available: {', '.join(CODECS.keys())}.")
+
+    entries = []
+    chunks = []
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        if dtype is not None and np.issubdtype(arr.dtype, np.floating):
+            arr = arr.astype(dtype, copy=False)
+
+        # Fortran ordered arrays (eg. transposed matrices) are sent without a copy
+        order = 'F' if arr.ndim > 1 and arr.flags.f_contiguous and not arr.flags.c_contiguous else 'C'
+        data = np.ascontiguousarray(arr) if order == 'C' else arr.T
+        data = memoryview(data).cast('B') if data.size > 0 else b''
+
+        if compression is not None:
+            data = CODECS[compression][0](data, level)
+
+        entries.append(dict(name=name, dtype=arr.dtype.str, shape=list(arr.shape), order=order,
+                            offset=offset, nbytes=len(data), codec=compression))
+        chunks.append(data)
+        offset += len(data)
+
+    header = json.dumps(dict(arrays=entries, meta={} if meta is None else meta)).encode('utf-8')
+
+    return b''.join([_PREFIX.pack(MAGIC, len(header)), header, *chunks])
+
+
+def unpack_frame(buffer: bytes) -> tuple[dict[str, np.ndarray], dict]:
+    """Unpacks the frame, returns arrays and metadata. Uncompressed arrays are read-only views of the buffer."""
+
+    magic, header_length = _PREFIX.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Data are not a binary frame.")
+
+    start = _PREFIX.size + header_length
+    header = json.loads(bytes(buffer[_PREFIX.size:start]).decode('utf-8'))
+    view = memoryview(buffer)
+
+    arrays = {}
+    for entry in header['arrays']:
+        data = view[start + entry['offset']:start + entry['offset'] + entry['nbytes']]
+        if entry['codec'] is not None:
+            data = CODECS[entry['codec']][1](data)
+
+        arr = np.frombuffer(data, dtype=np.dtype(entry['dtype']))
+        arrays[entry['name']] = arr.reshape(entry['shape'], order=entry['order'])
+
+    return arrays, header['meta']
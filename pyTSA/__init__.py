@@ -1,10 +1,11 @@
 from .dataset import Dataset
-from .datasets import Datasets
+from .datasets import Datasets, ExecutorType
 
 from .kineticmodel.firstorder import *
 from .kineticmodel.varorder import *
 from .kineticmodel.target import *
-from .kineticmodel.kineticmodel import IrfType, ChirpType, VariableFwhmType, WeightType
+from .kineticmodel.kineticmodel import IrfType, ChirpType, VariableFwhmType, WeightType, JacobianType, ResidualType, KernelBackend, ProfileCacheInfo, ParameterVector, ParameterLayout
 from .plot import *
 from .mathfuncs import fi, find_nearest
+from .fileio import load_matrix
 from .plot import COLORS
\ No newline at end of file
@@ -1,5 +1,12 @@
 
-from typing import Any
+from typing import Any, Callable, Iterator
+from functools import wraps
+import inspect
+import io
+import itertools
+import json
+import tempfile
+import uuid
 import numpy as np
 from scipy.linalg import svd
 from scipy.interpolate import interp1d
@@ -15,13 +22,54 @@ from numpy import ma
 
 
 from .kineticmodel.kineticmodel import KineticModel
-from .mathfuncs import crop_data, crop_data_idx, fi, chirp_correction
+from .mathfuncs import fi, chirp_correction
+from .fileio import load_matrix, load_TRE_ICCD, racc, rexposure, save_table, write_table, EXACT_PRECISION
 from .plot import plot_data_ax, plot_SADS_ax, plot_spectra_ax, plot_traces_onefig_ax, dA_unit, MinorSymLogLocator, plot_kinetics_ax
 
 
-import re
-racc = re.compile(r"(\d+)acc")
-rexposure = re.compile(r"(\d+\.?\d*)exp")
+# versions are shared by all datasets, so a version is never reused, even by a new dataset
+_version_counter = itertools.count(1)
+
+# names of the operations recorded to the operation log, only these can be replayed
+LOGGED_OPERATIONS: set[str] = set()
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, slice):
+        return [value.start, value.stop, value.step]
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _logged(method: Callable) -> Callable:
+    """Records the operation and its arguments to the operation log of the dataset."""
+    signature = inspect.signature(method)
+    LOGGED_OPERATIONS.add(method.__name__)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        result = method(self, *args, **kwargs)
+        self.operations.append(dict(op=method.__name__,
+                                    kwargs={key: _jsonable(value) for key, value in arguments.items() if key != 'self'}))
+        return result
+
+    return wrapper
+
+
+def _as_index(idx: np.ndarray) -> slice | np.ndarray:
+    """Evenly spaced increasing indexes as slice (basic indexing returns a view), otherwise the array."""
+    if idx.shape[0] == 0:
+        return slice(0, 0)
+    step = idx[1] - idx[0] if idx.shape[0] > 1 else 1
+    if step > 0 and np.all(np.diff(idx) == step):
+        return slice(int(idx[0]), int(idx[-1]) + 1, int(step))
+    return idx
 
 
 class Dataset(object):
@@ -66,8 +114,51 @@ class Dataset(object):
         self._ICA_filter = value
         self._set_D()
 
+    @property
+    def matrix(self) -> np.ndarray:
+        """Actual data matrix (times x wavelengths), pending selections (crop, reduce, removed scans, ...) are
+        applied at once on the first access."""
+        if self._selection is not None:
+            rows, cols = (_as_index(idx) for idx in self._selection)
+            self._selection = None
+            if isinstance(rows, np.ndarray) and isinstance(cols, np.ndarray):
+                self._matrix = self._matrix[np.ix_(rows, cols)]
+            else:
+                self._matrix = self._matrix[rows, cols]
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, value: np.ndarray):
+        self._matrix = value
+        self._selection = None
+
+    @property
+    def matrix_fac(self) -> np.ndarray:
+        """Factored matrix, same as the matrix."""
+        return self.matrix
+
+    @property
+    def version(self) -> int:
+        """Increases each time the data (matrix or axes) change, used by models to invalidate cached quantities."""
+        return self._version
+
+    @property
+    def versions(self) -> dict[str, int]:
+        """Versions of matrix, times and wavelengths, the version of an axis increases only if the axis changed."""
+        return dict(self._versions)
+
+    def _update_versions(self):
+        self._version = next(_version_counter)
+        self._versions['matrix'] = self._version
+
+        for name in ('times', 'wavelengths'):
+            axis = getattr(self, name)
+            if not np.array_equal(axis, self._axes[name]):
+                self._versions[name] = self._version
+                self._axes[name] = axis.copy()
+
     def _set_D(self):
-        self.matrix_fac = self.matrix
+        self._update_versions()
         # if self.Yr is None:
         #     self.Yr = self.matrix
         # self.matrix_fac = self.matrix.copy() if self._SVD_filter else self.matrix.copy()
@@ -95,60 +186,108 @@ class Dataset(object):
     @classmethod
     def from_file(cls, fname: str, transpose: bool = False, load_TRE_ICCD = False, **kwargs):
 
+        if os.path.isdir(fname):
+            # kwargs are passed to from_npy (eg. out_of_core)
+            d = cls.from_npy(fname, **kwargs)
+            if transpose:
+                d.transpose()
+            return d
+
         if load_TRE_ICCD:
-            t, w, mat = Dataset.load_TRE_ICCD(fname)
+            # kwargs are passed to load_TRE_ICCD (eg. nw, out)
+            t, w, mat = Dataset.load_TRE_ICCD(fname, **kwargs)
+            if transpose:
+                [t, w] = [w, t]
+                mat = mat.T
         else:
-            data = np.genfromtxt(fname, dtype=np.float64, filling_values=np.nan,  **kwargs)
-
-            t = data[1:, 0]
-            w = data[0, 1:]
-            mat = data[1:, 1:]
-
-        if transpose:
-            [t, w] = [w, t]
-            mat = mat.T
+            # kwargs are passed to load_matrix (eg. delimiter)
+            t, w, mat = load_matrix(fname, transpose=transpose, **kwargs)
 
         return cls(mat, t, w, filepath=fname)
     
     @staticmethod
-    def load_TRE_ICCD(filename):
-
-        nw = 1024
-    
-        _dir, fname = os.path.split(filename)   # get dir and filename
-        fname, _ = os.path.splitext(fname)  # get filename without extension
-
-        data = np.genfromtxt(filename, delimiter=',', dtype=np.float64, usecols=(4, 5, 9, 10))
-        ns = int(data.shape[0] / nw)
-        
-        times = np.empty(ns, dtype=float)
-        wavelengths = data[:nw, 1]
-        D = np.empty((ns, nw), dtype=float)
-
-        macc = racc.search(fname)
-        mexp = rexposure.search(fname)
-
-        acc = 1  # number of accumulations
-        exp_time = 1
-        if macc is not None:
-            acc = int(macc.group(1))
-
-        if mexp is not None:
-            exp_time = float(mexp.group(1))
-        
-        # print(f"File: {fname},\nExposure time: {exp_time}, Number of accumulations: {acc}\n")
+    def load_TRE_ICCD(filename, nw: int | None = None, out: str | np.ndarray | None = None, chunk_size: int = 256):
+        """Loads time resolved emission data from ICCD, see fileio.load_TRE_ICCD."""
+        return load_TRE_ICCD(filename, nw, out, chunk_size)
 
-        for i in range(ns):
-            exp_time_from_data = data[i * nw, -2]   # exposure time
-            exp_time = exp_time if np.isnan(exp_time_from_data) else exp_time_from_data   # if exposure time is not present in the datafile, 0.45 value is used
-            times[i] = data[i * nw, -1]
-            D[i, :] = data[i*nw:(i+1)*nw, 0] / (exp_time * acc)   # divide by exposure time and by number of accumulations used
-            # D[i, :] = data[i*nw:(i+1)*nw, 0] / acc   # divide by exposure time and by number of accumulations used
-
-        return times, wavelengths, D
+    @classmethod
+    def from_npy(cls, dirpath: str, mmap: bool = True, out_of_core: bool = False, block_size: int = 1024):
+        """Loads the dataset saved by save_npy. The matrix is memory-mapped (read only) if mmap is True,
+        it is copied to memory only when it is modified. If out_of_core is True, the modified copy is
+        memory-mapped to a temporary file in dirpath and processed in blocks of block_size time rows."""
+
+        with open(os.path.join(dirpath, 'dataset.json'), 'r', encoding='utf8') as f:
+            meta = json.load(f)
+
+        mat = np.load(os.path.join(dirpath, 'matrix.npy'), mmap_mode='r' if mmap else None)
+        t = np.asarray(meta['times'], dtype=np.float64)
+        w = np.asarray(meta['wavelengths'], dtype=np.float64)
+
+        d = cls(mat, t, w, filepath=dirpath, name=meta['name'])
+        d.mask = [list(m) for m in meta['mask']]
+        if out_of_core:
+            d.work_dir = dirpath
+            d.block_size = block_size
+        return d
+
+    def save_npy(self, dirpath: str):
+        """Saves the current matrix to a directory as matrix.npy with dataset.json sidecar which contains
+        name, times, wavelengths and mask. Load the dataset with Dataset.from_npy."""
+
+        os.makedirs(dirpath, exist_ok=True)
+        mat = np.lib.format.open_memmap(os.path.join(dirpath, 'matrix.npy'), mode='w+', dtype=np.float64,
+                                        shape=self.matrix.shape)
+        for block in self._blocks():
+            mat[block] = self.matrix[block]
+        mat.flush()
+        del mat
+
+        meta = dict(name=self.name, times=self.times.tolist(), wavelengths=self.wavelengths.tolist(),
+                    mask=[[int(i) for i in m] for m in self.mask])
+
+        with open(os.path.join(dirpath, 'dataset.json'), 'w', encoding='utf8') as f:
+            json.dump(meta, f)
 
     def copy(self):
-        return Dataset(self.matrix.copy(), self.times.copy(), self.wavelengths.copy(), filepath=self.filepath, name=self.name)
+        matrix = self._copy_matrix(self.matrix)
+        if self.work_dir is not None:
+            # the copy is memory-mapped in work_dir and shared as read only original matrix, as in from_npy
+            matrix.flags.writeable = False
+        d = Dataset(matrix, self.times.copy(), self.wavelengths.copy(), filepath=self.filepath, name=self.name)
+        d.work_dir = self.work_dir
+        d.block_size = self.block_size
+        return d
+
+    def _blocks(self, n_rows: int | None = None) -> Iterator[slice]:
+        """Slices of block_size time rows of the matrix (or of n_rows), one slice if block_size is None."""
+        n_rows = self.matrix.shape[0] if n_rows is None else n_rows
+        step = max(n_rows if self.block_size is None else self.block_size, 1)
+        for start in range(0, n_rows, step):
+            yield slice(start, min(start + step, n_rows))
+
+    def _new_matrix(self, shape: tuple[int, int]) -> np.ndarray:
+        """Empty matrix, memory-mapped to an anonymous temporary file in work_dir if it is set. The file is
+        removed when the last view of the matrix is released."""
+        if self.work_dir is None:
+            return np.empty(shape, dtype=np.float64)
+
+        with tempfile.TemporaryFile(dir=self.work_dir) as f:
+            return np.memmap(f, dtype=np.float64, mode='w+', shape=shape)
+
+    def _copy_matrix(self, matrix: np.ndarray) -> np.ndarray:
+        new_matrix = self._new_matrix(matrix.shape)
+        for block in self._blocks(matrix.shape[0]):
+            new_matrix[block] = matrix[block]
+        return new_matrix
+
+    def _original_matrix(self) -> np.ndarray:
+        return self.matrix_o if not self.matrix_o.flags.writeable else self._copy_matrix(self.matrix_o)
+
+    def _ensure_own_matrix(self):
+        """Copies the matrix if it is shared with the original (or read only) matrix, must be called before
+        the matrix is modified in place."""
+        if np.may_share_memory(self.matrix, self.matrix_o) or not self.matrix.flags.writeable:
+            self.matrix = self._copy_matrix(self.matrix)
 
     def __init__(self, matrix: np.ndarray, times: np.ndarray, wavelengths: np.ndarray,
                  filepath: str | None = None, name: str | None = None):
@@ -160,11 +299,29 @@ class Dataset(object):
         self.times_o: np.ndarray = times
         self.wavelengths_o: np.ndarray = wavelengths
 
+        # out-of-core processing, modified copies of the matrix are memory-mapped to temporary files in work_dir
+        # (kept in memory if None), in-place operations and least squares fits go over blocks of block_size
+        # time rows (whole matrix at once if None)
+        self.work_dir: str | None = None
+        self.block_size: int | None = None
+
         # actual data matrix whose dimensions can be different
         self.wavelengths: np.ndarray = self.wavelengths_o.copy()  # dim = w
         self.times: np.ndarray = self.times_o.copy()  # dim = t
-        self.matrix: np.ndarray = self.matrix_o.copy()  # dim = t x w   # original data
-        self.matrix_fac: np.ndarray = self.matrix   # factored matrix
+        # read only original matrix (eg. memory-mapped by from_npy) is shared until it is modified
+        # (see _ensure_own_matrix), writable matrix of the caller is copied
+        self.matrix: np.ndarray = self._original_matrix()  # dim = t x w   # original data
+        # pending row and column indexes of the matrix, see _select
+        self._selection: tuple[np.ndarray, np.ndarray] | None = None
+
+        # log of the preprocessing operations applied after the original data were loaded, see replay
+        self.operations: list[dict] = []
+
+        # unique identifier, used together with versions for transfers of changed data only
+        self.uid: str = uuid.uuid4().hex
+        self._version: int = next(_version_counter)
+        self._versions: dict[str, int] = dict(matrix=self._version, times=self._version, wavelengths=self._version)
+        self._axes: dict[str, np.ndarray] = dict(times=self.times.copy(), wavelengths=self.wavelengths.copy())
 
         # model and fitter
         self.model: KineticModel | None = None
@@ -258,17 +415,17 @@ class Dataset(object):
 
         self.mask.append([t0_idx, t0_idx + 1, 0, self.wavelengths.shape[0]])
 
+    @_logged
     def remove_scan(self, t: float):
         idx = fi(self.times, t)
-        self.matrix = np.delete(self.matrix, idx, 0)
-        self.matrix_fac = self.matrix
-        self.times = np.delete(self.times, idx, 0)
+        self._select(np.delete(np.arange(self.times.shape[0]), idx), slice(None))
+        self._set_D()
 
+    @_logged
     def remove_trace(self, wl: float):
         idx = fi(self.wavelengths, wl)
-        self.matrix = np.delete(self.matrix, idx, 1)
-        self.matrix_fac = self.matrix
-        self.wavelengths = np.delete(self.wavelengths, idx, 0)
+        self._select(slice(None), np.delete(np.arange(self.wavelengths.shape[0]), idx))
+        self._set_D()
 
     def clear_mask(self):
         self.mask.clear()
@@ -287,44 +444,24 @@ class Dataset(object):
         # self.U, self.S, self.V_T = svd(self.matrix, full_matrices=False, lapack_driver='gesdd')
         # self.run_ICA()
 
-    def save_fit(self, filepath, ST=None, C=None):
+    def save_fit(self, filepath, ST=None, C=None, precision: int | None = EXACT_PRECISION):
 
         if self.C_fit is None:
             return
 
         D_fit = self.C_fit @ self.ST_fit
 
-        # wavelengths = np.concatenate([[0], mw.matrix.wavelengths])
-
-        mat = np.vstack((self.wavelengths, D_fit))
-
-        t = np.concatenate([[0], self.times])
-        mat = np.hstack((t.reshape(-1, 1), mat))
-
-        buff_mat = Dataset.to_string(mat, separator=',')
-
-        with open(filepath + '.csv', 'w') as f:
-            f.write(buff_mat)
+        save_table(filepath + '.csv', D_fit, self.times, self.wavelengths, corner='Wavelength', delimiter=',', precision=precision)
 
         if ST is None and C is None:
             ST = self.ST_fit
             C = self.C_fit
 
-        buff_A = 'Wavelength,' + ','.join([str(i + 1) for i in range(ST.shape[0])]) + '\n'
-
-        ST = np.vstack((self.wavelengths, ST))
-        buff_A += '\n'.join(','.join(str(num) for num in row) for row in ST.T)
-
-        with open(filepath + '-A.csv', 'w') as f:
-            f.write(buff_A)
-
-        buff_C = 'Conc,' + ','.join([str(i + 1) for i in range(C.shape[1])]) + '\n'
-
-        C = np.hstack((self.times.reshape(-1, 1), C))
-        buff_C += '\n'.join(','.join(str(num) for num in row) for row in C)
+        save_table(filepath + '-A.csv', ST.T, self.wavelengths, [str(i + 1) for i in range(ST.shape[0])], corner='Wavelength',
+                   delimiter=',', precision=precision)
 
-        with open(filepath + '-C.csv', 'w') as f:
-            f.write(buff_C)
+        save_table(filepath + '-C.csv', C, self.times, [str(i + 1) for i in range(C.shape[1])], corner='Conc',
+                   delimiter=',', precision=precision)
 
     def get_TWC(self, axis=1):
         return np.trapz(self.matrix, self.wavelengths, axis=axis)
@@ -338,18 +475,23 @@ class Dataset(object):
         plt.tight_layout()
         plt.show()
 
-    def save_factored_matrix(self, filepath='file.txt', delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None):
+    def save_factored_matrix(self, filepath='file.txt', delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None,
+                             precision: int | None = EXACT_PRECISION):
 
         # _, fname = os.path.split(self.filepath)
         # name, ext = os.path.splitext(fname)
 
         # fpath = os.path.join(output_dir, f'{name}_factored.{extension}')
 
-        self._save_matrix(self.matrix_fac, fname=filepath, delimiter=delimiter, encoding=encoding, t0=t0, t1=t1, w0=w0, w1=w1)
+        self._save_matrix(self.matrix_fac, fname=filepath, delimiter=delimiter, encoding=encoding, t0=t0, t1=t1, w0=w0, w1=w1,
+                          precision=precision)
 
     def save_matrix(self, filepath: str | None = 'file.txt', directory: str | None = None, extension: str | None = None, 
-                    delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None, transpose=False):
-        """If filepath is None and directory and extension is provided, it will use the name of the dataset and save in the directory."""
+                    delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None, transpose=False,
+                    precision: int | None = EXACT_PRECISION):
+        """If filepath is None and directory and extension is provided, it will use the name of the dataset and save in the directory.
+        Numbers are written with precision significant digits (see fileio.write_table), .npy and .npz
+        extensions save binary files (see fileio.save_table)."""
 
         if directory is not None and extension is not None:
             fpath = os.path.join(directory, f"{self.name}.{extension}")
@@ -362,39 +504,37 @@ class Dataset(object):
         #
         # fpath = os.path.join(output_dir, f'{name}.{extension}')
 
-        self._save_matrix(self.matrix, fname=fpath, delimiter=delimiter, encoding=encoding, t0=t0, t1=t1, w0=w0, w1=w1, transpose=transpose)
-
-    def _save_matrix(self, D=None, fname='output.txt', delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None, transpose=False):
-        # cut data if necessary
+        self._save_matrix(self.matrix, fname=fpath, delimiter=delimiter, encoding=encoding, t0=t0, t1=t1, w0=w0, w1=w1, transpose=transpose,
+                          precision=precision)
 
+    def _crop_indexes(self, t0=None, t1=None, w0=None, w1=None) -> tuple[slice, slice]:
         t_idx_start = fi(self.times, t0) if t0 is not None else 0
-        t_idx_end = fi(self.times, t1) + 1 if t1 is not None else self.matrix_fac.shape[0]
+        t_idx_end = fi(self.times, t1) + 1 if t1 is not None else None
 
         wl_idx_start = fi(self.wavelengths, w0) if w0 is not None else 0
-        wl_idx_end = fi(self.wavelengths, w1) + 1 if w1 is not None else self.matrix_fac.shape[1]
+        wl_idx_end = fi(self.wavelengths, w1) + 1 if w1 is not None else None
 
-        D = self.matrix_fac if D is None else D
+        return slice(t_idx_start, t_idx_end), slice(wl_idx_start, wl_idx_end)
 
-        # crop the data if necessary
-        D_crop = D[t_idx_start:t_idx_end, wl_idx_start:wl_idx_end]
-        times_crop = self.times[t_idx_start:t_idx_end]
-        wavelengths_crop = self.wavelengths[wl_idx_start:wl_idx_end]
-        # print(D_crop.shape)
-        # if D_crop.ndim == 1:
-        #     if times_crop.shape[0] == 1:
-        #         D_crop = D_crop[None, :]
-        #     else:
-        #         D_crop = D_crop[:, None]
+    def _save_matrix(self, D=None, fname='output.txt', delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None, transpose=False,
+                     precision: int | None = EXACT_PRECISION):
+        # cut data if necessary
+        t_slice, w_slice = self._crop_indexes(t0, t1, w0, w1)
 
-        mat = np.vstack((times_crop, D_crop.T)) if transpose else np.vstack((wavelengths_crop, D_crop))
-        buffer = delimiter + delimiter.join(f"{num}" for num in (wavelengths_crop if transpose else times_crop)) + '\n'
-        buffer += '\n'.join(delimiter.join(f"{num}" for num in row) for row in mat.T)
+        D = self.matrix_fac if D is None else D
 
-        with open(fname, 'w', encoding=encoding) as f:
-            f.write(buffer)
+        # crop the data if necessary
+        D_crop = D[t_slice, w_slice]
+        times_crop = self.times[t_slice]
+        wavelengths_crop = self.wavelengths[w_slice]
 
+        # times are in the first row, or wavelengths if transpose is True
+        if transpose:
+            save_table(fname, D_crop, times_crop, wavelengths_crop, delimiter=delimiter, precision=precision, encoding=encoding)
+        else:
+            save_table(fname, D_crop.T, wavelengths_crop, times_crop, delimiter=delimiter, precision=precision, encoding=encoding)
 
-    def save_to_GTA(self, fname=None, delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None):
+    def save_to_GTA(self, fname=None, delimiter='\t', encoding='utf8', t0=None, t1=None, w0=None, w1=None, precision: int | None = EXACT_PRECISION):
         _dir, _fname = os.path.split(self.filepath)   # get dir and filename
         _fname, _ = os.path.splitext(_fname)  # get filename without extension
 
@@ -402,25 +542,16 @@ class Dataset(object):
             fname = os.path.join(_dir, f'{_fname}.ascii')
 
         # cut data if necessary
-
-        t_idx_start = fi(self.times, t0) if t0 is not None else 0
-        t_idx_end = fi(self.times, t1) + 1 if t1 is not None else self.matrix_fac.shape[0]
-
-        wl_idx_start = fi(self.wavelengths, w0) if w0 is not None else 0
-        wl_idx_end = fi(self.wavelengths, w1) + 1 if w1 is not None else self.matrix_fac.shape[1]
+        t_slice, w_slice = self._crop_indexes(t0, t1, w0, w1)
 
         # crop the data if necessary
-        D_crop = self.matrix_fac[t_idx_start:t_idx_end, wl_idx_start:wl_idx_end]
-        times_crop = self.times[t_idx_start:t_idx_end]
-        wavelengths_crop = self.wavelengths[wl_idx_start:wl_idx_end]
-
-        mat = np.vstack((wavelengths_crop, D_crop))
-        buffer = f'Header\nOriginal filename: fname\nTime explicit\nintervalnr {times_crop.shape[0]}\n'
-        buffer += delimiter + delimiter.join(f"{num}" for num in times_crop) + '\n'
-        buffer += '\n'.join(delimiter.join(f"{num}" for num in row) for row in mat.T)
+        D_crop = self.matrix_fac[t_slice, w_slice]
+        times_crop = self.times[t_slice]
+        wavelengths_crop = self.wavelengths[w_slice]
 
-        with open(fname, 'w', encoding=encoding) as f:
-            f.write(buffer)
+        header_lines = ['Header', 'Original filename: fname', 'Time explicit', f'intervalnr {times_crop.shape[0]}']
+        save_table(fname, D_crop.T, wavelengths_crop, times_crop, delimiter=delimiter, precision=precision, encoding=encoding,
+                   header_lines=header_lines)
 
 
     # non-negative matrix factorization solution
@@ -549,23 +680,35 @@ class Dataset(object):
         # update D
         self._set_D()
 
+    def _select(self, rows: slice | np.ndarray, cols: slice | np.ndarray):
+        """Selects rows and columns of the matrix, axes are updated immediately, the matrix lazily. Consecutive
+        selections are fused into one, which is applied when the matrix is accessed, as a strided view if the
+        selected indexes are evenly spaced."""
+        if self._selection is None:
+            self._selection = (np.arange(self._matrix.shape[0]), np.arange(self._matrix.shape[1]))
+
+        self._selection = (self._selection[0][rows], self._selection[1][cols])
+        self.times = self.times[rows]
+        self.wavelengths = self.wavelengths[cols]
+
+    @_logged
     def crop(self, t0=None, t1=None, w0=None, w1=None):
 
-        self.matrix, self.times, self.wavelengths = crop_data(self.matrix, self.times, self.wavelengths,
-                                                               t0, t1, w0, w1)
+        self._select(*self._crop_indexes(t0, t1, w0, w1))
         self.SVD()
         self._set_D()
 
         return self
     
+    @_logged
     def crop_idxs(self, t0=None, t1=None, w0=None, w1=None):
-        self.matrix, self.times, self.wavelengths = crop_data_idx(self.matrix, self.times, self.wavelengths,
-                                                               t0, t1, w0, w1)
+        self._select(slice(t0, t1), slice(w0, w1))
         self.SVD()
         self._set_D()
 
         return self
 
+    @_logged
     def baseline_correct(self, t0=0, t1=200):
         """Subtracts a average of specified time range from all spectra.
         Deep copies the object and new averaged one is returned."""
@@ -573,8 +716,10 @@ class Dataset(object):
         t_idx_start = fi(self.times, t0) if t0 is not None else 0
         t_idx_end = fi(self.times, t1) + 1 if t1 is not None else self.matrix_fac.shape[0]
 
-        D_selection = self.matrix[t_idx_start:t_idx_end + 1, :]
-        self.matrix -= D_selection.mean(axis=0)
+        self._ensure_own_matrix()
+        baseline = self.matrix[t_idx_start:t_idx_end + 1, :].mean(axis=0)
+        for block in self._blocks():
+            self.matrix[block] -= baseline
 
         self.SVD()
         self._set_D()
@@ -582,6 +727,7 @@ class Dataset(object):
         return self
 
 
+    @_logged
     def baseline_correct_area(self, wls_vals: np.ndarray | list[float], time_vals: np.ndarray | list[float],
                                     t0: float | None = None,):
         """
@@ -598,15 +744,26 @@ class Dataset(object):
         mu = interp_fn(self.wavelengths)
 
         # Convert mu to time indices (fi returns nearest index; we need inclusive end)
-        t_idx_ends = np.atleast_1d(np.asarray(fi(self.times, np.atleast_1d(mu).tolist())))
+        t_idx_ends = np.atleast_1d(fi(self.times, np.atleast_1d(mu)))
 
         # Ensure at least one time point in each baseline window
         t_idx_ends = np.maximum(t_idx_ends, t_idx_start)
 
-        # Subtract baseline (mean over [t0, mu[i]]) from each wavelength trace
-        for i in range(len(self.wavelengths)):
-            D_selection = self.matrix[t_idx_start : t_idx_ends[i] + 1, i]
-            self.matrix[:, i] -= D_selection.mean()
+        # Subtract baseline (mean over [t0, mu[i]]) from each wavelength trace, cumulative sums over time
+        # from t0 make the sum of each window a single lookup, the sums are accumulated block by block
+        self._ensure_own_matrix()
+        counts = t_idx_ends - t_idx_start + 1
+        sums = np.zeros(self.matrix.shape[1])
+        running = np.zeros(self.matrix.shape[1])
+        for block in self._blocks(t_idx_ends.max() + 1 - t_idx_start):
+            cumsums = np.cumsum(self.matrix[t_idx_start + block.start:t_idx_start + block.stop], axis=0) + running
+            cols = np.flatnonzero((counts > block.start) & (counts <= block.stop))
+            sums[cols] = cumsums[counts[cols] - 1 - block.start, cols]
+            running = cumsums[-1]
+
+        baseline = sums / counts
+        for block in self._blocks():
+            self.matrix[block] -= baseline
 
         self.SVD()
         self._set_D()
@@ -614,6 +771,7 @@ class Dataset(object):
         return self
        
     
+    @_logged
     def baseline_drift_correct(self, w0=178, w1=300):
         """Subtracts a average of specified wavelength range from spectra that it corresponds to.
         Deep copies the object and new averaged one is returned."""
@@ -621,14 +779,16 @@ class Dataset(object):
         wl_idx_start = fi(self.wavelengths, w0) if w0 is not None else 0
         wl_idx_end = fi(self.wavelengths, w1) + 1 if w1 is not None else self.matrix_fac.shape[1]
 
-        D_selection = self.matrix[:, wl_idx_start:wl_idx_end + 1]
-        self.matrix -= D_selection.mean(axis=1, keepdims=True)
+        self._ensure_own_matrix()
+        for block in self._blocks():
+            self.matrix[block] -= self.matrix[block, wl_idx_start:wl_idx_end + 1].mean(axis=1, keepdims=True)
 
         self.SVD()
         self._set_D()
 
         return self
 
+    @_logged
     def reduce(self, t_dim: int | None = None, w_dim: int | None = None):
         """Reduces the time and wavelength dimension by t_dim and w_dim, respectively.
         eg. for t_dim=10, every 10-th row of original matrix will contain reduced matrix."""
@@ -636,11 +796,7 @@ class Dataset(object):
         t_factor = int(t_dim) if t_dim is not None else 1
         w_factor = int(w_dim) if w_dim is not None else 1
 
-        self.matrix = self.matrix[::t_factor, :]
-        self.times = self.times[::t_factor]
-
-        self.matrix = self.matrix[:, ::w_factor]
-        self.wavelengths = self.wavelengths[::w_factor]
+        self._select(slice(None, None, t_factor), slice(None, None, w_factor))
 
         self.SVD()
 
@@ -649,25 +805,72 @@ class Dataset(object):
 
         return self
     
+    @_logged
     def dimension_multiply(self, x: float = 1.0, y: float = 1.0, z: float = 1.0):
         self.times *= y
         self.wavelengths *= x
-        self.matrix *= z
+        self._ensure_own_matrix()
+        for block in self._blocks():
+            self.matrix[block] *= z
+        self._set_D()
+
+    @_logged
+    def set_t0_as(self, t0=0):
+        self.times = self.times - (self.times[0] + t0)
+        self._set_D()
 
     def restore_original_data(self):
-        self.wavelengths = self.wavelengths_o
-        self.times = self.times_o
-        self.matrix = self.matrix_o
+        self.wavelengths = self.wavelengths_o.copy()
+        self.times = self.times_o.copy()
+        self.matrix = self._original_matrix()
+        self.operations = []
         self.SVD()
         self._set_D()
 
+    def replay(self, operations: list[dict] | str):
+        """Applies the operations (operation log of other dataset or path to the log saved by save_operations)
+        in order, the operations are recorded to the log of this dataset."""
+        if isinstance(operations, str):
+            operations = self.load_operations(operations)
+
+        for operation in operations:
+            if operation['op'] not in LOGGED_OPERATIONS:
+                raise ValueError(f"Operation {operation['op']} cannot be replayed.")
+            getattr(self, operation['op'])(**operation.get('kwargs', {}))
 
-    # time_slice and wavelength_slice are np.s_ slice objects
+        return self
+
+    def undo(self, n: int = 1):
+        """Reverts the last n operations, the original data are restored and the rest of the log is replayed."""
+        operations = self.operations[:max(len(self.operations) - n, 0)]
+
+        # transpose is applied to the original data as well
+        n_transposes = sum(operation['op'] == 'transpose' for operation in self.operations)
+        self.restore_original_data()
+        if n_transposes % 2 == 1:
+            self.transpose()
+            self.operations = []
+
+        return self.replay(operations)
+
+    def save_operations(self, fname: str):
+        with open(fname, 'w', encoding='utf8') as f:
+            json.dump(self.operations, f, indent=1)
+
+    @staticmethod
+    def load_operations(fname: str) -> list[dict]:
+        with open(fname, 'r', encoding='utf8') as f:
+            return json.load(f)
+
+    # time_slice and wavelength_slice are np.s_ slice objects (or [start, stop, step] lists)
+    @_logged
     def slice(self, time_slice, wavelength_slice):
-        self.matrix = self.matrix[time_slice, wavelength_slice]
-        self.wavelengths = self.wavelengths[wavelength_slice]
-        self.times = self.times[time_slice]
+        time_slice = time_slice if isinstance(time_slice, slice) else slice(*time_slice)
+        wavelength_slice = wavelength_slice if isinstance(wavelength_slice, slice) else slice(*wavelength_slice)
+        self._select(time_slice, wavelength_slice)
+        self._set_D()
 
+    @_logged
     def transpose(self):
         [self.times, self.wavelengths] = [self.wavelengths, self.times]
         self.matrix = self.matrix.T
@@ -705,10 +908,12 @@ class Dataset(object):
 
     @staticmethod
     def to_string(array, separator='\t', decimal_sep='.', new_line='\n'):
-        list_array = array.tolist()
-
-        list_array[0][0] = 'Wavelength'
+        f = io.StringIO()
+        # shortest representation, the text is read by people
+        write_table(f, array[1:, 1:], array[1:, 0], array[0, 1:], corner='Wavelength', delimiter=separator, precision=None)
+        buffer = f.getvalue()[:-1]   # without the last new line
 
-        buffer = new_line.join(separator.join("{}".format(num) for num in row) for row in list_array)
+        if decimal_sep != '.':
+            buffer = buffer.replace('.', decimal_sep)
 
-        return buffer
+        return buffer.replace('\n', new_line) if new_line != '\n' else buffer
@@ -2,7 +2,8 @@ from typing import Generator, Union
 from matplotlib import gridspec
 from .plot import plot_data_ax, plot_data_one_dim_ax, plot_spectra_ax
 from .dataset import Dataset
-from .kineticmodel.kineticmodel import KineticModel
+from .fileio import _load_matrix_args
+from .kineticmodel.kineticmodel import KineticModel, ParameterVector
 from .kineticmodel.firstorder import FirstOrderModel
 
 from lmfit import Parameters, Minimizer
@@ -17,7 +18,39 @@ from typing import Callable
 from .mathfuncs import fi
 
 from copy import deepcopy
+from enum import Enum, auto
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 from .plot import MajorSymLogLocator, MinorSymLogLocator, set_main_axis, ScalarFormatter
+
+
+class ExecutorType(Enum):
+    SERIAL = auto()  # datasets are simulated one after another in the calling thread
+    THREAD = auto()  # thread pool, profits from the kernels that release the GIL (numba, BLAS)
+    PROCESS = auto()  # pool of persistent processes, each worker holds its own copy of the datasets
+
+
+# datasets held by the process pool worker and their parameter vectors, set once by _init_worker
+_worker_datasets: list[Dataset] = []
+_worker_vectors: list[ParameterVector] = []
+_worker_slots: list[np.ndarray] = []
+
+
+def _init_worker(datasets: list[Dataset], slots: list[np.ndarray]):
+    global _worker_datasets, _worker_vectors, _worker_slots
+    _worker_datasets = datasets
+    _worker_vectors = [ParameterVector(d.model.params) for d in datasets]
+    _worker_slots = slots
+
+
+def _worker_residuals(index: int, values: np.ndarray) -> np.ndarray:
+    vector = _worker_vectors[index]
+    vector.set_values(values, _worker_slots[index])
+    model = _worker_datasets[index].model
+    model.simulate(vector)
+    return model.weighted_residuals().ravel()
+
+
 # dataset dict  {dataset=, key=}
     
 class Datasets(object):
@@ -36,6 +69,41 @@ class Datasets(object):
 
         self.fit_algorithm = "least_squares"  # trust reagion reflective alg.
 
+        # how the models are simulated in each iteration of fit_augmented
+        self._executor_type: ExecutorType = ExecutorType.SERIAL
+        # number of workers of the thread/process pool, None uses min(number of datasets, number of CPUs)
+        self.n_workers: int | None = None
+        # use the block structure of the Jacobian, finite differences of local parameters of different
+        # datasets are evaluated together in one residual call
+        self.use_jac_sparsity: bool = True
+
+    @property
+    def executor_type(self) -> ExecutorType:
+        return self._executor_type
+
+    @executor_type.setter
+    def executor_type(self, value: ExecutorType | str):
+        if isinstance(value, str):
+            value = ExecutorType[value.upper()]
+        elif not isinstance(value, ExecutorType):
+            raise TypeError(f"executor_type must be ExecutorType, str, got {type(value).__name__}")
+
+        self._executor_type = value
+
+    def _create_executor(self, slots: list[np.ndarray]) -> Executor | None:
+        if self._executor_type == ExecutorType.SERIAL:
+            return None
+
+        n_workers = self.n_workers or min(self.length(), os.cpu_count() or 1)
+
+        if self._executor_type == ExecutorType.THREAD:
+            return ThreadPoolExecutor(max_workers=n_workers)
+
+        # every worker receives the pickled datasets only once, in the iterations only parameter values are sent
+        # spawned workers, forking a process with running numba thread pool is not safe
+        return ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(list(self), slots))
+
     def set_model(self, model: KineticModel, index: int | None = None, key: int | str | None = None):
         if key is not None:
             dct = list(filter(lambda d: d['key'] == key, self._datasets))[0]
@@ -155,11 +223,35 @@ class Datasets(object):
         return ",\n".join([f"[Dataset=\"{dct['dataset'].name}\", key={dct['key']}]" for dct in self._datasets])
 
     @classmethod
-    def from_filenames(cls, filenames: list[str], transpose = False, **kwargs):
-        """kwargs are passed to np.getnfromtxt"""
+    def from_filenames(cls, filenames: list[str], transpose = False, executor_type: ExecutorType | str = ExecutorType.SERIAL,
+                       n_workers: int | None = None, **kwargs):
+        """kwargs are passed to Dataset.from_file. Text files can be loaded in parallel by setting the executor_type
+        to THREAD or PROCESS, the process pool is faster for many large files as the parser holds the GIL."""
+
+        if isinstance(executor_type, str):
+            executor_type = ExecutorType[executor_type.upper()]
 
         ds = cls()
-        ds._datasets = [dict(dataset=Dataset.from_file(fname, transpose, **kwargs), key=i) for i, fname in enumerate(filenames)]
+
+        # directories (npy storage) and TRE ICCD files are loaded serially
+        if executor_type == ExecutorType.SERIAL or kwargs.get('load_TRE_ICCD', False) or any(os.path.isdir(f) for f in filenames):
+            ds._datasets = [dict(dataset=Dataset.from_file(fname, transpose, **kwargs), key=i) for i, fname in enumerate(filenames)]
+            return ds
+
+        n_workers = n_workers or min(len(filenames), os.cpu_count() or 1)
+        kwargs.pop('load_TRE_ICCD', None)
+        args = [(fname, transpose, kwargs) for fname in filenames]
+
+        if executor_type == ExecutorType.THREAD:
+            executor = ThreadPoolExecutor(max_workers=n_workers)
+        else:
+            executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'))
+
+        with executor:
+            results = list(executor.map(_load_matrix_args, args))
+
+        ds._datasets = [dict(dataset=Dataset(mat, t, w, filepath=fname), key=i)
+                        for i, (fname, (t, w, mat)) in enumerate(zip(filenames, results))]
         return ds
 
     def crop(self, t0=None, t1=None, w0=None, w1=None):
@@ -193,7 +285,19 @@ class Datasets(object):
 
     def set_t0_as(self, t0=0):
         for d in self:
-            d.times -= d.times[0] + t0
+            d.set_t0_as(t0)
+
+    def replay(self, operations: list[dict] | str):
+        """Applies the operation log (or the log saved by Dataset.save_operations) to all datasets."""
+        if isinstance(operations, str):
+            operations = Dataset.load_operations(operations)
+
+        for d in self:
+            d.replay(operations)
+
+    def undo(self, n: int = 1):
+        for d in self:
+            d.undo(n)
 
     def get_averaged_dataset(self, apply_mask: bool = True) -> Dataset:
         if len(self._datasets) == 0:
@@ -495,69 +599,166 @@ class Datasets(object):
 
                 aug_params.add(get_par_name(name, i), value=par.value, vary=par.vary, min=par.min, max=par.max)
 
-        def fill_params2models(params):
-            # update all parameter values and simulate every model
-            for i, d in enumerate(self.__iter__()):
-                for name, par in d.model.params.items():
-                    # assign the global parameter value
-                    if name in global_param_names:
-                        try:
-                            par.value = params[name].value
-                            par.stderr = params[name].stderr
-                        except KeyError:
-                            pass
-                        continue
+        def get_aug_name(name: str, i: int) -> str | None:
+            # name of the augmented parameter corresponding to the parameter of i-th model
+            if name in global_param_names:
+                return name if name in aug_params else None
 
-                    if name in group_param_names and i in group_params_indexes[name]:
-                        # find the group
-                        idx_group = None
-                        for indexes in group_params[name]:  # ((0, 1), (2, 3), (4, 5))
-                            if i in indexes:
-                                idx_group = indexes
-                                break
-                        else:
-                            raise ValueError("Group param was not found")
-                        _name = get_group_name(name, idx_group)
-                    else:
-                        _name = get_par_name(name, i)
-                    
-                    # assign param
-                    par.value = params[_name].value
-                    par.stderr = params[_name].stderr
+            if name in group_param_names and i in group_params_indexes[name]:
+                # find the group
+                for indexes in group_params[name]:  # ((0, 1), (2, 3), (4, 5))
+                    if i in indexes:
+                        return get_group_name(name, indexes)
+                raise ValueError("Group param was not found")
 
-        def residuals(params):
+            return get_par_name(name, i)
 
-            res_list = []
+        # model parameter name -> augmented parameter name for each dataset
+        name_maps = [{name: aug_name for name in d.model.params.keys() if (aug_name := get_aug_name(name, i)) is not None}
+                     for i, d in enumerate(self.__iter__())]
 
-            fill_params2models(params)
-
-            # update all parameter values and simulate every model
-            for d in self.__iter__():
-                d.model.simulate()
-                res_list.append(d.model.weighted_residuals())
-
-            # find common dimension, and concatenate, if no common dimension, concatenate flat arrays
-            # axis_0_shapes = np.asarray([m.shape[0] for m in res_list])
-            # axis_1_shapes = np.asarray([m.shape[1] for m in res_list])
-
-            # axis_0_same = np.all(axis_0_shapes == axis_0_shapes[0])
-            # axis_1_same = np.all(axis_1_shapes == axis_1_shapes[0])
+        def fill_params2models(params):
+            # update all parameter values and errors of every model
+            for d, name_map in zip(self.__iter__(), name_maps):
+                for name, aug_name in name_map.items():
+                    par = d.model.params[name]
+                    par.value = params[aug_name].value
+                    par.stderr = params[aug_name].stderr
+
+        # flat index map, values of the augmented parameters at aug_indexes[i] are assigned to the
+        # parameters of i-th model at slots[i]
+        aug_positions = {name: k for k, name in enumerate(aug_params.keys())}
+        slots, aug_indexes = [], []
+        for d, name_map in zip(self.__iter__(), name_maps):
+            model_names = list(d.model.params.keys())
+            slots.append(np.asarray([model_names.index(name) for name in name_map.keys()], dtype=np.int64))
+            aug_indexes.append(np.asarray([aug_positions[aug_name] for aug_name in name_map.values()], dtype=np.int64))
+
+        vectors = [ParameterVector(d.model.params) for d in self.__iter__()]
+
+        # residuals of all datasets are gathered into one preallocated vector
+        sizes = [d.matrix_fac.size for d in self.__iter__()]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        res_vector = np.empty(offsets[-1], dtype=np.float64)
+        executor = self._create_executor(slots)
+
+        def simulate_dataset(i: int, d: Dataset, x: np.ndarray):
+            vectors[i].set_values(x[aug_indexes[i]], slots[i])
+            d.model.simulate(vectors[i])
+            res_vector[offsets[i]:offsets[i + 1]] = d.model.weighted_residuals().ravel()
+
+        # parameter values and residuals of the last evaluation, reused by block_jacobian
+        last_evaluation: list[np.ndarray | None] = [None, None]
 
-            # if axis_0_same:
-            #     return np.concatenate(res_list, axis=1)
+        def residuals(params):
+            x = np.fromiter((par.value for par in params.values()), dtype=np.float64, count=len(params))
+
+            if self._executor_type == ExecutorType.PROCESS:
+                futures = [executor.submit(_worker_residuals, i, x[idxs]) for i, idxs in enumerate(aug_indexes)]
+                for i, future in enumerate(futures):
+                    res_vector[offsets[i]:offsets[i + 1]] = future.result()
+            elif executor is None:
+                for i, d in enumerate(self.__iter__()):
+                    simulate_dataset(i, d, x)
+            else:
+                # result() re-raises the exceptions from the workers
+                for future in [executor.submit(simulate_dataset, i, d, x) for i, d in enumerate(self.__iter__())]:
+                    future.result()
+
+            last_evaluation[:] = x, res_vector.copy()
+            return res_vector.copy()
+
+        # indexes of the datasets affected by each varying augmented parameter, including the datasets
+        # of the constrained parameters whose expressions depend on it (also indirectly)
+        var_names = [name for name, par in aug_params.items() if par.vary and par.expr is None]
+
+        def dependents(name: str) -> set[str]:
+            names = {name}
+            for aug_name, par in aug_params.items():
+                if par.expr is not None and aug_name not in names and name in par._expr_deps:
+                    names |= dependents(aug_name)
+            return names
+
+        aug_params.update_constraints()  # parses the expressions, so that _expr_deps are set
+        var_datasets = [{i for i, name_map in enumerate(name_maps) if not dependents(aug_name).isdisjoint(name_map.values())}
+                        for aug_name in var_names]
+
+        # parameters which do not share any dataset are perturbed together
+        column_groups: list[tuple[list[int], set[int]]] = []
+        for j, datasets in enumerate(var_datasets):
+            for columns, used in column_groups:
+                if used.isdisjoint(datasets):
+                    columns.append(j)
+                    used.update(datasets)
+                    break
+            else:
+                column_groups.append(([j], set(datasets)))
+
+        fd_scheme = self.fitter_kwds.get('jac', '2-point')
+        diff_step = self.fitter_kwds.get('diff_step')
+
+        def block_jacobian(params):
+            # block structured finite difference Jacobian, the number of residual calls scales with the
+            # number of column groups instead of the number of parameters, rows of non-finite residuals
+            # are omitted the same way as lmfit omits them from the residuals (nan_policy='omit')
+            J = np.zeros((offsets[-1], len(var_names)))
+            x0 = np.asarray([params[name].value for name in var_names])
+            lb = np.asarray([params[name].min for name in var_names])
+            ub = np.asarray([params[name].max for name in var_names])
+            rel_step = diff_step if diff_step is not None else np.finfo(float).eps ** (1 / 3 if fd_scheme == '3-point' else 1 / 2)
+            h = rel_step * np.where(x0 >= 0, 1, -1) * np.maximum(1, np.abs(x0))
+            # one-sided differences at the bounds
+            h = np.where((x0 + h > ub) | (x0 + h < lb), -h, h)
+            central = (fd_scheme == '3-point') & (x0 - h >= lb) & (x0 - h <= ub) & (x0 + h >= lb) & (x0 + h <= ub)
+
+            # the residuals at x were already evaluated by the fitter before the Jacobian is requested
+            x_all, r0 = last_evaluation
+            if x_all is None or not np.array_equal(x_all, [par.value for par in params.values()]):
+                r0 = residuals(params)
+
+            def evaluate(columns: list[int], sign: float) -> np.ndarray:
+                for j in columns:
+                    params[var_names[j]].value = x0[j] + sign * h[j]
+                r = residuals(params)
+                for j in columns:
+                    params[var_names[j]].value = x0[j]
+                return r
+
+            for columns, _ in column_groups:
+                r_plus = evaluate(columns, 1)
+                c_cols = [j for j in columns if central[j]]
+                r_minus = evaluate(c_cols, -1) if c_cols else None
+
+                for j in columns:
+                    for i in var_datasets[j]:
+                        sl = slice(offsets[i], offsets[i + 1])
+                        if central[j]:
+                            J[sl, j] = (r_plus[sl] - r_minus[sl]) / (2 * h[j])
+                        else:
+                            J[sl, j] = (r_plus[sl] - r0[sl]) / h[j]
 
-            # if axis_1_same:
-            #     return np.concatenate(res_list, axis=0)
-            
-            # flat stack arrays
-            return np.concatenate([ar.flat for ar in res_list], axis=0)
+            J = J[np.isfinite(r0)]
+            # residuals that become non-finite after the step would make lmfit ravel the Jacobian
+            J[~np.isfinite(J)] = 0
+            return J
 
+        fitter_kwds = self.fitter_kwds
+        if self.use_jac_sparsity and self.fit_algorithm == "least_squares" and fd_scheme in ('2-point', '3-point'):
+            fitter_kwds = dict(self.fitter_kwds, jac=block_jacobian)
 
         self.minimizer = Minimizer(residuals, aug_params, nan_policy='omit')
-        self.aug_fit_result = self.minimizer.minimize(method=self.fit_algorithm, **self.fitter_kwds)  # minimize the residuals
+        try:
+            self.aug_fit_result = self.minimizer.minimize(method=self.fit_algorithm, **fitter_kwds)  # minimize the residuals
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
         fill_params2models(self.aug_fit_result.params)
 
+        # models were simulated with parameter vectors during the fit
+        for d in self.__iter__():
+            d.model.simulate()
+
         return self.aug_fit_result
 
 
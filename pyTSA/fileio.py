@@ -0,0 +1,292 @@
+import itertools
+import os
+import re
+
+import numpy as np
+from typing import Iterable, Iterator
+
+
+# delimiters tried by auto-detection, in this order, whitespace is used if none is found
+DELIMITERS = ('\t', ';', ',')
+
+
+def detect_delimiter(line: str) -> str | None:
+    """Returns the first delimiter from DELIMITERS found in the line, None (any whitespace) otherwise."""
+    for delimiter in DELIMITERS:
+        if delimiter in line:
+            return delimiter
+    return None
+
+
+def _split(line: str, delimiter: str | None) -> list[str]:
+    tokens = line.split(delimiter)
+    while len(tokens) > 0 and tokens[-1].strip() == '':  # trailing delimiters
+        tokens.pop()
+    return tokens
+
+
+def _to_float(token: str) -> float:
+    try:
+        return float(token)
+    except ValueError:
+        return np.nan
+
+
+def _is_title(line: str) -> bool:
+    """Line without any number, eg. a sample name above the data."""
+    return all(np.isnan(_to_float(token)) for token in _split(line, detect_delimiter(line)))
+
+
+def _read_header(fname: str, comments: str | None, encoding: str, skip_header: int = 0) -> tuple[str, str, int]:
+    """Returns first two data lines and the number of lines before the first line. First skip_header lines
+    are skipped, then blank lines, comments and title lines before the data."""
+    lines = []
+    skip = skip_header
+    with open(fname, 'r', encoding=encoding) as f:
+        for line in itertools.islice(f, skip_header, None):
+            stripped = line.strip()
+            if stripped == '' or (comments is not None and stripped.startswith(comments)):
+                if len(lines) == 0:
+                    skip += 1
+                continue
+            if len(lines) == 0 and _is_title(stripped):
+                skip += 1
+                continue
+            lines.append(line.rstrip('\r\n'))
+            if len(lines) == 2:
+                break
+
+    if len(lines) < 2:
+        raise ValueError(f"File {fname} does not contain a data matrix.")
+
+    return lines[0], lines[1], skip
+
+
+def load_matrix(fname: str, delimiter: str | None = 'auto', transpose: bool = False, comments: str | None = '#',
+                encoding: str = 'utf8', skip_header: int = 0, **kwargs) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Loads a matrix in pyTSA layout, first row are wavelengths, first column are times and the top-left
+    corner is ignored. Returns times, wavelengths and the matrix (times x wavelengths), axes are swapped if
+    transpose is True.
+
+    First skip_header lines are skipped. Blank lines, comments and title lines (lines without any number)
+    before the wavelength row are skipped too, other lines above the data have to be skipped by skip_header.
+    Delimiter is detected from the first data row if delimiter is 'auto'. The data are parsed by the C parser
+    of np.loadtxt, if it fails (eg. missing values), np.genfromtxt is used and missing values are filled
+    with NaN. kwargs are passed to np.genfromtxt which is then always used, they override its defaults
+    (dtype=np.float64, filling_values=np.nan)."""
+
+    header, first_row, skip = _read_header(fname, comments, encoding, skip_header)
+
+    if delimiter == 'auto':
+        delimiter = detect_delimiter(first_row)
+
+    data = None
+    if len(kwargs) == 0:
+        n_cols = len(_split(first_row, delimiter))
+        try:
+            data = np.loadtxt(fname, dtype=np.float64, delimiter=delimiter, comments=comments, skiprows=skip + 1,
+                              usecols=range(n_cols), encoding=encoding, ndmin=2)
+        except ValueError:
+            data = None
+
+    if data is not None:
+        w = np.asarray([_to_float(token) for token in _split(header, delimiter)], dtype=np.float64)
+        # whitespace delimited files do not have an empty top-left corner
+        w = w[-(data.shape[1] - 1):] if data.shape[1] > 1 else w[:0]
+        if w.shape[0] != data.shape[1] - 1:
+            data = None
+        else:
+            t, mat = data[:, 0], data[:, 1:]
+
+    if data is None:
+        genfromtxt_kwds = dict(dtype=np.float64, filling_values=np.nan)
+        genfromtxt_kwds.update(kwargs)
+        data = np.genfromtxt(fname, delimiter=delimiter, comments=comments, skip_header=skip, encoding=encoding,
+                             **genfromtxt_kwds)
+        t = data[1:, 0]
+        w = data[0, 1:]
+        mat = data[1:, 1:]
+
+    if transpose:
+        t, w, mat = w, t, mat.T
+
+    return t, w, mat
+
+
+def _load_matrix_args(args: tuple[str, bool, dict]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # used by the process pool in Datasets.from_filenames
+    fname, transpose, kwargs = args
+    return load_matrix(fname, transpose=transpose, **kwargs)
+
+
+# number of accumulations and exposure time in the filename of TRE ICCD files
+racc = re.compile(r"(\d+)acc")
+rexposure = re.compile(r"(\d+\.?\d*)exp")
+
+# columns of TRE ICCD files: counts, wavelength, exposure time, time
+TRE_ICCD_COLUMNS = (4, 5, 9, 10)
+
+
+def _data_lines(lines) -> Iterator[str]:
+    """Lines with data, blank lines and comments (#) are skipped the same way as by np.loadtxt."""
+    return (line for line in lines if line.split('#', 1)[0].strip())
+
+
+def _count_data_rows(fname: str) -> int:
+    with open(fname, 'r') as f:
+        return sum(1 for _ in _data_lines(f))
+
+
+def _load_TRE_ICCD_rows(lines, max_rows: int | None = None) -> np.ndarray:
+    """Parses rows of TRE ICCD file, missing exposure times and times are NaN."""
+    lines = list(lines) if max_rows is None else list(itertools.islice(lines, max_rows))
+    if len(lines) == 0:
+        return np.empty((0, len(TRE_ICCD_COLUMNS)))
+
+    try:
+        return np.loadtxt(lines, delimiter=',', dtype=np.float64, usecols=TRE_ICCD_COLUMNS, ndmin=2)
+    except ValueError:
+        # empty fields, eg. exposure time is not present in the data file
+        converters = lambda s: float(s) if s.strip() else np.nan
+        return np.loadtxt(lines, delimiter=',', dtype=np.float64, usecols=TRE_ICCD_COLUMNS, ndmin=2, converters=converters)
+
+
+def _infer_detector_width(fname: str, max_rows: int = 1 << 16) -> int:
+    """Detector width is the number of rows after which the wavelength column repeats."""
+    with open(fname, 'r') as f:
+        wavelengths = _load_TRE_ICCD_rows(_data_lines(f), max_rows)[:, 1]
+
+    repeats = np.flatnonzero(wavelengths[1:] == wavelengths[0])
+    return int(repeats[0]) + 1 if repeats.shape[0] > 0 else wavelengths.shape[0]
+
+
+def load_TRE_ICCD(fname: str, nw: int | None = None, out: str | np.ndarray | None = None,
+                  chunk_size: int = 256) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Loads time resolved emission data from ICCD. Returns times, wavelengths and the matrix of counts divided
+    by the exposure time and number of accumulations (both are parsed from the filename, exposure times from
+    the data file are used if present).
+
+    nw is the detector width, it is inferred from the data if None. The file is read in chunks of chunk_size
+    spectra into the preallocated matrix out, it can be a path to a new .npy file (the matrix is then
+    memory-mapped) or an array of shape (number of spectra, nw). New array is allocated if out is None."""
+
+    name = os.path.splitext(os.path.split(fname)[1])[0]
+
+    macc = racc.search(name)
+    mexp = rexposure.search(name)
+    acc = int(macc.group(1)) if macc is not None else 1  # number of accumulations
+    exp_time = float(mexp.group(1)) if mexp is not None else 1
+
+    nw = nw or _infer_detector_width(fname)
+    ns = _count_data_rows(fname) // nw  # incomplete last spectrum is skipped
+
+    if out is None:
+        D = np.empty((ns, nw), dtype=np.float64)
+    elif isinstance(out, str):
+        D = np.lib.format.open_memmap(out, mode='w+', dtype=np.float64, shape=(ns, nw))
+    else:
+        D = out
+        if D.shape != (ns, nw):
+            raise ValueError(f"Output matrix has to have shape {(ns, nw)}.")
+
+    times = np.empty(ns, dtype=np.float64)
+    wavelengths = None
+
+    with open(fname, 'r') as f:
+        lines = _data_lines(f)
+        for start in range(0, ns, chunk_size):
+            end = min(start + chunk_size, ns)
+            block = _load_TRE_ICCD_rows(lines, (end - start) * nw).reshape(end - start, nw, len(TRE_ICCD_COLUMNS))
+
+            if wavelengths is None:
+                wavelengths = block[0, :, 1].copy()
+
+            # exposure time of each spectrum, if it is not present in the data file, the last one is used
+            exp_times = block[:, 0, 2]
+            valid = ~np.isnan(exp_times)
+            last_valid = np.maximum.accumulate(np.where(valid, np.arange(exp_times.shape[0]), -1))
+            exp_times = np.where(last_valid >= 0, exp_times[np.maximum(last_valid, 0)], exp_time)
+            exp_time = exp_times[-1]
+
+            times[start:end] = block[:, 0, 3]
+            np.divide(block[:, :, 0], (exp_times * acc)[:, None], out=D[start:end])
+
+    if isinstance(D, np.memmap):
+        D.flush()
+
+    return times, np.full(nw, np.nan) if wavelengths is None else wavelengths, D
+
+
+# significant digits which round-trip any float64, default precision of the table writers
+EXACT_PRECISION = 17
+
+
+def _format_rows(rows: np.ndarray, delimiter: str, precision: int | None) -> str:
+    if rows.shape[0] == 0:
+        return ''
+
+    if precision is None:
+        # shortest representation which round-trips, same as str(float), formatted element by element
+        return ''.join(delimiter.join(map(repr, row)) + '\n' for row in rows.tolist())
+
+    # one format operation for the whole chunk
+    fmt = (delimiter.join([f'%.{precision}g'] * rows.shape[1]) + '\n') * rows.shape[0]
+    return fmt % tuple(rows.ravel().tolist())
+
+
+def write_table(f, data: np.ndarray, row_labels: np.ndarray | None = None, header: Iterable | None = None,
+                corner: str = '', delimiter: str = '\t', precision: int | None = EXACT_PRECISION, chunk_size: int = 256):
+    """Writes the 2D data to an open text file, rows are formatted and written in chunks of chunk_size rows.
+    If row_labels are given, they are written as the first column, header is written as the first row
+    (starting with corner if row labels are used). Numbers are written with precision significant digits,
+    the default of 17 digits round-trips exactly. If precision is None, the shortest round-trip representation
+    is used, which gives shorter text (0.1 instead of 0.10000000000000001), but is formatted element by element
+    and is about 1.7 times slower."""
+
+    data = np.atleast_2d(data)
+
+    if header is not None:
+        header = [str(h) if isinstance(h, (str, int, np.integer)) else _format_rows(np.asarray([[float(h)]]), '', precision).strip()
+                  for h in header]
+        f.write(delimiter.join(([corner] if row_labels is not None else []) + header) + '\n')
+
+    for start in range(0, data.shape[0], chunk_size):
+        chunk = data[start:start + chunk_size]
+        if row_labels is not None:
+            chunk = np.column_stack((row_labels[start:start + chunk_size], chunk))
+        f.write(_format_rows(chunk.astype(np.float64, copy=False), delimiter, precision))
+
+
+def save_table(fname: str, data: np.ndarray, row_labels: np.ndarray | None = None, header: Iterable | None = None,
+               corner: str = '', delimiter: str = '\t', precision: int | None = EXACT_PRECISION, encoding: str = 'utf8',
+               header_lines: Iterable[str] = ()):
+    """Saves the table (see write_table) to a file. If the extension is .npz, data, row labels and header are saved
+    as separate arrays, for .npy, the table is saved in pyTSA layout (first row is the header, first column are
+    row labels and NaN in the top-left corner), header has to be numeric then. header_lines are written at the
+    beginning of text files only."""
+
+    ext = os.path.splitext(fname)[1].lower()
+
+    if ext == '.npz':
+        arrays = dict(data=data)
+        if row_labels is not None:
+            arrays['row_labels'] = np.asarray(row_labels)
+        if header is not None:
+            arrays['header'] = np.asarray(list(header))
+        np.savez(fname, **arrays)
+        return
+
+    if ext == '.npy':
+        table = np.atleast_2d(np.asarray(data, dtype=np.float64))
+        if row_labels is not None:
+            table = np.column_stack((np.asarray(row_labels, dtype=np.float64), table))
+        if header is not None:
+            header = np.asarray(list(header), dtype=np.float64)
+            table = np.vstack((np.concatenate(([np.nan], header)) if row_labels is not None else header, table))
+        np.save(fname, table)
+        return
+
+    with open(fname, 'w', encoding=encoding) as f:
+        for line in header_lines:
+            f.write(line + '\n')
+        write_table(f, data, row_labels, header, corner, delimiter, precision)
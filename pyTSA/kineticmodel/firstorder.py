@@ -6,11 +6,10 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from ..dataset import Dataset
 
-from .kineticmodel import BaseKineticModel, IrfType
-from ..mathfuncs import fold_exp_vec, glstsq, square_conv_exp_vec, simulate_target_model, LPL_decay, exp_dist, reshape_arrays
+from .kineticmodel import BaseKineticModel
+from ..mathfuncs import fold_exp_vec, glstsq, simulate_target_model, LPL_decay, exp_dist, reshape_arrays, get_exp_derivatives
 
 from lmfit import Parameters
-from typing import Callable
 
 import matplotlib.pyplot as plt
 
@@ -27,10 +26,15 @@ class FirstOrderModel(BaseKineticModel):
 
     name = "First order kinetic model"
 
+    _kinetic_profile_options = BaseKineticModel._kinetic_profile_options + ('n_hermite_nodes',)
+
     def __init__(self, dataset: Dataset | None = None, n_species: int = 1, set_model: bool = False):
 
         self._include_rates_params = True
 
+        # number of Gauss-Hermite nodes for dispersive kinetics (b != 0), None chooses it adaptively from b
+        self.n_hermite_nodes: int | None = None
+
         self.LDM: np.ndarray | None = None
         self.LDM_fit: np.ndarray | None = None
         self.LDM_lifetimes: np.ndarray | None = None
@@ -71,18 +75,13 @@ class FirstOrderModel(BaseKineticModel):
         if (self.n_species == 0 or not self._include_rates_params):
             return np.asarray([])
         
-        params = self.params if params is None else params
-
-        vals = np.asarray([params[f"tau_{i+1}"].value for i in range(self.n_species)])
-        return 1 / vals
+        return 1 / self.get_param_vector(params).block('tau_', self.n_species)
     
     def get_b_array(self, params: Parameters | None = None) -> np.ndarray:
         if (self.n_species == 0 or not self._include_rates_params):
                 return np.asarray([])
         
-        params = self.params if params is None else params
-
-        return np.asarray([params[f"b_{i+1}"].value for i in range(self.n_species)])
+        return self.get_param_vector(params).block('b_', self.n_species)
 
 
     def calculate_LDM(self, log_range: tuple[float, float], n: int, ridge_alpha: float = 1) -> tuple[np.ndarray, np.ndarray]:
@@ -103,7 +102,7 @@ class FirstOrderModel(BaseKineticModel):
             C = np.concatenate((self.C_artifacts, C), axis=-1)
 
         w = self.get_weights_lstsq()
-        coefs, D_fit = glstsq(C, self.dataset.matrix_fac, ridge_alpha, w)
+        coefs, D_fit = glstsq(C, self.dataset.matrix_fac, ridge_alpha, w, self.dataset.block_size)
 
         if self.include_artifacts:
             coefs = coefs[self.artifact_order + 1:]
@@ -115,10 +114,6 @@ class FirstOrderModel(BaseKineticModel):
         # coefs = ST
         return coefs, D_fit
 
-    def get_exp_function(self) -> Callable[[np.ndarray | float, np.ndarray | float, np.ndarray | float], np.ndarray | float]:
-        return fold_exp_vec if self.irf_type is IrfType.GAUSSIAN else square_conv_exp_vec
-
-
     def calculate_C_profiles(self, params: Parameters | None = None, times: np.ndarray | None = None):
         """Simulates concentration profiles, including coherent artifacts if setup in a model.
         
@@ -138,17 +133,78 @@ class FirstOrderModel(BaseKineticModel):
         f = self.get_exp_function()
         C_total: np.ndarray | None = None
         for amp, width, mu in self._iter_irf_components(params, skip_zero_amp=False):
-            C_irf = exp_dist(f, times, ks, width, b, mu)
+            C_irf = self.get_exp_dist(f, times, ks, width, b, mu, self.n_hermite_nodes)
             C_total = amp * C_irf if C_total is None else (C_total + amp * C_irf)
 
         # n_irfs >= 1, so this should never be None.
-        self.C_opt = C_total if C_total is not None else exp_dist(f, times, ks, 0, b, self.get_mu(params))
+        self.C_opt = C_total if C_total is not None else exp_dist(f, times, ks, 0, b, self.get_mu(params), self.n_hermite_nodes)
+
+    def C_profiles_derivative(self, name: str, params: Parameters | None = None) -> np.ndarray | None:
+        """Analytic derivative of C profiles with respect to lifetimes, chirp and IRF parameters.
+        Derivatives for dispersive kinetics (any b != 0) are not available and None is returned."""
+
+        if self.n_species == 0 or not self._include_rates_params:
+            return None
+
+        derivatives = get_exp_derivatives(self.get_exp_function())
+
+        if derivatives is None or np.any(self.get_b_array(params) != 0):
+            return None
+
+        f_dt, f_dk, f_dw = derivatives
+        params = self.params if params is None else params
+        ks = self.get_rates(params)
+        components = list(self._iter_irf_components(params, skip_zero_amp=False))
+
+        def evaluate(f, irf_idx: int, k: np.ndarray = ks) -> np.ndarray:
+            _, width, mu = components[irf_idx]
+            tt, k, width, _ = reshape_arrays(self.dataset.times, k, width, None, mu)
+            return f(tt, k, width)
+
+        def wl_factor(arr: np.ndarray | float) -> np.ndarray | float:
+            # wavelength dependent factors are broadcasted over the time and rate axes of the tensor
+            return arr.reshape(-1, 1, 1) if np.ndim(arr) == 1 else arr
+
+        def irf_index(prefix: str) -> int:
+            return int(name[len(prefix):]) - 1
+
+        if name.startswith('tau_'):
+            i = irf_index('tau_')
+            col = sum(amp * evaluate(f_dk, j, ks[i:i + 1]) for j, (amp, _, _) in enumerate(components)) * -ks[i] ** 2
+            dC = np.zeros(col.shape[:-1] + (ks.shape[0],))
+            dC[..., i] = col[..., 0]
+            return dC
+
+        if self.is_chirp_param(name):
+            dmu = wl_factor(self.get_mu_derivative(name, params))
+            return -sum(amp * evaluate(f_dt, j) for j, (amp, _, _) in enumerate(components)) * dmu
+
+        if name.startswith(('irf_FWHM_', 'irf_SQW_')):
+            j = irf_index('irf_FWHM_' if name.startswith('irf_FWHM_') else 'irf_SQW_')
+            return components[j][0] * evaluate(f_dw, j)
+
+        if name.startswith('var_FWHM_p_'):
+            x = (self.dataset.wavelengths - self.central_wave) / 100
+            dtau = wl_factor(x ** (irf_index('var_FWHM_p_') + 1))
+            return sum(amp * evaluate(f_dw, j) for j, (amp, _, _) in enumerate(components)) * dtau
+
+        if name.startswith('irf_amp_'):
+            f = self.get_exp_function()
+            return evaluate(f, irf_index('irf_amp_')) - evaluate(f, 0)
+
+        if name.startswith('irf_mu_'):
+            j = irf_index('irf_mu_')
+            return -components[j][0] * evaluate(f_dt, j)
+
+        return None
 
 
 class FirstOrderLPLModel(FirstOrderModel):
 
     name = "First order kinetic model with optional LPL profile"
 
+    _kinetic_profile_options = FirstOrderModel._kinetic_profile_options + ('include_LPL',)
+
     def __init__(self, dataset: Dataset | None = None, n_species: int = 1, set_model: bool = False):
         self.include_LPL = True
         super(FirstOrderLPLModel, self).__init__(dataset, n_species, set_model)
@@ -9,12 +9,13 @@ import matplotlib.gridspec as gridspec
 import numpy as np
 from lmfit import Parameters, Minimizer, conf_interval, conf_interval2d, report_ci
 from lmfit.minimizer import MinimizerResult
-from typing import TYPE_CHECKING, ClassVar, Iterator
+from typing import TYPE_CHECKING, Callable, ClassVar, Iterator
 
 from abc import abstractmethod
 from enum import Enum, auto
 
-from ..mathfuncs import chirp_correction, fi, fit_polynomial_coefs, fit_sum_exp, gaussian, get_EAS_transform, glstsq, fold_exp_vec, square_conv_exp_vec, exp_dist
+from ..mathfuncs import chirp_correction, fi, fit_polynomial_coefs, fit_sum_exp, gaussian, get_EAS_transform, glstsq, fold_exp_vec, square_conv_exp_vec, fold_exp_par, square_conv_exp_par, fold_exp_f32, square_conv_exp_f32, exp_dist, exp_dist_shifted, quantize_shifts, lstsq_fit_derivatives, varpro_residuals
+from ..fileio import save_table, EXACT_PRECISION
 from ..plot import plot_SADS_ax, plot_data_ax, plot_fitresiduals_axes, plot_spectra_ax, plot_time_traces_onefig_ax, plot_traces_onefig_ax, set_main_axis, COLORS
 if TYPE_CHECKING:
     from ..dataset import Dataset
@@ -26,6 +27,8 @@ from matplotlib import cm
 # import glob, os
 import scipy.constants as sc
 from copy import deepcopy
+from collections import OrderedDict
+from functools import lru_cache
 from dataclasses import dataclass, fields
 
 
@@ -52,6 +55,134 @@ class WeightType(Enum):
     PROP_NOISE_FLOOR = auto()
 
 
+class JacobianType(Enum):
+    NUMERICAL = auto()  # finite differences by the fitting algorithm, see fitter_kwds['jac']
+    KAUFMAN = auto()  # variable projection Jacobian with Kaufman approximation
+    GOLUB_PEREYRA = auto()  # full variable projection Jacobian
+
+
+class ResidualType(Enum):
+    FULL = auto()  # residuals D - C @ ST from the fit matrix calculated in each iteration
+    VARPRO_QR = auto()  # projected residuals (I - P) D, projector from QR decomposition
+    VARPRO_SVD = auto()  # projected residuals (I - P) D, projector from SVD
+
+
+class KernelBackend(Enum):
+    SERIAL = auto()  # single-threaded fold_exp_vec and square_conv_exp_vec
+    PARALLEL = auto()  # multi-threaded fold_exp_par and square_conv_exp_par
+    PARALLEL_FLOAT32 = auto()  # multi-threaded, evaluated in single precision, see fold_exp_f32
+
+
+@dataclass
+class ProfileCacheInfo:
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class _ParameterSlot:
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values: np.ndarray, index: int):
+        self._values = values
+        self._index = index
+
+    @property
+    def value(self) -> float:
+        return self._values[self._index]
+
+
+class ParameterLayout:
+    """Fixed ordering of parameter names with precomputed indexes of the numbered parameter blocks
+    (e.g. tau_1 ... tau_n). Layouts are shared by all parameter vectors with the same names."""
+
+    def __init__(self, names: tuple[str, ...]):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self._blocks: dict[tuple[str, int, int], np.ndarray] = {}
+        self._named: dict[tuple[str, ...], np.ndarray] = {}
+
+    @classmethod
+    @lru_cache(maxsize=128)
+    def from_names(cls, names: tuple[str, ...]) -> ParameterLayout:
+        return cls(names)
+
+    def block(self, prefix: str, n: int, start: int = 1) -> np.ndarray:
+        """Indexes of the parameters prefix{start}, ..., prefix{start + n - 1}."""
+        key = (prefix, n, start)
+        idxs = self._blocks.get(key)
+        if idxs is None:
+            idxs = np.asarray([self.index[f"{prefix}{i}"] for i in range(start, start + n)], dtype=np.int64)
+            self._blocks[key] = idxs
+        return idxs
+
+    def indexes(self, names: tuple[str, ...]) -> np.ndarray:
+        """Indexes of the named parameters."""
+        idxs = self._named.get(names)
+        if idxs is None:
+            idxs = self._named[names] = np.asarray([self.index[name] for name in names], dtype=np.int64)
+        return idxs
+
+
+class ParameterVector:
+    """Array backed stand-in for lmfit Parameters used in the hot paths of the models. Values are read
+    from one float64 array (array attribute) through params[name].value or by blocks of numbered
+    parameters, see block. Constrained parameters (expr) are evaluated by the underlying lmfit Parameters."""
+
+    def __init__(self, params: Parameters):
+        self._params = params
+        self.layout = ParameterLayout.from_names(tuple(params.keys()))
+        self.array = np.fromiter((par.value for par in params.values()), dtype=np.float64, count=len(params))
+        self._slots: dict[str, _ParameterSlot] = {}
+        self._expr_indexes = [i for i, par in enumerate(params.values()) if par.expr is not None]
+
+    def set_values(self, values: np.ndarray, index: np.ndarray | slice = slice(None)):
+        self.array[index] = values
+
+        if self._expr_indexes:
+            for name, value in zip(self.layout.names, self.array):
+                if self._params[name].expr is None:
+                    self._params[name].value = value
+            for i in self._expr_indexes:
+                self.array[i] = self._params[self.layout.names[i]].value
+
+    def block(self, prefix: str, n: int, start: int = 1) -> np.ndarray:
+        """Values of the parameters prefix{start}, ..., prefix{start + n - 1} (copy)."""
+        return self.array[self.layout.block(prefix, n, start)]
+
+    def take(self, *names: str) -> np.ndarray:
+        """Values of the named parameters (copy)."""
+        return self.array[self.layout.indexes(names)]
+
+    def __getitem__(self, name: str) -> _ParameterSlot:
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._slots[name] = _ParameterSlot(self.array, self.layout.index[name])
+        return slot
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.layout.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.layout.names)
+
+    def __len__(self) -> int:
+        return len(self.layout.names)
+
+    def keys(self):
+        return self.layout.index.keys()
+
+    def values(self):
+        return [self[name] for name in self.layout.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.layout.names]
+
+    def valuesdict(self) -> dict[str, float]:
+        return dict(zip(self.layout.names, self.array.tolist()))
+
+
 def _coerce_weight_type(value: WeightType | str | None) -> WeightType | None:
     if value is None or isinstance(value, WeightType):
         return value
@@ -60,13 +191,14 @@ def _coerce_weight_type(value: WeightType | str | None) -> WeightType | None:
     raise TypeError(f"weight_type must be WeightType, str, or None, got {type(value).__name__}")
 
 
-def save_matrix(dim0: np.iterable, dim1: np.iterable, matrix: np.ndarray, fname='output.txt', delimiter='\t', encoding='utf8', transpose=False):
-    mat = np.vstack((dim0, matrix.T)) if transpose else np.vstack((dim1, matrix))
-    buffer = delimiter + delimiter.join(f"{num}" for num in (dim1 if transpose else dim0)) + '\n'
-    buffer += '\n'.join(delimiter.join(f"{num}" for num in row) for row in mat.T)
-
-    with open(fname, 'w', encoding=encoding) as f:
-        f.write(buffer)
+def save_matrix(dim0: np.iterable, dim1: np.iterable, matrix: np.ndarray, fname='output.txt', delimiter='\t', encoding='utf8', transpose=False,
+                precision: int | None = EXACT_PRECISION):
+    """Saves the matrix (dim0 x dim1), dim0 is in the first row, or dim1 if transpose is True. Binary .npy and .npz
+    files are saved according to the extension of fname, see fileio.save_table."""
+    if transpose:
+        save_table(fname, matrix, dim0, dim1, delimiter=delimiter, precision=precision, encoding=encoding)
+    else:
+        save_table(fname, matrix.T, dim1, dim0, delimiter=delimiter, precision=precision, encoding=encoding)
 
 # from scipy.linalg import lstsq
 
@@ -139,10 +271,13 @@ class KineticModel(object):
 
         self.C_opt: np.ndarray | None = None
         self.ST_opt: np.ndarray | None = None
+        self._matrix_opt_version = 0  # incremented with each assignment of matrix_opt
         self.matrix_opt: np.ndarray | None = None
 
         self.minimizer: Minimizer | None = None
         self.fit_result: MinimizerResult | None = None
+        # (number of residuals, dataset version, residual type) at the end of the last fit, used for warm starts
+        self._fit_state: tuple | None = None
         # fitter arguments to the underlying fitting algorithm
         self.fitter_kwds = dict(ftol=1e-10, xtol=1e-10, gtol=1e-10, loss='linear', verbose=2, jac='3-point')
 
@@ -160,8 +295,21 @@ class KineticModel(object):
         self.weighting_exponent: float = 1
         self.weighting_thresh: float = 1e-5
 
+        # weights are cached and recalculated only if weighting options, dataset or used fit matrix change
+        self._weights_cache: dict | None = None
+        self._weights_frozen: bool = False  # if True, cached weights are used, set during the fit
+
         self.fit_algorithm = "least_squares"  # trust reagion reflective alg.
 
+    @property
+    def matrix_opt(self) -> np.ndarray | None:
+        return self._matrix_opt
+
+    @matrix_opt.setter
+    def matrix_opt(self, value: np.ndarray | None):
+        self._matrix_opt = value
+        self._matrix_opt_version += 1
+
     @abstractmethod
     def plot(self, *what: str, nrows: int = 1, ncols: int = None, **kwargs):
         pass
@@ -219,12 +367,34 @@ class KineticModel(object):
         if (self.matrix_opt is None):
             raise TypeError("Optimized matrix is None")
         R = self.dataset.matrix_fac - self.matrix_opt
-        weights = self.get_weights()
-        return R * np.sqrt(weights)
+        return self.apply_sqrt_weights(R)
 
     def get_weights_lstsq(self):
-        w = np.sqrt(self.get_weights())
-        return w.sum(axis=1)
+        cache = self._get_weights_cache()
+        if 'lstsq' not in cache:
+            if cache['weights'] is None:
+                cache['lstsq'] = np.sqrt(cache['row']) * np.sqrt(cache['col']).sum()
+            else:
+                cache['lstsq'] = self._get_sqrt_weights(cache).sum(axis=1)
+        return cache['lstsq']
+
+    def apply_sqrt_weights(self, R: np.ndarray) -> np.ndarray:
+        """Returns R multiplied by square root of weights. For separable weights, the weight matrix is not created."""
+
+        cache = self._get_weights_cache()
+        if cache['weights'] is None:
+            if 'sqrt_row' not in cache:
+                cache['sqrt_row'] = np.sqrt(cache['row'])[:, None]
+                cache['sqrt_col'] = np.sqrt(cache['col'])[None, :]
+            return R * cache['sqrt_row'] * cache['sqrt_col']
+
+        return R * self._get_sqrt_weights(cache)
+
+    @staticmethod
+    def _get_sqrt_weights(cache: dict) -> np.ndarray:
+        if 'sqrt_weights' not in cache:
+            cache['sqrt_weights'] = np.sqrt(cache['weights'])
+        return cache['sqrt_weights']
 
     def _calculate_noise_floor(self):
         if not self.noise_floor_estimation_from_data:
@@ -237,7 +407,90 @@ class KineticModel(object):
         self.weighting_noise_floor = stds
         
 
+    def _weights_key(self) -> tuple:
+        """Key of all quantities the weights depend on."""
+
+        uses_matrix = self.weight_type is WeightType.PROP_THRESH or \
+            (self.weight_type is WeightType.PROP_NOISE_FLOOR and self.weighting_k != 0)
+        matrix_key = self._matrix_opt_version if uses_matrix and self.calc_weights_from_fit_matrix else None
+
+        if self.noise_floor_estimation_from_data:
+            noise_floor = tuple(self.noise_range)
+        else:
+            noise_floor = np.asarray(self.weighting_noise_floor, dtype=np.float64)
+            noise_floor = (noise_floor.shape, noise_floor.tobytes())
+
+        # in-place writes to the dataset matrix do not change its version, weights calculated from the data
+        # are keyed also by the count of NaNs and the sum of the data
+        uses_data = (uses_matrix and (not self.calc_weights_from_fit_matrix or self.matrix_opt is None)) or \
+            (self.weight_type is WeightType.PROP_NOISE_FLOOR and self.noise_floor_estimation_from_data)
+        data_key = None
+        if uses_data:
+            D = self.dataset.matrix_fac
+            data_key = (np.count_nonzero(np.isnan(D)), np.nansum(D).tobytes())
+
+        return (self.weight_type, self.calc_weights_from_fit_matrix, self.weighting_k, noise_floor, self.weighting_exponent,
+                self.weighting_thresh, self.noise_floor_estimation_from_data, tuple(self._weights),
+                id(self.dataset), self.dataset.version, matrix_key, data_key)
+
+    def _get_weights_cache(self) -> dict:
+        if self._weights_cache is not None and (self._weights_frozen or self._weights_cache['key'] == self._weights_key()):
+            return self._weights_cache
+
+        key = self._weights_key()
+        separable = self.get_weights_separable()
+        if separable is None:
+            self._weights_cache = dict(key=key, weights=self._calc_weights(), row=None, col=None)
+        else:
+            self._weights_cache = dict(key=key, weights=None, row=separable[0], col=separable[1])
+
+        return self._weights_cache
+
+    def _calc_wavelength_weights(self) -> np.ndarray:
+        col = np.ones(self.dataset.matrix_fac.shape[1])
+        for *rng, w in self._weights:
+            i, j = fi(self.dataset.wavelengths, rng)
+            col[i:j+1] *= w
+        return col
+
+    def get_weights_separable(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """Returns weights as a tuple of time (n_t,) and wavelength (n_w,) weights if the weight matrix
+        is their outer product (no weighting or PROP_NOISE_FLOOR with weighting_k = 0 and the noise floor
+        being a scalar, a column (n_t, 1) or a row (1, n_w)), otherwise None."""
+
+        if self.weight_type is WeightType.PROP_THRESH:
+            return None
+
+        n_t, n_w = self.dataset.matrix_fac.shape
+        row, col = np.ones(n_t), self._calc_wavelength_weights()
+
+        if self.weight_type is WeightType.PROP_NOISE_FLOOR:
+            if self.weighting_k != 0:
+                return None
+            self._calculate_noise_floor()
+            noise_floor = np.asarray(self.weighting_noise_floor, dtype=np.float64)
+            if noise_floor.ndim > 2:
+                return None
+            # the same broadcasting against the (n_t, n_w) matrix as in _calc_weights
+            noise_floor = noise_floor.reshape((1,) * (2 - noise_floor.ndim) + noise_floor.shape)
+            if noise_floor.shape[1] == 1:
+                row = np.broadcast_to(1 / noise_floor[:, 0] ** 2, (n_t,)).copy()
+            elif noise_floor.shape[0] == 1:
+                col = col * np.broadcast_to(1 / noise_floor[0] ** 2, (n_w,))
+            else:
+                return None
+        elif self.weight_type is WeightType.NO_WEIGHTING:
+            return row, np.ones(n_w)
+
+        return row, col
+
     def get_weights(self):
+        cache = self._get_weights_cache()
+        if cache['weights'] is None:
+            return np.outer(cache['row'], cache['col'])
+        return cache['weights']
+
+    def _calc_weights(self):
         weights = np.ones_like(self.dataset.matrix_fac)
 
         if self.weight_type is WeightType.NO_WEIGHTING:
@@ -270,9 +523,7 @@ class KineticModel(object):
 
             weights *= np.where(mat > tresh, 1 / mat, 0)
 
-        for *rng, w in self._weights:
-            i, j = fi(self.dataset.wavelengths, rng)    
-            weights[:, i:j+1] *= w
+        weights *= self._calc_wavelength_weights()[None, :]
 
         return weights
 
@@ -524,6 +775,45 @@ class BaseKineticModel(KineticModel):
         elif not isinstance(value, VariableFwhmType):
             raise TypeError(f"variable_fwhm_type must be VariableFwhmType, str, got {type(value).__name__}")
 
+    @property
+    def jacobian_type(self) -> JacobianType:
+        return self._jacobian_type
+
+    @jacobian_type.setter
+    def jacobian_type(self, value: JacobianType | str):
+        if isinstance(value, str):
+            value = JacobianType[value.upper()]
+        elif not isinstance(value, JacobianType):
+            raise TypeError(f"jacobian_type must be JacobianType, str, got {type(value).__name__}")
+
+        self._jacobian_type = value
+
+    @property
+    def residual_type(self) -> ResidualType:
+        return self._residual_type
+
+    @residual_type.setter
+    def residual_type(self, value: ResidualType | str):
+        if isinstance(value, str):
+            value = ResidualType[value.upper()]
+        elif not isinstance(value, ResidualType):
+            raise TypeError(f"residual_type must be ResidualType, str, got {type(value).__name__}")
+
+        self._residual_type = value
+
+    @property
+    def kernel_backend(self) -> KernelBackend:
+        return self._kernel_backend
+
+    @kernel_backend.setter
+    def kernel_backend(self, value: KernelBackend | str):
+        if isinstance(value, str):
+            value = KernelBackend[value.upper()]
+        elif not isinstance(value, KernelBackend):
+            raise TypeError(f"kernel_backend must be KernelBackend, str, got {type(value).__name__}")
+
+        self._kernel_backend = value
+
     def __init__(self, dataset: Dataset | None = None, n_species: int = 1, set_model: bool = False):
 
         # Default chirp-related settings
@@ -553,8 +843,28 @@ class BaseKineticModel(KineticModel):
 
         self.zero_coh_spec_range = []  # zero coherent artifact in that wavelength range
 
+        # if set, chirped profiles are evaluated only for time zeros quantized with this step (in time units)
+        # and shifted to each wavelength by first order Taylor expansion, see exp_dist_shifted
+        self.chirp_shift_tol: float | None = None
+
         self.ridge_alpha = 0.0001
 
+        # NUMERICAL uses fitter_kwds['jac'], KAUFMAN and GOLUB_PEREYRA use the variable projection Jacobian
+        # with analytic derivatives of C profiles where available (finite differences of C profiles otherwise)
+        self._jacobian_type: JacobianType = JacobianType.NUMERICAL
+
+        # FULL calculates spectra and fit matrix in each iteration, VARPRO_QR and VARPRO_SVD use projected residuals
+        # and spectra and fit matrix are calculated only after the fit, weights are fixed during the fit
+        self._residual_type: ResidualType = ResidualType.FULL
+
+        # implementation of exponential functions convolved with IRF, see get_exp_function
+        self._kernel_backend: KernelBackend = KernelBackend.SERIAL
+
+        # concatenated C profiles and spectra from the last simulation, used for calculation of Jacobian
+        self._C_full: np.ndarray | None = None
+        self._ST_full: np.ndarray | None = None
+        self._simulated_values: tuple | None = None
+
         # concentration profiles and spectra of coherent artifacts
         self.C_artifacts: np.ndarray | None = None
         self.ST_artifacts: np.ndarray | None = None
@@ -573,28 +883,34 @@ class BaseKineticModel(KineticModel):
         self._calculate_EAS = True
         # self._include_rates_params = True
 
+        # LRU cache of simulated profiles for each block ('kinetic', 'artifacts', 'DOAS') keyed by values
+        # of the parameters the block depends on, model options and data, 0 disables the cache
+        self.profile_cache_size: int = 4
+        self._profile_cache: dict[str, OrderedDict] = {}
+        self._profile_cache_counts: dict[str, list[int]] = {}  # [hits, misses]
+
         super(BaseKineticModel, self).__init__(dataset, n_species, set_model)
 
     
     # TODO update labels for target models,  exporting of full fit matrix command 
 
-    def export_DAS(self, fname='output.txt', delimiter='\t', encoding='utf8'):
+    def export_DAS(self, fname='output.txt', delimiter='\t', encoding='utf8', precision: int | None = EXACT_PRECISION):
         names = [f'DAS {i+1}' for i in range(self.ST_opt.shape[0])]
-        save_matrix(names, self.dataset.wavelengths, self.ST_opt, fname=fname, delimiter=delimiter, encoding=encoding, transpose=False)
+        save_matrix(names, self.dataset.wavelengths, self.ST_opt, fname=fname, delimiter=delimiter, encoding=encoding, transpose=False, precision=precision)
 
-    def export_EAS(self, fname='output.txt', delimiter='\t', encoding='utf8'):
+    def export_EAS(self, fname='output.txt', delimiter='\t', encoding='utf8', precision: int | None = EXACT_PRECISION):
         assert self.ST_EAS is not None
         names = [f'EAS {i+1}' for i in range(self.ST_EAS.shape[0])]
-        save_matrix(names, self.dataset.wavelengths, self.ST_EAS, fname=fname, delimiter=delimiter, encoding=encoding, transpose=False)
+        save_matrix(names, self.dataset.wavelengths, self.ST_EAS, fname=fname, delimiter=delimiter, encoding=encoding, transpose=False, precision=precision)
 
-    def export_DAS_Cprofiles(self, fname='output.txt', delimiter='\t', encoding='utf8'):
+    def export_DAS_Cprofiles(self, fname='output.txt', delimiter='\t', encoding='utf8', precision: int | None = EXACT_PRECISION):
         names = [f'DAS profile {i+1}' for i in range(self.ST_opt.shape[0])]
-        save_matrix(self.dataset.times, names, self.C_opt, fname=fname, delimiter=delimiter, encoding=encoding, transpose=True)
+        save_matrix(self.dataset.times, names, self.C_opt, fname=fname, delimiter=delimiter, encoding=encoding, transpose=True, precision=precision)
 
-    def export_EAS_Cprofiles(self, fname='output.txt', delimiter='\t', encoding='utf8'):
+    def export_EAS_Cprofiles(self, fname='output.txt', delimiter='\t', encoding='utf8', precision: int | None = EXACT_PRECISION):
         assert self.C_EAS is not None
         names = [f'EAS profile {i+1}' for i in range(self.ST_opt.shape[0])]
-        save_matrix(self.dataset.times, names, self.C_EAS, fname=fname, delimiter=delimiter, encoding=encoding, transpose=True)
+        save_matrix(self.dataset.times, names, self.C_EAS, fname=fname, delimiter=delimiter, encoding=encoding, transpose=True, precision=precision)
 
     def init_params(self) -> Parameters:
         params = super(BaseKineticModel, self).init_params()
@@ -637,6 +953,12 @@ class BaseKineticModel(KineticModel):
 
         return params
     
+    def get_param_vector(self, params: Parameters | ParameterVector | None = None) -> ParameterVector:
+        """Returns params (self.params if None) as ParameterVector. Converting once at the beginning of
+        the simulation avoids name lookups in lmfit Parameters in the getters."""
+        params = self.params if params is None else params
+        return params if isinstance(params, ParameterVector) else ParameterVector(params)
+
     def get_irf_width(self, params: Parameters | None = None):
         params = self.params if params is None else params
 
@@ -655,38 +977,32 @@ class BaseKineticModel(KineticModel):
         The first ("base") IRF amplitude is derived so that
         sum(amps) == 1.
         """
-        params = self.params if params is None else params
+        params = self.get_param_vector(params)
 
         amps = np.zeros(self.n_irfs, dtype=np.float64)
         if not self.include_irf:
             amps[0] = 1.0
             return amps
 
-        other_amp_sum = 0.0
-        for irf_num in range(2, self.n_irfs + 1):
-            other_amp_sum += params[f'irf_amp_{irf_num}'].value
-
-        amps[0] = 1.0 - other_amp_sum
-        for irf_num in range(2, self.n_irfs + 1):
-            amps[irf_num - 1] = params[f'irf_amp_{irf_num}'].value
+        amps[1:] = params.block('irf_amp_', self.n_irfs - 1, start=2)
+        amps[0] = 1.0 - amps[1:].sum()
 
         return amps
 
     def get_irf_mu_shifts(self, params: Parameters | None = None) -> np.ndarray:
         """IRF mixture time shifts (0 for the base IRF)."""
-        params = self.params if params is None else params
+        params = self.get_param_vector(params)
 
         mu_shifts = np.zeros(self.n_irfs, dtype=np.float64)
         if not self.include_irf:
             return mu_shifts
 
-        for irf_num in range(2, self.n_irfs + 1):
-            mu_shifts[irf_num - 1] = params[f'irf_mu_{irf_num}'].value
+        mu_shifts[1:] = params.block('irf_mu_', self.n_irfs - 1, start=2)
         return mu_shifts
 
     def get_tau_for_irf(self, irf_index: int, params: Parameters | None = None) -> np.ndarray | float:
         """Return the IRF width (FWHM) curve for a specific IRF in the mixture."""
-        params = self.params if params is None else params
+        params = self.get_param_vector(params)
 
         if not self.include_irf:
             return 0
@@ -712,7 +1028,7 @@ class BaseKineticModel(KineticModel):
         tau = np.ones(self.dataset.wavelengths.shape[0], dtype=np.float64) * base_width
 
         x = (self.dataset.wavelengths - self.central_wave) / 100
-        partaus = [params[f'var_FWHM_p_{i + 1}'] for i in range(self.num_of_poly_varfwhm_params)]
+        partaus = params.block('var_FWHM_p_', self.num_of_poly_varfwhm_params)
         for i in range(self.num_of_poly_varfwhm_params):
             tau += partaus[i] * x ** (i + 1)
 
@@ -890,7 +1206,7 @@ class BaseKineticModel(KineticModel):
     def get_mu(self, params: Parameters | None = None) -> np.ndarray | float:
         """Return the curve that defines chirp (time zero) with respect to wavelength."""
 
-        params = self.params if params is None else params
+        params = self.get_param_vector(params)
 
         t0 = params["t0"].value
 
@@ -902,17 +1218,50 @@ class BaseKineticModel(KineticModel):
         x = self.dataset.wavelengths - self.central_wave
 
         if self.chirp_type is ChirpType.EXP:
-            for i in range(self.num_of_exp_chirp_params):
-                factor = params[f"t0_mul_{i + 1}"].value
-                lam = params[f"t0_lam_{i + 1}"].value
+            factors = params.block('t0_mul_', self.num_of_exp_chirp_params)
+            lams = params.block('t0_lam_', self.num_of_exp_chirp_params)
+            for factor, lam in zip(factors, lams):
                 mu += factor * np.exp(x * lam)
         elif self.chirp_type is ChirpType.POLY:
-            for i in range(self.num_of_poly_chirp_params):
-                p = params[f"t0_p_{i + 1}"].value
+            for i, p in enumerate(params.block('t0_p_', self.num_of_poly_chirp_params)):
                 mu += p * (x / 100) ** (i + 1)
 
         return mu
-    
+
+    def get_mu_derivative(self, name: str, params: Parameters | None = None) -> np.ndarray | float:
+        """Return the derivative of the chirp curve (see get_mu) with respect to parameter name."""
+
+        if name == 't0':
+            return 1.0
+
+        if not self.include_chirp:
+            return 0.0
+
+        params = self.get_param_vector(params)
+        x = self.dataset.wavelengths - self.central_wave
+
+        if self.chirp_type is ChirpType.EXP:
+            if name.startswith(('t0_mul_', 't0_lam_')):
+                i = int(name[len('t0_mul_'):]) - 1
+                lam = params.block('t0_lam_', self.num_of_exp_chirp_params)[i]
+                if name.startswith('t0_mul_'):
+                    return np.exp(x * lam)
+                return params.block('t0_mul_', self.num_of_exp_chirp_params)[i] * x * np.exp(x * lam)
+        elif self.chirp_type is ChirpType.POLY:
+            if name.startswith('t0_p_'):
+                i = int(name[len('t0_p_'):])
+                return (x / 100) ** i
+
+        return 0.0
+
+    @staticmethod
+    def is_chirp_param(name: str) -> bool:
+        return name == 't0' or name.startswith('t0_')
+
+    @staticmethod
+    def is_irf_param(name: str) -> bool:
+        return name.startswith(('irf_', 'var_FWHM_'))
+
     def get_actual_chirp_data(self) -> np.ndarray:
         """Returns the actual curve that describes the chirp, 
         if chirp is not included, it will return array filled with parameter t0"""
@@ -974,28 +1323,26 @@ class BaseKineticModel(KineticModel):
 
             tensor: bool = mu.shape[0] > 1 or fwhm.shape[0] > 1
 
-            if tensor:
-                fwhm_t = fwhm.reshape(-1, 1, 1)
-                tt = t.reshape(1, -1, 1) - mu.reshape(-1, 1, 1)
-                s = fwhm_t / (2 * np.sqrt(2 * np.log(2)))  # sigma
-            else:
-                s = fwhm[0] / (2 * np.sqrt(2 * np.log(2)))  # sigma
-                tt = (t - mu[0]).reshape(-1, 1)
-
-            y: np.ndarray = gaussian(tt, s)
-            y = np.tile(y, (1, 1, order + 1)) if tensor else np.tile(y, (1, order + 1))
+            shifted = tensor and self.chirp_shift_tol is not None and fwhm.shape[0] == 1
 
-            if order > 0:  # first derivative
-                y[..., 1] *= -tt.squeeze()
-
-            if order > 1:  # second derivative
-                y[..., 2] *= (tt * tt - s * s).squeeze()
-
-            if order > 2:  # third derivative
-                y[..., 3] *= (-tt * (tt * tt - 3 * s * s)).squeeze()
+            if shifted:
+                # profiles are evaluated for quantized time zeros and shifted by first order Taylor expansion,
+                # derivative of the n-th basis function is the (n+1)-th basis function divided by s^2
+                levels, index, dmu = quantize_shifts(mu, self.chirp_shift_tol)
+                s = fwhm[0] / (2 * np.sqrt(2 * np.log(2)))  # sigma
+                tt = t.reshape(1, -1, 1) - levels.reshape(-1, 1, 1)
+                y_q = self._artifacts_basis(tt, s, order + 1)
+                y = y_q[index, :, :-1] - dmu[:, None, None] * y_q[index, :, 1:] / (s * s)
+            else:
+                if tensor:
+                    fwhm_t = fwhm.reshape(-1, 1, 1)
+                    tt = t.reshape(1, -1, 1) - mu.reshape(-1, 1, 1)
+                    s = fwhm_t / (2 * np.sqrt(2 * np.log(2)))  # sigma
+                else:
+                    s = fwhm[0] / (2 * np.sqrt(2 * np.log(2)))  # sigma
+                    tt = (t - mu[0]).reshape(-1, 1)
 
-            if order > 3:  # fourth derivative
-                y[..., 4] *= (tt ** 4 - 6 * tt * tt * s * s + 3 * s ** 4).squeeze()
+                y = self._artifacts_basis(tt, s, order)
 
             y_max = np.max(y, axis=-2, keepdims=True)  # find maxima over time axis
             y_max[np.isclose(y_max, 0)] = 1  # values close to zero force to 1 to not divide by zero
@@ -1051,27 +1398,68 @@ class BaseKineticModel(KineticModel):
         # return self.C_COH
 
     
+    @staticmethod
+    def _artifacts_basis(tt: np.ndarray, s: np.ndarray | float, order: int) -> np.ndarray:
+        """Gaussian (sigma s) and its derivatives scaled by s^(2n) up to order along the last axis,
+        y_n = (-s)^n He_n(tt / s) g, calculated by recurrence y_(n+1) = -(tt y_n + n s^2 y_(n-1))."""
+
+        g: np.ndarray = gaussian(tt, s)
+        y = np.tile(g, (1, 1, order + 1)) if tt.ndim == 3 else np.tile(g, (1, order + 1))
+
+        s2 = s * s
+        s2 = s2[..., 0] if np.ndim(s2) == 3 else s2
+        tt = tt[..., 0]
+        for n in range(1, order + 1):
+            y[..., n] = -tt * y[..., n - 1]
+            if n > 1:
+                y[..., n] -= (n - 1) * s2 * y[..., n - 2]
+
+        return y
+
+    def get_exp_dist(self, f_exp: Callable, times: np.ndarray, ks: np.ndarray, width: np.ndarray | float,
+                     b: np.ndarray | float | None, mu: np.ndarray | float, n_nodes: int | None = None) -> np.ndarray:
+        """Evaluates exp_dist, or exp_dist_shifted if chirp_shift_tol is set."""
+
+        if self.chirp_shift_tol is not None:
+            return exp_dist_shifted(f_exp, times, ks, width, b, mu, self.chirp_shift_tol, n_nodes)
+        return exp_dist(f_exp, times, ks, width, b, mu, n_nodes)
+
     def calculate_C_profiles(self, params: Parameters | None = None, times: np.ndarray | None = None):
         raise NotImplementedError()
 
+    def C_profiles_derivative(self, name: str, params: Parameters | None = None) -> np.ndarray | None:
+        """Returns the analytic derivative of C profiles (C_opt) with respect to parameter name.
+        If None is returned, the derivative is calculated by finite differences."""
+        return None
+
+    def get_exp_function(self) -> Callable[[np.ndarray | float, np.ndarray | float, np.ndarray | float], np.ndarray | float]:
+        """Returns the exponential function convolved with IRF according to irf_type and kernel_backend."""
+
+        if self.irf_type is IrfType.GAUSSIAN:
+            functions = (fold_exp_vec, fold_exp_par, fold_exp_f32)
+        else:
+            functions = (square_conv_exp_vec, square_conv_exp_par, square_conv_exp_f32)
+
+        return functions[list(KernelBackend).index(self.kernel_backend)]
+
     def simulate_C_DOAS(self, params: Parameters | None = None):
         if self.n_DOAS == 0:
             return
 
-        params = self.params if params is None else params
+        params = self.get_param_vector(params)
 
-        ks = 1 / np.array([params[f'os_tau_{i+1}'].value for i in range(self.n_DOAS)])
+        ks = 1 / params.block('os_tau_', self.n_DOAS)
 
-        f_exp = fold_exp_vec if self.irf_type is IrfType.GAUSSIAN else square_conv_exp_vec
+        f_exp = self.get_exp_function()
 
         _C = None
         for amp, width, mu in self._iter_irf_components(params, skip_zero_amp=False):
-            _C_irf = exp_dist(f_exp, self.dataset.times, ks, width, None, mu)
+            _C_irf = self.get_exp_dist(f_exp, self.dataset.times, ks, width, None, mu)
             _C = _C_irf * amp if _C is None else (_C + amp * _C_irf)
 
         self._C_DOAS = np.empty(_C.shape[:-1] + (self.n_DOAS * 2,))
 
-        omegas = np.array([params[f'os_omega_{i+1}'].value for i in range(self.n_DOAS)])
+        omegas = params.block('os_omega_', self.n_DOAS)
         # assert _C.shape[-1] == self.n_DOAS, (_C.shape, self.n_DOAS)
 
         if _C.ndim == 3:
@@ -1085,34 +1473,48 @@ class BaseKineticModel(KineticModel):
         self._C_DOAS[..., 1::2] = _C * np.sin(phase)
 
     
-    def simulate(self, params: Parameters | None = None):
+    def simulate_C_full(self, params: Parameters | None = None) -> np.ndarray | None:
+        """Simulates the C profiles, coherent artifacts and DOAS and returns them concatenated
+        along the last axis. Returns None if there is nothing to simulate."""
 
         self.C_opt = None
         self.C_artifacts = None
         self._C_DOAS = None
         self.ST_DOAS = None
 
-        self.simulate_artifacts(params)
-
-        self.simulate_C_DOAS(params)
-
-        self.calculate_C_profiles(params, self.dataset.times)
+        for block in ('artifacts', 'DOAS', 'kinetic'):
+            self._cached_simulate_profiles(block, params)
 
         arrays = list(filter(lambda x: x is not None, [self.C_opt, self.C_artifacts, self._C_DOAS]))
         if len(arrays) == 0:
+            return None
+
+        return np.concatenate(arrays, axis=-1)
+
+    def simulate(self, params: Parameters | None = None):
+
+        self._C_full = None
+        self._ST_full = None
+        params = self.get_param_vector(params)
+
+        C_full = self.simulate_C_full(params)
+        if C_full is None:
             return
 
         n_s = self.C_opt.shape[-1] if self.C_opt is not None else 0
         n_a = self.C_artifacts.shape[-1] if self.C_artifacts is not None else 0
         n_d = self._C_DOAS.shape[-1] if self._C_DOAS is not None else 0
 
-        C_full = np.concatenate(arrays, axis=-1)
-
         w = self.get_weights_lstsq()
 
         # print(C_full.shape, self.dataset.matrix_fac.shape, w.shape if w is not None else None)
 
-        ST_full, self.matrix_opt = glstsq(C_full, self.dataset.matrix_fac, self.ridge_alpha, w)
+        ST_full, self.matrix_opt = glstsq(C_full, self.dataset.matrix_fac, self.ridge_alpha, w,
+                                             self.dataset.block_size)
+
+        self._C_full = C_full
+        self._ST_full = ST_full
+        self._simulated_values = self._get_values_key(params)
 
         if self.include_artifacts:
             self.ST_artifacts = ST_full[n_s:n_s + n_a]
@@ -1141,13 +1543,327 @@ class BaseKineticModel(KineticModel):
         self.simulate(params)
         return self.weighted_residuals()
 
-    def fit(self):
-        # iter_cb - callback function
-        self.minimizer = Minimizer(self.residuals, self.params, nan_policy='omit') #,
-                                        #  iter_cb=lambda params, iter, resid, *args, **kws: self.is_interruption_requested())
-        
-        self.fit_result = self.minimizer.minimize(method=self.fit_algorithm, **self.fitter_kwds)  # minimize the residuals
-        self.params = self.fit_result.params
+    def projected_residuals(self, params: Parameters):
+        """Weighted residuals calculated by projection of the data onto the orthogonal complement
+        of the C profiles. Spectra and fit matrix are not calculated."""
+
+        C_full = self.simulate_C_full(self.get_param_vector(params))
+        D = self.dataset.matrix_fac
+
+        if C_full is None:
+            return self.apply_sqrt_weights(D)
+
+        method = 'svd' if self.residual_type is ResidualType.VARPRO_SVD else 'qr'
+        R = varpro_residuals(C_full, D, self.ridge_alpha, self.get_weights_lstsq(), method)
+        return self.apply_sqrt_weights(R)
+
+    def _get_values_key(self, params: Parameters | None = None) -> tuple:
+        return tuple(self.get_param_vector(params).array.tolist())
+
+    def _block_depends_on(self, block: str, name: str) -> bool:
+        """Returns True if the profiles of block ('kinetic', 'artifacts' or 'DOAS') depend on parameter name."""
+
+        chirp_or_irf = self.is_chirp_param(name) or self.is_irf_param(name)
+
+        if block == 'artifacts':
+            return chirp_or_irf
+        elif block == 'DOAS':
+            return chirp_or_irf or name.startswith('os_')
+        return not name.startswith('os_')
+
+    # model attributes set by the simulation of each block
+    _profile_attributes: ClassVar[dict[str, tuple[str, ...]]] = {'kinetic': ('C_opt', 'C_opt_full'),
+                                                                 'artifacts': ('C_artifacts',),
+                                                                 'DOAS': ('_C_DOAS',)}
+
+    def _simulate_profiles(self, block: str, params: Parameters | None = None):
+        if block == 'artifacts':
+            self.simulate_artifacts(params)
+        elif block == 'DOAS':
+            self.simulate_C_DOAS(params)
+        else:
+            self.calculate_C_profiles(params, self.dataset.times)
+
+    # model options the profiles depend on, cached profiles are used only for the same values, subclasses
+    # add the options used by their calculate_C_profiles to _kinetic_profile_options
+    _irf_chirp_profile_options: ClassVar[tuple[str, ...]] = ('central_wave', 'include_chirp', 'chirp_type',
+                                                              'num_of_poly_chirp_params', 'num_of_exp_chirp_params',
+                                                              'include_irf', 'irf_type', 'n_irfs', 'include_variable_fwhm',
+                                                              'variable_fwhm_type', 'num_of_poly_varfwhm_params',
+                                                              'chirp_shift_tol')
+    _kinetic_profile_options: ClassVar[tuple[str, ...]] = ('n_species', 'kernel_backend')
+    _artifacts_profile_options: ClassVar[tuple[str, ...]] = ('artifact_order',)
+    _DOAS_profile_options: ClassVar[tuple[str, ...]] = ('n_DOAS', 'kernel_backend')
+
+    def _block_enabled(self, block: str) -> bool:
+        if block == 'artifacts':
+            return self.include_artifacts
+        elif block == 'DOAS':
+            return self.n_DOAS > 0
+        return True
+
+    def _profile_options_key(self, block: str) -> tuple:
+        """Values of the model options the profiles of block depend on."""
+
+        names = self._irf_chirp_profile_options + getattr(self, f'_{block}_profile_options')
+        values = (getattr(self, name, None) for name in names)
+        return tuple(tuple(value) if isinstance(value, list) else value for value in values)
+
+    def _profiles_key(self, block: str, params: Parameters) -> tuple:
+        params = self.get_param_vector(params)
+        values = tuple((name, value) for name, value in zip(params.layout.names, params.array.tolist())
+                       if self._block_depends_on(block, name))
+        data = self.dataset.times.tobytes(), self.dataset.wavelengths.tobytes()
+        return values, self._profile_options_key(block), data
+
+    def _cached_simulate_profiles(self, block: str, params: Parameters | None = None):
+        """Simulates profiles of the block or restores them from the cache."""
+
+        if self.profile_cache_size <= 0 or not self._block_enabled(block):
+            self._simulate_profiles(block, params)
+            return
+
+        params = self.params if params is None else params
+        attributes = self._profile_attributes[block]
+        cache = self._profile_cache.setdefault(block, OrderedDict())
+        counts = self._profile_cache_counts.setdefault(block, [0, 0])
+
+        key = self._profiles_key(block, params)
+        if key in cache:
+            counts[0] += 1
+            cache.move_to_end(key)
+            for attr, value in zip(attributes, cache[key]):
+                setattr(self, attr, value)
+            return
+
+        counts[1] += 1
+        self._simulate_profiles(block, params)
+        cache[key] = tuple(getattr(self, attr) for attr in attributes)
+        while len(cache) > self.profile_cache_size:
+            cache.popitem(last=False)
+
+    def clear_profile_cache(self):
+        self._profile_cache = {}
+        self._profile_cache_counts = {}
+
+    def profile_cache_info(self) -> dict[str, ProfileCacheInfo]:
+        """Returns hits, misses and size of the profile cache for each block."""
+        return {block: ProfileCacheInfo(hits, misses, self.profile_cache_size, len(self._profile_cache.get(block, ())))
+                for block, (hits, misses) in self._profile_cache_counts.items()}
+
+    def _update_params(self):
+        self.clear_profile_cache()
+        super(BaseKineticModel, self)._update_params()
+
+    def _simulate_block(self, block: str, params: Parameters) -> np.ndarray | None:
+        """Simulates only the profiles of the block and returns them. Model state is kept unchanged."""
+
+        state = self.C_opt, self.C_opt_full, self.C_artifacts, self._C_DOAS, self.ST_DOAS
+
+        try:
+            self._simulate_profiles(block, params)
+            return getattr(self, self._profile_attributes[block][0])
+        finally:
+            self.C_opt, self.C_opt_full, self.C_artifacts, self._C_DOAS, self.ST_DOAS = state
+
+    def C_full_derivative(self, name: str, params: Parameters | None = None) -> np.ndarray | None:
+        """Returns the derivative of the concatenated C profiles (see simulate_C_full) from the last
+        simulation with respect to parameter name, or None if C profiles do not depend on it.
+
+        Analytic derivatives are used for kinetic profiles if the model provides them (see C_profiles_derivative),
+        otherwise the profiles of the affected blocks are recalculated with forward finite differences.
+        """
+
+        params = self.params if params is None else params
+        blocks = [(b, C) for b, C in [('kinetic', self.C_opt), ('artifacts', self.C_artifacts), ('DOAS', self._C_DOAS)]
+                  if C is not None]
+
+        dC_full = None
+        start = 0
+        for block, C in blocks:
+            end = start + C.shape[-1]
+
+            if not self._block_depends_on(block, name):
+                start = end
+                continue
+
+            dC = self.C_profiles_derivative(name, params) if block == 'kinetic' else None
+
+            if dC is None:
+                par = params[name]
+                value = par.value
+                # profiles from single precision kernels would be dominated by rounding errors with float64 step
+                single = (self.kernel_backend is KernelBackend.PARALLEL_FLOAT32
+                          and 'kernel_backend' in getattr(self, f'_{block}_profile_options'))
+                h = np.sqrt(np.finfo(np.float32 if single else np.float64).eps) * max(1.0, abs(value))
+                if value + h > par.max:
+                    h = -h
+
+                try:
+                    par.value = value + h
+                    dC = (self._simulate_block(block, params) - C) / h
+                finally:
+                    par.value = value
+
+            if dC_full is None:
+                dC_full = np.zeros(self._C_full.shape)
+            dC_full[..., start:end] = dC
+            start = end
+
+        return dC_full
+
+    def jacobian(self, params: Parameters | None = None) -> np.ndarray:
+        """
+        Calculates the Jacobian of the weighted residuals with respect to varying parameters using
+        the variable projection method. Derivatives of weights are neglected.
+
+        For JacobianType.KAUFMAN, the Kaufman approximation is used, otherwise the full
+        Golub-Pereyra Jacobian is calculated.
+        """
+
+        params = self.params if params is None else params
+        vector = self.get_param_vector(params)
+
+        if self._C_full is None or self._simulated_values != self._get_values_key(vector):
+            self.simulate(vector)
+
+        D = self.dataset.matrix_fac
+        names = [name for name, par in params.items() if par.vary]
+
+        w = self.get_weights_lstsq()
+
+        dCs = (self.C_full_derivative(name, params) for name in names)
+        dfits = lstsq_fit_derivatives(self._C_full, self._ST_full, D, dCs, self.ridge_alpha, w,
+                                      kaufman=self.jacobian_type is JacobianType.KAUFMAN)
+
+        J = np.zeros((D.size, len(names)))
+        for i, dfit in enumerate(dfits):
+            if dfit is not None:
+                J[:, i] = -self.apply_sqrt_weights(dfit).ravel()
+
+        return J
+
+    def _get_fitter_kwds(self) -> dict:
+        if self.jacobian_type is JacobianType.NUMERICAL:
+            return self.fitter_kwds
+
+        if self.fit_algorithm != "least_squares":
+            raise ValueError("Analytic Jacobian can be used only with least_squares fit algorithm.")
+
+        if any(par.expr for par in self.params.values()):
+            raise ValueError("Analytic Jacobian cannot be used with constrained parameters (expressions).")
+
+        if not np.all(np.isfinite(self.dataset.matrix_fac)):
+            raise ValueError("Analytic Jacobian cannot be used with data containing NaN values.")
+
+        return dict(self.fitter_kwds, jac=self.jacobian)
+
+    def _numerical_jacobian(self, fun: Callable, params: Parameters, scheme: str = '2-point',
+                            diff_step: float | None = None) -> np.ndarray:
+        """Finite difference Jacobian of fun(params) with respect to varying parameters. Steps are chosen
+        as in least_squares, one-sided differences are used at the bounds."""
+
+        names = [name for name, par in params.items() if par.vary and par.expr is None]
+        rel_step = diff_step if diff_step is not None else np.finfo(np.float64).eps ** (1 / 3 if scheme == '3-point' else 1 / 2)
+        r0 = None if scheme == '3-point' else np.ravel(fun(params)).copy()
+
+        columns = []
+        for name in names:
+            par = params[name]
+            value = par.value
+            h = rel_step * (1 if value >= 0 else -1) * max(1.0, abs(value))
+            if not par.min <= value + h <= par.max:
+                h = -h
+            central = scheme == '3-point' and par.min <= value - h <= par.max
+
+            try:
+                par.value = value + h
+                params.update_constraints()
+                r_plus = np.ravel(fun(params)).copy()
+                if central:
+                    par.value = value - h
+                    params.update_constraints()
+                    columns.append((r_plus - np.ravel(fun(params))) / (2 * h))
+                    continue
+            finally:
+                par.value = value
+                params.update_constraints()
+
+            if r0 is None:
+                r0 = np.ravel(fun(params)).copy()
+            columns.append((r_plus - r0) / h)
+
+        return np.stack(columns, axis=1)
+
+    def _warm_start_kwds(self, fitter_kwds: dict, fun: Callable) -> dict:
+        """Fitter arguments for continuation of the last fit. The Jacobian from the end of the last fit is
+        used in the first iteration and x_scale is set from its column norms. Following Jacobians are
+        calculated as set by jacobian_type (finite differences with fitter_kwds['jac'] for NUMERICAL).
+        If the varying parameters, the dataset, the residual type or the number of (finite) residuals
+        changed, fitter_kwds are returned unchanged (cold start)."""
+
+        result = self.fit_result
+        J = getattr(result, 'jac', None)
+        names = [name for name, par in self.params.items() if par.vary and par.expr is None]
+
+        if (self.fit_algorithm != "least_squares" or not isinstance(J, np.ndarray) or J.ndim != 2
+                or list(result.var_names) != names or self._fit_state is None):
+            return fitter_kwds
+
+        n_residuals, version, residual_type = self._fit_state
+        if version != self.dataset.version or residual_type is not self.residual_type or J.shape[0] != n_residuals:
+            return fitter_kwds
+
+        # residuals are omitted where they are not finite, eg. for NaN data, weights or masked points
+        if np.isfinite(np.ravel(fun(self.params))).sum() != n_residuals:
+            return fitter_kwds
+
+        norms = np.linalg.norm(J, axis=0)
+        x_scale = 1 / np.where(norms > 0, norms, 1.0)
+
+        jac = fitter_kwds.get('jac', '2-point')
+        diff_step = fitter_kwds.get('diff_step')
+        next_jacobian = jac if callable(jac) else lambda params: self._numerical_jacobian(fun, params, jac, diff_step)
+        J_last = [J]
+
+        def warm_jacobian(params):
+            # the stored Jacobian is used only once
+            return J_last.pop() if J_last else next_jacobian(params)
+
+        kwds = dict(fitter_kwds, jac=warm_jacobian)
+        kwds.setdefault('x_scale', x_scale)
+        return kwds
+
+    def fit(self, warm_start: bool = False, iter_cb: Callable | None = None):
+        """Fits the model starting from current params.
+
+        If warm_start is True, the fit continues from the state of the last fit (see _warm_start_kwds),
+        which makes refits after small changes of the parameters faster.
+
+        iter_cb is passed to lmfit Minimizer, it is called as iter_cb(params, iter, resid) after each
+        function evaluation and the fit is aborted if it returns True."""
+
+        projected = self.residual_type is not ResidualType.FULL
+        fun = self.projected_residuals if projected else self.residuals
+
+        if projected:
+            # weights are calculated from the current fit matrix (or data) and fixed during the fit
+            self._get_weights_cache()
+            self._weights_frozen = True
+        try:
+            fitter_kwds = self._get_fitter_kwds()
+            if warm_start:
+                fitter_kwds = self._warm_start_kwds(fitter_kwds, fun)
+
+            self.minimizer = Minimizer(fun, self.params, nan_policy='omit', iter_cb=iter_cb)
+            self.fit_result = self.minimizer.minimize(method=self.fit_algorithm, **fitter_kwds)  # minimize the residuals
+            self.minimizer.iter_cb = None  # the minimizer is reused for confidence intervals
+            self.params = self.fit_result.params
+            self._fit_state = (self.fit_result.residual.size, self.dataset.version, self.residual_type)
+            if projected:
+                self.simulate(self.params)  # spectra and fit matrix are calculated only once
+        finally:
+            self._weights_frozen = False
 
     def add_amplitudes_to_params(self, params: Parameters | None = None, max_amplitudes = 10):
         params = self.params if params is not None else params
@@ -1162,7 +1878,9 @@ class BaseKineticModel(KineticModel):
             self.params.add(f"A_{i+1}", value=a, vary=False)
 
     def plot_SVD(self, n_values: int | None = 15, n_left_vectors: int = 5, n_right_vectors: int = 5, use_chirp_correction: bool = True,
-                 filepath: bool | None = None, transparent: bool = True, dpi: int = 300, figsize=(17, 5)):
+                 filepath: bool | None = None, transparent: bool = True, dpi: int = 300, figsize=(17, 5),
+                 chirp_interp_method: str = 'linear', chirp_parallel: bool = False):
+        """chirp_interp_method and chirp_parallel are passed to chirp_correction as method and parallel."""
 
         fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=figsize)
 
@@ -1175,7 +1893,7 @@ class BaseKineticModel(KineticModel):
 
         if use_chirp_correction:
             mu = self.get_mu()
-            D, times = chirp_correction(D, times, mu)
+            D, times = chirp_correction(D, times, mu, method=chirp_interp_method, parallel=chirp_parallel)
 
         U, S, VT = svd(D, full_matrices=False)
 
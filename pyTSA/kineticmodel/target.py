@@ -8,6 +8,7 @@ if TYPE_CHECKING:
     from ..dataset import Dataset
 
 from .firstorder import FirstOrderModel
+from .kineticmodel import ParameterLayout
 from ..mathfuncs import simulate_target_model
 
 from lmfit import Parameters
@@ -17,6 +18,8 @@ class TargetFirstOrderModel(FirstOrderModel):
 
     name = "General abstract class for creating target models"
 
+    _kinetic_profile_options = FirstOrderModel._kinetic_profile_options + ('used_compartments',)
+
     def __init__(self, dataset: Dataset | None = None, n_species: int = 1, set_model: bool = False):
         super(TargetFirstOrderModel, self).__init__(dataset, n_species, set_model)
         self._calculate_EAS = False
@@ -68,6 +71,8 @@ class TextBasedTargetFirstOrderModel(TargetFirstOrderModel):
 
     name = "Text-based parametric target first-order kinetic model"
 
+    _kinetic_profile_options = TargetFirstOrderModel._kinetic_profile_options + ('text',)
+
     def __init__(self, dataset: Dataset | None = None, text: str | None = None, set_model: bool = False):
         self.text = text or ""
         self.n_species = 1
@@ -109,6 +114,9 @@ class TextBasedTargetFirstOrderModel(TargetFirstOrderModel):
         For branched kinetics, k_tot_[index] and alpha_[reactant]_[product] are used.
         If j vector is not specified, it will be assumed as [1, 0, ..., 0].
         """
+        # parameter indexes of the rate constants and j vector, compiled for a parameter layout in target_params
+        self._target_plan: tuple | None = None
+
         if not text or not text.strip():
             self._transitions = []
             self._species = []
@@ -233,51 +241,72 @@ class TextBasedTargetFirstOrderModel(TargetFirstOrderModel):
 
         return params
 
-    def target_params(self, params: Parameters) -> tuple[np.ndarray, np.ndarray]:
-        """Return a tuple with the first argument as initial j vector and second argument is K matrix."""
-        n = self.n_species
+    def _compile_target(self, layout: ParameterLayout) -> tuple[list, list]:
+        """Resolves the parameter names of the rate constants and j vector to indexes of the layout.
+
+        Rate entries are (reactant index, product index or None, rate or k_tot index, alpha index or None,
+        indexes of the alphas of the other branches or None), j entries are (constant, index, one_minus)."""
+
         sp_idx = {s: i for i, s in enumerate(self._species)}
-        K = np.zeros((n, n))
+        index = layout.index
+        branched = list(self._branched_reactants.keys())
 
-        def get_rate(reactant: str, to: str | None, rate_name: str) -> float:
+        def rate_entry(reactant: str, to: str | None, rate_name: str) -> tuple:
             if reactant in self._branched_reactants:
                 branches = self._branched_reactants[reactant]
-                tot_key = f"k_tot_{list(self._branched_reactants.keys()).index(reactant)}"
-                k_tot = params[tot_key].value
+                tot_idx = index[f"k_tot_{branched.index(reactant)}"]
                 for i, (to_sp, rn) in enumerate(branches):
                     if (to_sp, rn) == (to, rate_name):
                         if i < len(branches) - 1:
-                            alpha_name = f"alpha_{reactant}_{to_sp or '0'}"
-                            alpha = params[alpha_name].value
-                            return alpha * k_tot
-                        else:
-                            alphas = [params[f"alpha_{reactant}_{t or '0'}"].value
-                                       for t, _ in branches[:-1]]
-                            return (1 - sum(alphas)) * k_tot
-            return params[rate_name].value
+                            return tot_idx, index[f"alpha_{reactant}_{to_sp or '0'}"], None
+                        alpha_idxs = np.asarray([index[f"alpha_{reactant}_{t or '0'}"] for t, _ in branches[:-1]], dtype=np.int64)
+                        return tot_idx, None, alpha_idxs
+            return index[rate_name], None, None
 
+        rates = []
         for fr, to, rate_name in self._transitions:
-            i = sp_idx[fr]
-            k = get_rate(fr, to, rate_name)
+            j = sp_idx[to] if to is not None and to in sp_idx else None
+            rates.append((sp_idx[fr], j, *rate_entry(fr, to, rate_name)))
+
+        js = []
+        for item in self._j_spec[:self.n_species]:
+            if isinstance(item, (int, float)):
+                js.append((float(item), None, False))
+                continue
+            m = re.match(r'1\s*-\s*(\w+)', item)
+            js.append((0.0, index[m.group(1)], True) if m else (0.0, index[item], False))
+
+        return rates, js
+
+    def target_params(self, params: Parameters) -> tuple[np.ndarray, np.ndarray]:
+        """Return a tuple with the first argument as initial j vector and second argument is K matrix."""
+        n = self.n_species
+        params = self.get_param_vector(params)
+
+        if self._target_plan is None or self._target_plan[0] is not params.layout:
+            self._target_plan = (params.layout, *self._compile_target(params.layout))
+        _, rates, js = self._target_plan
+        values = params.array
+
+        K = np.zeros((n, n))
+        for i, j, k_idx, alpha_idx, alpha_idxs in rates:
+            k = values[k_idx]
+            if alpha_idx is not None:
+                k = values[alpha_idx] * k
+            elif alpha_idxs is not None:
+                k = (1 - values[alpha_idxs].sum()) * k
             K[i, i] -= k
-            if to is not None and to in sp_idx:
-                j = sp_idx[to]
+            if j is not None:
                 K[j, i] += k
 
         # j vector
         if self._j_spec:
             j_arr = np.zeros(n)
-            for idx, item in enumerate(self._j_spec):
-                if idx >= n:
-                    break
-                if isinstance(item, (int, float)):
-                    j_arr[idx] = float(item)
+            for idx, (const, p_idx, one_minus) in enumerate(js):
+                if p_idx is None:
+                    j_arr[idx] = const
                 else:
-                    m = re.match(r'1\s*-\s*(\w+)', item)
-                    if m:
-                        j_arr[idx] = 1.0 - params[m.group(1)].value
-                    else:
-                        j_arr[idx] = params[item].value
+                    j_arr[idx] = 1.0 - values[p_idx] if one_minus else values[p_idx]
             # Normalize
             s = j_arr.sum()
             if s > 0:
@@ -317,7 +346,7 @@ class SensitizationModel(TargetFirstOrderModel):
     def target_params(self, params: Parameters) -> tuple[np.ndarray, np.ndarray]:
         """Return a tuple with the first argument as initial j vector and second argument is K matrix"""
         
-        k_sens_0, Kq, k_T = params['k_sens_0'].value, params['Kq'].value, params['k_T'].value
+        k_sens_0, Kq, k_T = self.get_param_vector(params).take('k_sens_0', 'Kq', 'k_T')
 
         K = np.asarray([[-k_sens_0 - Kq, 0],
                         [Kq,      -k_T]])
@@ -351,7 +380,7 @@ class SingletFissionModel(TargetFirstOrderModel):
     def target_params(self, params: Parameters) -> tuple[np.ndarray, np.ndarray]:
         """Return a tuple with the first argument as initial j vector and second argument is K matrix"""
 
-        tau_S1_hot, tau_TT, tau_S1, alpha_S1_hot_TT = params['tau_S1_hot'].value, params['tau_TT'].value, params['tau_S1'].value, params['alpha_S1_hot_TT'].value
+        tau_S1_hot, tau_TT, tau_S1, alpha_S1_hot_TT = self.get_param_vector(params).take('tau_S1_hot', 'tau_TT', 'tau_S1', 'alpha_S1_hot_TT')
 
         K = np.asarray([[-1/tau_S1_hot, 0, 0, 0],
                         [(1 - alpha_S1_hot_TT) / tau_S1_hot, -1/tau_S1, 0, 0],
@@ -387,7 +416,7 @@ class SingletFissionModelImpurity(TargetFirstOrderModel):
     def target_params(self, params: Parameters) -> tuple[np.ndarray, np.ndarray]:
         """Return a tuple with the first argument as initial j vector and second argument is K matrix"""
 
-        tau_S1_hot, tau_TT, tau_imp, alpha_imp = params['tau_S1_hot'].value, params['tau_TT'].value, params['tau_imp'].value, params['alpha_imp'].value
+        tau_S1_hot, tau_TT, tau_imp, alpha_imp = self.get_param_vector(params).take('tau_S1_hot', 'tau_TT', 'tau_imp', 'alpha_imp')
 
         # S1 hot, impurity, TT, T1 + T1
 
@@ -405,6 +434,10 @@ class DelayedFluorescenceModel(TargetFirstOrderModel):
 
     name = "Delayed fluorescence kinetic model"
 
+    _kinetic_profile_options = TargetFirstOrderModel._kinetic_profile_options + ('add_quenching_rates',
+                                                                                 'add_extra_first_order_compartment',
+                                                                                 'add_inf_compartment')
+
     def __init__(self, dataset: Dataset | None = None, set_model: bool = False):
         self.add_quenching_rates = False
         self.add_extra_first_order_compartment = False
@@ -449,7 +482,8 @@ class DelayedFluorescenceModel(TargetFirstOrderModel):
     def target_params(self, params: Parameters | None = None) -> tuple[np.ndarray, np.ndarray]:
         """Return a tuple with the first argument as initial j vector and second argument is K matrix"""
         
-        k_rnr, k_isc, k_risc = params['k_rnr'].value, params['k_isc'].value, params['k_risc'].value
+        params = self.get_param_vector(params)
+        k_rnr, k_isc, k_risc = params.take('k_rnr', 'k_isc', 'k_risc')
 
         kq_s = 0
         kq_t = 0
@@ -457,10 +491,7 @@ class DelayedFluorescenceModel(TargetFirstOrderModel):
         ki_risc = 0
 
         if self.add_quenching_rates:
-            kq_s = params['Kq_singlet'].value
-            kq_t = params['Kq_triplet'].value
-            ki_isc = params['K_iisc'].value
-            ki_risc = params['K_irisc'].value
+            kq_s, kq_t, ki_isc, ki_risc = params.take('Kq_singlet', 'Kq_triplet', 'K_iisc', 'K_irisc')
             # f_spin = params['f_spin'].value
             # ki_isc = k_isc * f_spin
             # ki_risc = k_risc * f_spin
@@ -502,6 +533,8 @@ class DelayedFluorescenceModelExtended(TargetFirstOrderModel):
 
     name = "Delayed fluorescence kinetic model"
 
+    _kinetic_profile_options = TargetFirstOrderModel._kinetic_profile_options + ('total_PLQY',)
+
     def __init__(self, dataset: Dataset | None = None, set_model: bool = False):
         super(DelayedFluorescenceModel, self).__init__(dataset, 3, set_model)
 
@@ -541,7 +574,7 @@ class DelayedFluorescenceModelExtended(TargetFirstOrderModel):
     def target_params(self, params: Parameters | None = None) -> tuple[np.ndarray, np.ndarray]:
         """Return a tuple with the first argument as initial j vector and second argument is K matrix"""
         
-        k_r, k_nr, k_isc, k_risc, k_nr_T = params['k_r'].value, params['k_nr'].value,  params['k_isc'].value, params['k_risc'].value, params['k_nr_T'].value
+        k_r, k_nr, k_isc, k_risc, k_nr_T = self.get_param_vector(params).take('k_r', 'k_nr', 'k_isc', 'k_risc', 'k_nr_T')
                 
         K = np.asarray([[-k_r - k_nr - k_isc, k_risc],
                         [k_isc,         -k_risc - k_nr_T]])
@@ -1,6 +1,7 @@
-from typing import Callable
+from typing import Callable, Iterable, Iterator
+from functools import lru_cache
 import numpy as np
-from numba import njit, vectorize
+from numba import njit, prange, vectorize
 
 # from scipy.linalg import svd
 from math import erfc as math_erfc
@@ -9,6 +10,7 @@ from math import fabs
 import scipy
 posv = scipy.linalg.get_lapack_funcs(('posv'))
 from scipy.linalg import lstsq as scipy_lstsq
+from scipy.linalg import cho_factor, cho_solve
 from scipy.integrate import cumulative_trapezoid
 from numpy.linalg import pinv
 from numpy.polynomial.hermite import hermgauss
@@ -24,18 +26,96 @@ sqpi = np.sqrt(np.pi)
 # from scipy.linalg import lstsq
 
 
+@njit(parallel=True, fastmath=True)
+def _blstsq_normal_eqs(A: np.ndarray, B: np.ndarray, alpha: float, w: np.ndarray, X: np.ndarray, fit: np.ndarray):
+    """Accumulates and solves normal equations (A_l^T W A_l + alpha I) x_l = A_l^T W B_l for each l
+    by Cholesky decomposition in place. Results are written to X (L, N) and fit (L, M). Columns of A_l
+    that are linearly dependent on the previous ones (up to rounding) get zero coefficients."""
+
+    L, M, N = A.shape
+
+    for l in prange(L):
+        At = np.empty((N, M))  # contiguous copy of A_l^T, so that the reductions over M are vectorized
+        G = np.empty((N, N))
+        x = np.empty(N)
+
+        for m in range(M):
+            for i in range(N):
+                At[i, m] = A[l, m, i]
+
+        # lower triangle of Gram matrix and right hand side
+        for i in range(N):
+            s = 0.0
+            for m in range(M):
+                s += w[m] * At[i, m] * B[l, m]
+            x[i] = s
+            for j in range(i + 1):
+                s = 0.0
+                for m in range(M):
+                    s += w[m] * At[i, m] * At[j, m]
+                G[i, j] = s
+
+        # Cholesky decomposition G = L L^T
+        for j in range(N):
+            d = G[j, j] + alpha
+            s = d
+            for p in range(j):
+                s -= G[j, p] * G[j, p]
+            if s <= 1e-13 * d:
+                # (nearly) singular, column j is removed from the solution by zero pivot and zero column,
+                # it is skipped in the substitutions
+                for i in range(j, N):
+                    G[i, j] = 0.0
+                continue
+            G[j, j] = np.sqrt(s)
+            for i in range(j + 1, N):
+                s = G[i, j]
+                for p in range(j):
+                    s -= G[i, p] * G[j, p]
+                G[i, j] = s / G[j, j]
+
+        # forward and back substitution
+        for i in range(N):
+            if G[i, i] == 0.0:
+                x[i] = 0.0
+                continue
+            s = x[i]
+            for p in range(i):
+                s -= G[i, p] * x[p]
+            x[i] = s / G[i, i]
+        for i in range(N - 1, -1, -1):
+            if G[i, i] == 0.0:
+                continue
+            s = x[i]
+            for p in range(i + 1, N):
+                s -= G[p, i] * x[p]
+            x[i] = s / G[i, i]
+
+        for i in range(N):
+            X[l, i] = x[i]
+        for m in range(M):
+            fit[l, m] = 0.0
+        for i in range(N):
+            for m in range(M):
+                fit[l, m] += At[i, m] * x[i]
+
+
 ## inspiration from https://github.com/Tillsten/skultrafast/blob/9544c3cc3c3c3fa46b728156198807e2b21ba24b/skultrafast/base_funcs/pytorch_fitter.py
-def blstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.001, w: np.ndarray | None = None) -> np.ndarray:
+def blstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.001, w: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
     """
-    Batched linear least-squares by numpy with direct solve method with optional Tikhonov regularization
-    to prevent errors in case of singular matrices.
-    Minimizes sum ||A_i x_i - B_i||_2^2 + alpha||Ix||_2^2 for x, where A is a tensor (L, M, N), B is matrix (L, M)
+    Batched linear least-squares with direct solve of normal equations, with optional Tikhonov regularization
+    to prevent errors in case of singular matrices and with optional weights.
+    Minimizes sum ||W^1/2 (A_i x_i - B_i)||_2^2 + alpha||Ix||_2^2 for x, where A is a tensor (L, M, N), B is matrix (L, M)
+
+    Gram matrices and right hand sides are accumulated by numba kernel for each i without
+    creating temporary (L, M, N) arrays.
 
     Parameters
     ----------
         A : shape(L, M, N)
         B : shape(L, M)
         alpha: float
+        w : None or shape(M), weights for each row of A_i
 
     Returns
     -------
@@ -43,37 +123,50 @@ def blstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.001, w: np.ndarray | N
     """
 
     # https://en.wikipedia.org/wiki/Tikhonov_regularization
-    # (A^T A + alpha*I) X = A^T B, solve for X
-
-    AT = np.transpose(A, (0, 2, 1))  # transpose of A
-    ATA = np.matmul(AT, A)  # A.T @ A
-    ATB = np.matmul(AT, B[..., None])  # A.T @ B
+    # (A^T W A + alpha*I) X = A^T W B, solve for X
 
-    if alpha != 0:
-        I = alpha * np.eye(ATA.shape[-1])  # alpha * identity matrix
-        ATA += I[None, ...]  # add to ATA
+    L, M, N = A.shape
+    if w is None:
+        w = np.ones(M)
+    else:
+        assert w.shape[0] == M
 
-    X = np.linalg.solve(ATA, ATB)  # solve batched linear system of equations
+    X = np.empty((L, N))
+    fit = np.empty((L, M))
 
-    fit = np.matmul(A, X).squeeze().T
+    _blstsq_normal_eqs(A, B, float(alpha), np.asarray(w, dtype=np.float64), X, fit)
 
-    return X[..., 0].T, fit
+    return X.T, fit.T
 
 
-def lstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.0001, w: np.ndarray | None = None) -> np.ndarray:
+def lstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.0001, w: np.ndarray | None = None,
+          block_size: int | None = None) -> np.ndarray:
     """fast: solve least squares solution for X: AX=B by ordinary least squares, with direct solve,
-    with optional Tikhonov regularization, with optional weight, the solution is for (At W A)X = At W B"""
+    with optional Tikhonov regularization, with optional weight, the solution is for (At W A)X = At W B.
+    If block_size is given, normal equations are accumulated over blocks of block_size rows, so that
+    no temporary array of the size of B is created (B can be memory-mapped)."""
 
     if w is not None:
         assert w.shape[0] == B.shape[0]
-        Aw = A * w[:, None] if A.ndim == 2 else A * w
-        Bw = B * w[:, None] if B.ndim == 2 else B * w
-    else:
-        Aw = A
-        Bw = B
-    
-    ATA = A.T.dot(Aw)
-    ATB = A.T.dot(Bw)
+
+    ATA = np.zeros((A.shape[1], A.shape[1]))
+    ATB = np.zeros(A.shape[1:2] + B.shape[1:])
+    step = max(A.shape[0] if block_size is None else block_size, 1)
+
+    for start in range(0, A.shape[0], step):
+        A_b = A[start:start + step]
+        B_b = B[start:start + step]
+
+        if w is not None:
+            w_b = w[start:start + step]
+            Aw = A_b * w_b[:, None] if A_b.ndim == 2 else A_b * w_b
+            Bw = B_b * w_b[:, None] if B_b.ndim == 2 else B_b * w_b
+        else:
+            Aw = A_b
+            Bw = B_b
+
+        ATA += A_b.T.dot(Aw)
+        ATB += A_b.T.dot(Bw)
 
     if alpha != 0:
         ATA.flat[::ATA.shape[-1] + 1] += alpha
@@ -85,16 +178,18 @@ def lstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.0001, w: np.ndarray | N
     return x
 
 
-def glstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.0001, w: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+def glstsq(A: np.ndarray, B: np.ndarray, alpha: float = 0.0001, w: np.ndarray | None = None,
+           block_size: int | None = None) -> tuple[np.ndarray, np.ndarray]:
     """Generalized Ridge regression. If A is a 3D tensor, it switches to batch least squares.
+    For 2D A, normal equations are accumulated over blocks of block_size rows of B if it is given.
     
     Returns solution X and fit = A @ X"""
 
     if A.ndim == 3:
-        X, fit = blstsq(A, B.T, alpha)
+        X, fit = blstsq(A, B.T, alpha, w)
         return X, fit
     else:
-        X = lstsq(A, B, alpha, w)
+        X = lstsq(A, B, alpha, w, block_size)
         return X, np.dot(A, X)
 
 
@@ -235,6 +330,58 @@ def res_parvarpro_svd(C, D, rcond=1e-10):
     return residuals
 
 
+def varpro_residuals(C: np.ndarray, D: np.ndarray, alpha: float = 0.0001, w: np.ndarray | None = None,
+                     method: str = 'qr', rcond: float = 1e-10) -> np.ndarray:
+    """
+    Calculates the residuals D - C @ ST of the weighted ridge regression solved by glstsq as projected
+    residuals W^-1/2 (I - P) W^1/2 D, without forming ST and the fit matrix.
+
+    For method 'qr', the projector P = Q1 @ Q1^T is calculated from the QR decomposition of the
+    matrix [W^1/2 C; sqrt(alpha) I], where Q1 are the first n_t rows of Q. For method 'svd', P = U diag(f) U^T
+    is calculated from SVD of W^1/2 C = U S V^T with filter factors f = S^2 / (S^2 + alpha), singular values
+    lower than rcond * S_max are removed.
+
+    C is matrix (n_t, k) or tensor (n_w, n_t, k), D is matrix (n_t, n_w), w is None or vector of
+    weights for each time point (n_t,).
+    """
+
+    if method not in ('qr', 'svd'):
+        raise ValueError(f"method must be 'qr' or 'svd', got {method}")
+
+    tensor = C.ndim == 3
+    k = C.shape[-1]
+
+    sw = None if w is None else np.sqrt(w)[:, None]
+    Dw = D.T[..., None] if tensor else D  # (n_w, n_t, 1) for tensor C
+    if sw is not None:
+        Cw = C * sw
+        Dw = Dw * sw
+    else:
+        Cw = C
+
+    if method == 'qr':
+        if alpha != 0:
+            I = np.sqrt(alpha) * np.eye(k)
+            B = np.concatenate((Cw, np.broadcast_to(I, Cw.shape[:-2] + (k, k))), axis=-2)
+        else:
+            B = Cw
+        Q = np.linalg.qr(B)[0][..., :C.shape[-2], :]
+        QT = np.swapaxes(Q, -1, -2)
+        R = Dw - np.matmul(Q, np.matmul(QT, Dw))
+    else:
+        U, S, _ = np.linalg.svd(Cw, full_matrices=False)
+        f = S * S / (S * S + alpha)
+        f[S < rcond * np.max(S, axis=-1, keepdims=True)] = 0  # remove small singular values
+        UT = np.swapaxes(U, -1, -2)
+        R = Dw - np.matmul(U, f[..., None] * np.matmul(UT, Dw))
+
+    if sw is not None:
+        # rows with zero weight do not contribute to residuals
+        R *= np.divide(1, sw, out=np.zeros_like(sw), where=sw > 0)
+
+    return R[..., 0].T if tensor else R
+
+
 # copied from https://github.com/Tillsten/skultrafast/blob/23572ba9ea32238f34a8a15390fb572ecd8bc6fa/skultrafast/base_funcs/backend_tester.py
 # © Till Stensitzki
 # @vectorize(nopython=True, fastmath=False)
@@ -369,8 +516,50 @@ def reshape_arrays(t: np.ndarray, k: np.ndarray | float, fwhm: np.ndarray | floa
     
 
 
+@lru_cache(maxsize=None)
+def hermite_nodes(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns cached Gauss-Hermite nodes and weights of order n."""
+    nodes, weights = hermgauss(n)
+    return nodes.astype(np.float64), weights.astype(np.float64)
+
+
+def adaptive_hermite_nodes_count(b: float, n_min: int = 5, n_max: int = N_HERM) -> int:
+    """Number of Gauss-Hermite nodes for the lifetime distribution of width b. The quadrature error
+    of the folded exponential (relative to the amplitude) is below approx. 1e-12 for b <= 0.7 and
+    1e-8 for b <= 1. For larger b, the count is limited by n_max and the error grows quickly
+    (approx. 1e-6 at b = 1.5 for n_max = 60)."""
+    n = int(np.ceil(5 + 40 * b + 15 * b * b))
+    return min(n_max, max(n_min, n))
+
+
+@njit(parallel=True, fastmath=False)
+def _exp_dist_nodes(square: bool, tt: np.ndarray, width: np.ndarray, k_nodes: np.ndarray, w_nodes: np.ndarray,
+                    n_nodes: np.ndarray, out: np.ndarray):
+    """Accumulates weighted sum of exponentials over Gauss-Hermite nodes directly into out (n_w, n_t, n).
+    tt is (n_w, n_t), width is (n_w,), k_nodes and w_nodes are rates and weights at the nodes (n, n_max),
+    only the first n_nodes[i] are used for component i."""
+
+    n_w, n_t = tt.shape
+    n = k_nodes.shape[0]
+
+    for idx in prange(n_w * n_t):
+        i = idx // n_t
+        j = idx % n_t
+        t = tt[i, j]
+        wd = width[i]
+        for c in range(n):
+            s = 0.0
+            for q in range(n_nodes[c]):
+                if square:
+                    s += w_nodes[c, q] * _square_conv_exp(t, k_nodes[c, q], wd)
+                else:
+                    s += w_nodes[c, q] * _fold_exp(t, k_nodes[c, q], wd)
+            out[i, j, c] = s / sqpi
+
+
 def exp_dist(f_exp: Callable[[np.ndarray | float, np.ndarray | float, np.ndarray | float], np.ndarray | float], 
-             t: np.ndarray, k: np.ndarray | float, width: np.ndarray | float, b: np.ndarray | float, mu: np.ndarray | float = 0):
+             t: np.ndarray, k: np.ndarray | float, width: np.ndarray | float, b: np.ndarray | float, mu: np.ndarray | float = 0,
+             n_nodes: int | None = None):
 
     """
     Exponential decay (either folded exponential or square wave convoluted exponential)
@@ -378,6 +567,8 @@ def exp_dist(f_exp: Callable[[np.ndarray | float, np.ndarray | float, np.ndarray
 
 
     f_exp - the exponential function (fold_exp_vec or square_conv_exp_vec) that will be called
+    n_nodes - number of Gauss-Hermite nodes for dispersive kinetics, if None, it is chosen for each
+    component by adaptive_hermite_nodes_count
     
     """
 
@@ -399,7 +590,7 @@ def exp_dist(f_exp: Callable[[np.ndarray | float, np.ndarray | float, np.ndarray
     # print("mask_nodis", mask_nodis)
 
     n_rates = k.shape[-1]
-    signal = np.zeros(tt.shape[:-1] + (n_rates,))
+    signal = np.zeros(np.broadcast_shapes(tt.shape[:-1], np.shape(width)[:-1]) + (n_rates,))
     # print(signal.shape)
 
     # mask for disorder, to separate cases when b == 0 => fold_exp, or b > 0 => sum over hermite nodes
@@ -427,25 +618,85 @@ def exp_dist(f_exp: Callable[[np.ndarray | float, np.ndarray | float, np.ndarray
         k_masked = k[..., mask_dis]
         b_masked = b[..., mask_dis]
 
-        nodes_nd = H_NODES.reshape(-1, *((1,) * b_masked.ndim))   # prepend 1 dimension
-        k_dist = k_masked[None, ...] * np.exp(np.sqrt(2.0) * b_masked[None, ...] * nodes_nd)   # make a 4 or  dim tensor to handle the calculations 
-        component = f_exp(tt[None, ...], k_dist, width)
-
-        # print("k_masked shape", k_masked.shape)
-        # print("mask_dis", mask_dis)
-        # print("signal shape", signal.shape)
-        # print("fwhm shape", width.shape if isinstance(width, np.ndarray) else width)
-        # print("tt shape", tt.shape)
-        # print("component shape", component.shape)
+        square = f_exp in (square_conv_exp_vec, square_conv_exp_par, square_conv_exp_f32)
+        if (square or f_exp in (fold_exp_vec, fold_exp_par, fold_exp_f32)) and not np.iscomplexobj(k_masked):
+            # fused kernel, the (n_nodes, n_w, n_t, n) tensor is not created
+            k_flat, b_flat = k_masked.ravel(), b_masked.ravel()
+            counts = np.asarray([adaptive_hermite_nodes_count(abs(bi)) if n_nodes is None else n_nodes
+                                 for bi in b_flat], dtype=np.int64)
+            k_nodes = np.zeros((k_flat.shape[0], counts.max()))
+            w_nodes = np.zeros_like(k_nodes)
+            for c, n in enumerate(counts):
+                nodes, weights = hermite_nodes(n)
+                k_nodes[c, :n] = k_flat[c] * np.exp(np.sqrt(2.0) * b_flat[c] * nodes)
+                w_nodes[c, :n] = weights
+
+            out_shape = signal.shape[:-1] + (k_flat.shape[0],)
+            n_t = out_shape[-2]
+            tt2 = np.broadcast_to(tt[..., 0], out_shape[:-1]).reshape(-1, n_t)
+            width2 = np.ascontiguousarray(np.broadcast_to(np.ravel(width), (tt2.shape[0],)), dtype=np.float64)
+            out = np.empty((tt2.shape[0], n_t, k_flat.shape[0]))
+            _exp_dist_nodes(square, tt2, width2, k_nodes, w_nodes, counts, out)
+            signal[..., mask_dis] = out.reshape(out_shape)
+        else:
+            nodes, weights = hermite_nodes(N_HERM if n_nodes is None else n_nodes)
+            nodes_nd = nodes.reshape(-1, *((1,) * b_masked.ndim))   # prepend 1 dimension
+            k_dist = k_masked[None, ...] * np.exp(np.sqrt(2.0) * b_masked[None, ...] * nodes_nd)   # make a 4 or  dim tensor to handle the calculations 
+            component = f_exp(tt[None, ...], k_dist, width)
 
-        # sightly faster than classical elementwise multiplication and then summation
-        signal[..., mask_dis] = np.tensordot(H_WEIGHTS, component, axes=(0, 0)) / sqpi
+            # sightly faster than classical elementwise multiplication and then summation
+            signal[..., mask_dis] = np.tensordot(weights, component, axes=(0, 0)) / sqpi
 
     return signal
 
 
-@vectorize(nopython=True, fastmath=False)
-def fold_exp_vec(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+def quantize_shifts(mu: np.ndarray, tol: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Quantizes time zeros mu to levels spaced by tol. Returns tuple of unique levels,
+    index of the level for each mu and the remaining shifts mu - levels[index], |shift| <= tol / 2.
+    """
+    mu = np.asarray(mu, dtype=np.float64)
+    q = np.round((mu - mu.min()) / tol)
+    q_unique, index = np.unique(q, return_inverse=True)
+    levels = mu.min() + q_unique * tol
+    return levels, index, mu - levels[index]
+
+
+def exp_dist_shifted(f_exp: Callable[[np.ndarray | float, np.ndarray | float, np.ndarray | float], np.ndarray | float],
+                     t: np.ndarray, k: np.ndarray | float, width: float, b: np.ndarray | float | None, mu: np.ndarray,
+                     tol: float, n_nodes: int | None = None) -> np.ndarray:
+    """
+    The same as exp_dist, but for chirped data, the decays are evaluated only for time zeros quantized
+    to levels spaced by tol (see quantize_shifts) and the profiles for each wavelength are obtained
+    by gathering and first order Taylor correction f(t - mu) = f(t - mu_q) - (mu - mu_q) f'(t - mu_q).
+    The error is lower than tol^2 / 8 * max|f''|. For kernels with a discontinuous first derivative
+    (square pulse), the error near the discontinuities is first order, lower than tol / 2 * jump of f'.
+
+    Falls back to exp_dist if width is not a scalar (variable FWHM), mu is a scalar or the derivative
+    of f_exp is not known.
+    """
+
+    mu = np.atleast_1d(mu)
+    derivatives = get_exp_derivatives(f_exp)
+
+    if mu.shape[0] == 1 or np.size(width) > 1 or derivatives is None or np.iscomplexobj(k):
+        return exp_dist(f_exp, t, k, width, b, mu, n_nodes)
+
+    levels, index, dmu = quantize_shifts(mu, tol)
+    if levels.shape[0] == mu.shape[0]:
+        return exp_dist(f_exp, t, k, width, b, mu, n_nodes)
+
+    n_t = np.atleast_1d(t).shape[0]
+    C_q = exp_dist(f_exp, t, k, width, b, levels, n_nodes).reshape(levels.shape[0], n_t, -1)
+    dC_q = exp_dist(derivatives[0], t, k, width, b, levels, n_nodes).reshape(levels.shape[0], n_t, -1)
+
+    C = C_q[index]
+    C -= dmu[:, None, None] * dC_q[index]
+    return C
+
+
+@njit(fastmath=False)
+def _fold_exp(t: float, k: float, fwhm: float) -> float:
 
     w = fwhm / (2 * np.sqrt(np.log(2)))  # gaussian width
     
@@ -459,10 +710,16 @@ def fold_exp_vec(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray
 
     # no IRF, just exponential decay
     return np.exp(-t * k) if t >= 0 else 0
-    
+
+
+@vectorize(nopython=True, fastmath=False)
+def fold_exp_vec(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    return _fold_exp(t, k, fwhm)
+
+
 # exponential convoluted with square wave, from https://lpsa.swarthmore.edu/Convolution/Convolution2.html and wolfram alpha
-@vectorize(nopython=True, fastmath=True)
-def square_conv_exp_vec(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+@njit(fastmath=True)
+def _square_conv_exp(t: float, k: float, width: float) -> float:
 
     if width == 0:
         return np.exp(-t * k) if t >= 0 else 0
@@ -476,8 +733,284 @@ def square_conv_exp_vec(t: np.ndarray | float, k: np.ndarray | float, width: np.
         
         return (1 - np.exp(-tt * k)) / (k * width) 
     else:
-        return (np.exp(k * width) - 1) * np.exp(-k * tt) / (k * width) 
-    
+        return (np.exp(k * width) - 1) * np.exp(-k * tt) / (k * width)
+
+
+@vectorize(nopython=True, fastmath=True)
+def square_conv_exp_vec(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    return _square_conv_exp(t, k, width)
+
+
+# multi-threaded variants of fold_exp_vec and square_conv_exp_vec, compiled for float64
+
+@vectorize(['float64(float64, float64, float64)'], nopython=True, target='parallel', cache=True)
+def fold_exp_par(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    return _fold_exp(t, k, fwhm)
+
+
+@vectorize(['float64(float64, float64, float64)'], nopython=True, target='parallel', cache=True, fastmath=True)
+def square_conv_exp_par(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    return _square_conv_exp(t, k, width)
+
+
+# single precision variants, all constants are float32 so that the calculation is not promoted to float64
+_F32_0 = np.float32(0)
+_F32_1 = np.float32(1)
+_F32_HALF = np.float32(0.5)
+_F32_QUARTER = np.float32(0.25)
+_F32_005 = np.float32(0.05)
+_F32_SQPI = np.float32(np.sqrt(np.pi))
+_F32_FWHM2W = np.float32(1 / (2 * np.sqrt(np.log(2))))
+_F32_ERFC_ASYMPT = np.float32(8)
+
+
+@njit(fastmath=True)
+def _fold_exp_f32(t: np.float32, k: np.float32, fwhm: np.float32) -> np.float32:
+
+    w = fwhm * _F32_FWHM2W  # gaussian width
+
+    if w > _F32_0:
+        if k > _F32_0 and (_F32_1 / k) < _F32_005 * fwhm:
+            return (_F32_1 / (k * w * _F32_SQPI)) * np.exp(-(t / w) * (t / w))
+
+        x = w * k * _F32_HALF - t / w
+        if x < _F32_ERFC_ASYMPT:
+            return _F32_HALF * np.exp(k * (k * w * w * _F32_QUARTER - t)) * math_erfc(x)
+
+        # exp(.) * erfc(x) would overflow and underflow in single precision, asymptotic expansion
+        # of erfc(x) is used instead, exp(k * (k * w^2 / 4 - t) - x^2) = exp(-t^2 / w^2)
+        x2 = _F32_1 / (x * x)
+        series = _F32_1 - x2 * (np.float32(0.5) - x2 * (np.float32(0.75) - x2 * np.float32(1.875)))
+        return _F32_HALF * np.exp(-(t / w) * (t / w)) / (x * _F32_SQPI) * series
+
+    return np.exp(-t * k) if t >= _F32_0 else _F32_0
+
+
+@njit(fastmath=True)
+def _square_conv_exp_f32(t: np.float32, k: np.float32, width: np.float32) -> np.float32:
+
+    if width == _F32_0:
+        return np.exp(-t * k) if t >= _F32_0 else _F32_0
+
+    w2 = width * _F32_HALF
+
+    if t < -w2:
+        return _F32_0
+    elif t < w2:
+        return -np.expm1(-(t + w2) * k) / (k * width)
+    else:
+        # (exp(k * width) - 1) * exp(-k * (t + w2)) without overflow of exp(k * width)
+        return -np.expm1(-k * width) * np.exp(-k * (t - w2)) / (k * width)
+
+
+@vectorize(['float32(float32, float32, float32)'], nopython=True, target='parallel', cache=True, fastmath=True)
+def _fold_exp_f32_vec(t, k, fwhm):
+    return _fold_exp_f32(t, k, fwhm)
+
+
+@vectorize(['float32(float32, float32, float32)'], nopython=True, target='parallel', cache=True, fastmath=True)
+def _square_conv_exp_f32_vec(t, k, width):
+    return _square_conv_exp_f32(t, k, width)
+
+
+def fold_exp_f32(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    """Multi-threaded fold_exp_vec evaluated in single precision, the result is returned as float64.
+    Absolute error is lower than 1e-6 (the amplitude of the decay is 1), relative error of the decaying
+    part grows approx. as k * t * 6e-8."""
+    return _fold_exp_f32_vec(np.asarray(t, dtype=np.float32), np.asarray(k, dtype=np.float32),
+                             np.asarray(fwhm, dtype=np.float32)).astype(np.float64)
+
+
+def square_conv_exp_f32(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    """Multi-threaded square_conv_exp_vec evaluated in single precision, the result is returned as float64.
+    Absolute error is lower than 1e-6 (relative to 1 / (k * width) for the rising part)."""
+    return _square_conv_exp_f32_vec(np.asarray(t, dtype=np.float32), np.asarray(k, dtype=np.float32),
+                                    np.asarray(width, dtype=np.float32)).astype(np.float64)
+
+
+# partial derivatives of fold_exp_vec, used for analytic Jacobian
+# with g = exp(-t^2/w^2) / sqrt(pi), the derivatives of the erfc branch simplify to
+# df/dt = -k f + g / w, df/dk = (k w^2 / 2 - t) f - w g / 2, df/dw = k^2 w f / 2 - g (k / 2 + t / w^2)
+
+@vectorize(nopython=True, fastmath=False)
+def fold_exp_dt(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of fold_exp_vec with respect to time."""
+
+    w = fwhm / (2 * np.sqrt(np.log(2)))
+
+    if w > 0:
+        g = np.exp(-(t / w) ** 2) / np.sqrt(np.pi)
+        if k > 0 and (1.0 / k) < 0.05 * fwhm:
+            return -2 * t * g / (k * w ** 3)
+        else:
+            f = 0.5 * np.exp(k * (k * w * w / 4.0 - t)) * math_erfc(w * k / 2.0 - t / w)
+            return -k * f + g / w
+
+    return -k * np.exp(-t * k) if t >= 0 else 0
+
+
+@vectorize(nopython=True, fastmath=False)
+def fold_exp_dk(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of fold_exp_vec with respect to the rate constant."""
+
+    w = fwhm / (2 * np.sqrt(np.log(2)))
+
+    if w > 0:
+        g = np.exp(-(t / w) ** 2) / np.sqrt(np.pi)
+        if k > 0 and (1.0 / k) < 0.05 * fwhm:
+            return -g / (k * k * w)
+        else:
+            f = 0.5 * np.exp(k * (k * w * w / 4.0 - t)) * math_erfc(w * k / 2.0 - t / w)
+            return (k * w * w / 2 - t) * f - w * g / 2
+
+    return -t * np.exp(-t * k) if t >= 0 else 0
+
+
+@vectorize(nopython=True, fastmath=False)
+def fold_exp_dfwhm(t: np.ndarray | float, k: np.ndarray | float, fwhm: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of fold_exp_vec with respect to FWHM of the IRF."""
+
+    c = 2 * np.sqrt(np.log(2))
+    w = fwhm / c
+
+    if w > 0:
+        g = np.exp(-(t / w) ** 2) / np.sqrt(np.pi)
+        if k > 0 and (1.0 / k) < 0.05 * fwhm:
+            f = g / (k * w)
+            return f * (2 * t * t / w ** 3 - 1 / w) / c
+        else:
+            f = 0.5 * np.exp(k * (k * w * w / 4.0 - t)) * math_erfc(w * k / 2.0 - t / w)
+            return (k * k * w * f / 2 - g * (k / 2 + t / (w * w))) / c
+
+    return 0
+
+
+# partial derivatives of square_conv_exp_vec, used for analytic Jacobian
+
+@vectorize(nopython=True, fastmath=True)
+def square_conv_exp_dt(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of square_conv_exp_vec with respect to time."""
+
+    if width == 0:
+        return -k * np.exp(-t * k) if t >= 0 else 0
+
+    w2 = width / 2
+    tt = t + w2
+
+    if t < -w2:
+        return 0
+    elif t >= -w2 and t < w2:
+        return np.exp(-tt * k) / width
+    else:
+        return -(np.exp(k * width) - 1) * np.exp(-k * tt) / width
+
+
+@vectorize(nopython=True, fastmath=True)
+def square_conv_exp_dk(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of square_conv_exp_vec with respect to the rate constant."""
+
+    if width == 0:
+        return -t * np.exp(-t * k) if t >= 0 else 0
+
+    w2 = width / 2
+    tt = t + w2
+
+    if t < -w2:
+        return 0
+    elif t >= -w2 and t < w2:
+        f = (1 - np.exp(-tt * k)) / (k * width)
+        return tt * np.exp(-tt * k) / (k * width) - f / k
+    else:
+        f = (np.exp(k * width) - 1) * np.exp(-k * tt) / (k * width)
+        return np.exp(k * (width - tt)) / k - tt * f - f / k
+
+
+@vectorize(nopython=True, fastmath=True)
+def square_conv_exp_dwidth(t: np.ndarray | float, k: np.ndarray | float, width: np.ndarray | float) -> np.ndarray | float:
+    """Partial derivative of square_conv_exp_vec with respect to the width of the square IRF."""
+
+    if width == 0:
+        return 0
+
+    w2 = width / 2
+    tt = t + w2
+
+    if t < -w2:
+        return 0
+    elif t >= -w2 and t < w2:
+        f = (1 - np.exp(-tt * k)) / (k * width)
+        return np.exp(-tt * k) / (2 * width) - f / width
+    else:
+        f = (np.exp(k * width) - 1) * np.exp(-k * tt) / (k * width)
+        return np.exp(k * (width - tt)) / width - k * f / 2 - f / width
+
+
+def get_exp_derivatives(f_exp: Callable) -> tuple[Callable, Callable, Callable] | None:
+    """Returns partial derivatives (d/dt, d/dk, d/dwidth) of the exponential function f_exp
+    or None if they are not known."""
+
+    if f_exp in (fold_exp_vec, fold_exp_par, fold_exp_f32):
+        return fold_exp_dt, fold_exp_dk, fold_exp_dfwhm
+    elif f_exp in (square_conv_exp_vec, square_conv_exp_par, square_conv_exp_f32):
+        return square_conv_exp_dt, square_conv_exp_dk, square_conv_exp_dwidth
+    return None
+
+
+def lstsq_fit_derivatives(C: np.ndarray, ST: np.ndarray, D: np.ndarray, dCs: Iterable[np.ndarray | None],
+                          alpha: float = 0.0001, w: np.ndarray | None = None, kaufman: bool = False) -> Iterator[np.ndarray | None]:
+    """
+    Derivatives of the fit matrix C @ ST of the variable projection problem, where ST is the solution
+    of the (weighted) ridge regression (C^T W C + alpha I) ST = C^T W D, as calculated by glstsq.
+
+    For each derivative dC of C with respect to a nonlinear parameter, yields the derivative
+    of the fit, d(C ST) = dC ST + C dST, where
+
+        (C^T W C + alpha I) dST = dC^T W (D - C ST) - C^T W dC ST     (Golub-Pereyra)
+
+    The first term on the right side is neglected in the Kaufman approximation. If dC is None, None is yielded.
+
+    C is either matrix (n_t, k) or tensor (n_w, n_t, k), ST is matrix (k, n_w), D is matrix (n_t, n_w),
+    w is None or vector of weights for each time point (n_t,).
+    """
+
+    tensor = C.ndim == 3
+    wc = np.ones(C.shape[-2]) if w is None else w
+
+    if tensor:
+        Cw = C * wc[None, :, None]
+        G = np.matmul(np.transpose(Cw, (0, 2, 1)), C)
+        if alpha != 0:
+            G += alpha * np.eye(C.shape[-1])[None, ...]
+        R = None if kaufman else (D - np.einsum('wtk,kw->tw', C, ST)) * wc[:, None]
+    else:
+        Cw = C * wc[:, None]
+        G = Cw.T.dot(C)
+        if alpha != 0:
+            G.flat[::G.shape[-1] + 1] += alpha
+        G_fac = cho_factor(G)
+        R = None if kaufman else (D - C.dot(ST)) * wc[:, None]
+
+    for dC in dCs:
+        if dC is None:
+            yield None
+            continue
+
+        if tensor:
+            dC = np.broadcast_to(dC, C.shape)
+            E = np.einsum('wtk,kw->tw', dC, ST)  # dC @ ST
+            rhs = -np.einsum('wtk,tw->wk', Cw, E)
+            if not kaufman:
+                rhs += np.einsum('wtk,tw->wk', dC, R)
+            dST = np.linalg.solve(G, rhs[..., None])[..., 0]  # (n_w, k)
+            yield E + np.einsum('wtk,wk->tw', C, dST)
+        else:
+            E = dC.dot(ST)
+            rhs = -Cw.T.dot(E)
+            if not kaufman:
+                rhs += dC.T.dot(R)
+            dST = cho_solve(G_fac, rhs)
+            yield E + C.dot(dST)
+
 # def delayed_fluorescence_decay(t: np.ndarray | float, k_isc: float, k_risc: float, k_singlet: float, f_exp: callable, *f_args) -> np.ndarray | float:
 
 #     K = np.asarray([[-k_singlet - k_isc, k_risc],
@@ -574,12 +1107,142 @@ def double_points(arr):
     new_arr[1::2] = avrg
     return new_arr
 
+def refine_points(arr: np.ndarray, order: int = 1) -> np.ndarray:
+    """Inserts 2^order - 1 equally spaced points between each pair of points of the sorted array in one pass,
+    the result is the same as applying double_points order times. The shape of the output
+    is 2^order * (arr.shape[0] - 1) + 1."""
+    if order <= 0:
+        return arr.copy()
+
+    n = 2 ** order
+    new_arr = np.empty(n * (arr.shape[0] - 1) + 1)
+    new_arr[:-1] = (arr[:-1, None] + (arr[1:] - arr[:-1])[:, None] * (np.arange(n) / n)).ravel()
+    new_arr[-1] = arr[-1]
+    return new_arr
+
+
+# interpolation methods of chirp_correction, the index is passed to the numba kernel
+CHIRP_INTERP_METHODS = ('linear', 'pchip', 'cubic')
+
+
+@njit(fastmath=False)
+def _secant(x: np.ndarray, y: np.ndarray, k: int) -> float:
+    """Slope of y between the nodes k and k + 1, zero for repeated nodes."""
+    h = x[k + 1] - x[k]
+    return (y[k + 1] - y[k]) / h if h != 0 else 0.0
+
+
+@njit(fastmath=False)
+def _hermite_slopes(x: np.ndarray, y: np.ndarray, method: int, d: np.ndarray, work: np.ndarray):
+    """Derivatives d of the cubic Hermite interpolant at the nodes x. Method 1 is monotone PCHIP
+    (same as scipy.interpolate.PchipInterpolator), method 2 is natural cubic spline (the tridiagonal
+    system is solved by Thomas algorithm, work is a buffer of the same shape as x). Intervals of repeated
+    nodes have zero slope, the interpolant is evaluated only on intervals of nonzero width."""
+
+    n = x.shape[0]
+    if n == 2:
+        d[0] = d[1] = _secant(x, y, 0)
+        return
+
+    if method == 1:
+        for k in range(1, n - 1):
+            h0, h1 = x[k] - x[k - 1], x[k + 1] - x[k]
+            m0, m1 = _secant(x, y, k - 1), _secant(x, y, k)
+            if m0 * m1 <= 0:
+                d[k] = 0.0
+            else:
+                w1, w2 = 2 * h1 + h0, h1 + 2 * h0
+                d[k] = (w1 + w2) / (w1 / m0 + w2 / m1)
+
+        # non-centered three point formulas at the edges, shape preserving
+        for k, s in ((0, 1), (n - 1, -1)):
+            h0, h1 = abs(x[k + s] - x[k]), abs(x[k + 2 * s] - x[k + s])
+            m0, m1 = _secant(x, y, min(k, k + s)), _secant(x, y, min(k + s, k + 2 * s))
+            dk = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1) if h0 + h1 != 0 else 0.0
+            if np.sign(dk) != np.sign(m0):
+                dk = 0.0
+            elif np.sign(m0) != np.sign(m1) and abs(dk) > abs(3 * m0):
+                dk = 3 * m0
+            d[k] = dk
+        return
+
+    # natural spline, h_k d_k-1 + 2 (h_k-1 + h_k) d_k + h_k-1 d_k+1 = 3 (h_k m_k-1 + h_k-1 m_k)
+    # forward sweep, work holds the modified upper diagonal
+    m = _secant(x, y, 0)
+    work[0] = 0.5
+    d[0] = 1.5 * m
+    for k in range(1, n - 1):
+        h0, h1 = x[k] - x[k - 1], x[k + 1] - x[k]
+        m0, m = m, _secant(x, y, k)
+        denom = 2 * (h0 + h1) - h1 * work[k - 1]
+        if denom == 0:
+            # both neighbouring intervals have zero width, the equation is 0 = 0
+            work[k] = 0.0
+            d[k] = d[k - 1]
+            continue
+        work[k] = h0 / denom
+        d[k] = (3 * (h1 * m0 + h0 * m) - h1 * d[k - 1]) / denom
+    d[n - 1] = (3 * m - d[n - 2]) / (2 - work[n - 2])
+    for k in range(n - 2, -1, -1):
+        d[k] -= work[k] * d[k + 1]
+
+
+def _chirp_interp(matrix: np.ndarray, times: np.ndarray, mu: np.ndarray, new_times: np.ndarray, method: int,
+                  out: np.ndarray):
+    """Interpolates each column i of the matrix from times - mu[i] to new_times. Matrix and out are passed
+    transposed (columns, times) so that each column is contiguous. Both time axes are increasing, the interval
+    indices are found by a single merge pass for each column. Values outside of the time range are the edge
+    values (as in np.interp)."""
+
+    n_w, n_t = matrix.shape
+    n_new = new_times.shape[0]
+
+    for i in prange(n_w):
+        y = matrix[i]
+        d = np.empty(n_t)
+        if method > 0:
+            _hermite_slopes(times, y, method, d, np.empty(n_t))
+
+        j = 0
+        for k in range(n_new):
+            x = new_times[k] + mu[i]  # position on the original time axis
+            if x <= times[0]:
+                out[i, k] = y[0]
+                continue
+            if x >= times[n_t - 1]:
+                out[i, k] = y[n_t - 1]
+                continue
+
+            # times[j] <= x < times[j + 1] as in np.interp, at repeated times the last value is used
+            while times[j + 1] <= x:
+                j += 1
+
+            h = times[j + 1] - times[j]
+            s = (x - times[j]) / h
+            if method == 0:
+                out[i, k] = y[j] + s * (y[j + 1] - y[j])
+            else:
+                s2 = s * s
+                s3 = s2 * s
+                out[i, k] = ((2 * s3 - 3 * s2 + 1) * y[j] + (s3 - 2 * s2 + s) * h * d[j] +
+                             (3 * s2 - 2 * s3) * y[j + 1] + (s3 - s2) * h * d[j + 1])
+
+
+# serial and multi-threaded variants of the same kernel, only one of them is cached, the on-disk cache
+# is keyed by the python function and does not distinguish the parallel option
+_chirp_interp_serial = njit(fastmath=False, cache=True)(_chirp_interp)
+_chirp_interp_par = njit(parallel=True, fastmath=False)(_chirp_interp)
+
+
 def chirp_correction(matrix: np.ndarray, times: np.ndarray, mu: np.ndarray | float,
-                    t_smooth_order=1) -> tuple[np.ndarray, np.ndarray]:
+                    t_smooth_order=1, method: str = 'linear', parallel: bool = False) -> tuple[np.ndarray, np.ndarray]:
     """
-    Performs the chirp correction of the data array. Modifies the original data.
+    Performs the chirp correction of the data array. Returns new matrix and times.
     mu is array defining time zero. The time dimension of data will be cropped to [-offset_before_zero:].
     t_smooth_order is the number of doubling of original time points. if 0, no doubling is performed.
+    method is the interpolation of each wavelength, 'linear', 'pchip' (monotone cubic) or 'cubic'
+    (natural spline), all columns are interpolated by one compiled kernel, multi-threaded if parallel is True.
+    NaN values spread to the whole column for cubic methods.
     """
 
     if not isinstance(mu, np.ndarray):
@@ -591,32 +1254,31 @@ def chirp_correction(matrix: np.ndarray, times: np.ndarray, mu: np.ndarray | flo
     
     assert offset >= 0
 
-    new_times = times.copy() - np.min(mu)
+    if method not in CHIRP_INTERP_METHODS:
+        raise ValueError(f"Interpolation method has to be one of {CHIRP_INTERP_METHODS}.")
 
-    # perform doubling of time points
-    for i in range(t_smooth_order):
-        new_times = double_points(new_times)
+    new_times = refine_points(times - np.min(mu), t_smooth_order)
+    new_D = np.empty((matrix.shape[1], new_times.shape[0]), dtype=np.float64)
 
-    new_D = np.empty((new_times.shape[0], matrix.shape[1]), dtype=np.float64)
+    kernel = _chirp_interp_par if parallel else _chirp_interp_serial
+    kernel(np.ascontiguousarray(matrix.T, dtype=np.float64), np.asarray(times, dtype=np.float64),
+           np.asarray(mu, dtype=np.float64), new_times, CHIRP_INTERP_METHODS.index(method), new_D)
 
-    for i in range(matrix.shape[1]):
-        # linear interpolation for each wavelength
-        new_D[:, i] = np.interp(new_times, times - mu[i], matrix[:, i])
+    return np.ascontiguousarray(new_D.T), new_times
 
-    return new_D, new_times
 
-
-
-def fi(array: np.ndarray, values: int | float | list[float | int]) -> int | list[int]:
+def fi(array: np.ndarray, values: int | float | list[float | int]) -> int | np.ndarray:
+    """Indexes of the nearest values in the sorted array, all values are searched at once by np.searchsorted."""
     if not is_iterable(values):
         return _find_nearest_idx(array, values)
 
-    result = []
-
-    for val in values:
-        result.append(_find_nearest_idx(array, val))
+    values = np.asarray(values, dtype=np.float64)
+    idx = np.searchsorted(array, values, side="left")
+    left = array[np.maximum(idx - 1, 0)]
+    right = array[np.minimum(idx, array.shape[0] - 1)]
+    use_left = (idx > 0) & ((idx == array.shape[0]) | (np.abs(values - left) < np.abs(values - right)))
 
-    return np.asarray(result)
+    return np.where(use_left, idx - 1, idx)
 
 
 def find_nearest(array, value):
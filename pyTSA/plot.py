@@ -530,13 +530,16 @@ def whittaker_smooth(trace: np.ndarray, lam: float = 1e3):
 def plot_spectra_ax(ax, D, times, wavelengths, selected_times: list | None = [0, 50, 100], linspace: tuple | None = None, mu=None, hatched_wls=(None, None), z_unit=dA_unit, D_mul_factor=1.0,
                     legend_spacing=0.05, colors=None, lw=1.5, w_lim=None,  darkens_factor_cmap=1, cmap='cet_rainbow4', columnspacing=2, x_minor_locator=AutoMinorLocator(10), x_major_locator=None,
                     legend_loc='lower right', legend_ncol=2, bbox_to_anchor=None, ylim=None, label_prefix='', t_unit='ps', t_unit1e3='ns', smooth_data_whittaker=False, whittaker_lam=1e3,
-                      plot_chirp_corrected=True, legend_fontsize=12, normalize=False, **kwargs):
+                      plot_chirp_corrected=True, legend_fontsize=12, normalize=False, chirp_interp_method='linear',
+                      chirp_parallel=False, **kwargs):
     
     """
     
     use linear range if selected times is None
                 start, stop, number of points
     linspace = (0, 5, 6) => 0, 1, 2, 3, 4, 5
+
+    chirp_interp_method and chirp_parallel are passed to chirp_correction as method and parallel
     """
     
     if linspace is not None:
@@ -546,7 +549,7 @@ def plot_spectra_ax(ax, D, times, wavelengths, selected_times: list | None = [0,
 
     if plot_chirp_corrected:
         assert mu is not None, "chirp is None"
-        _D, times = chirp_correction(_D, times, mu)
+        _D, times = chirp_correction(_D, times, mu, method=chirp_interp_method, parallel=chirp_parallel)
 
     if hatched_wls is not None and hatched_wls[0] is not None:
         cut_idxs = fi(wavelengths, hatched_wls)
@@ -801,8 +804,10 @@ def plot_data_ax(fig, ax, matrix, times, wavelengths, symlog=True, log=False, t_
                  x_minor_locator=AutoMinorLocator(10), x_major_locator=None, n_levels: int | None = 30, plot_countours=True,
                  colorbar_locator=AutoLocator(), colorbarpad=0.04, title='', log_z=False, rasterized=True,
                  diverging_white_cmap_tr=0.98, hatch='/////', colorbar_aspect=35, add_wn_axis=False,
-                 x_label="Wavelength (nm)", plot_chirp_corrected=False, mu=None, draw_chirp=True, **kwargs):
-    """data is individual dataset"""
+                 x_label="Wavelength (nm)", plot_chirp_corrected=False, mu=None, draw_chirp=True,
+                 chirp_interp_method='linear', chirp_parallel=False, **kwargs):
+    """data is individual dataset, chirp_interp_method and chirp_parallel are passed to chirp_correction
+    as method and parallel"""
 
     # assert type(data) == Data
 
@@ -810,7 +815,7 @@ def plot_data_ax(fig, ax, matrix, times, wavelengths, symlog=True, log=False, t_
     
     if plot_chirp_corrected:
         assert mu is not None, "chirp is None"
-        D, times = chirp_correction(D, times, mu)
+        D, times = chirp_correction(D, times, mu, method=chirp_interp_method, parallel=chirp_parallel)
 
     if hatched_wls[0] is not None:
         idx1, idx2 = fi(wavelengths, hatched_wls)
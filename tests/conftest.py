@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pyTSA import Dataset, FirstOrderModel
+
+
+# parameters used to simulate the synthetic dataset
+TRUE_PARAMS = {'t0': 0.2, 't0_mul_1': 0.3, 't0_lam_1': -0.004, 't0_mul_2': 0.5, 't0_lam_2': 0.01,
+               'irf_FWHM_1': 0.2, 'tau_1': 0.8, 'tau_2': 12, 'tau_3': 300}
+
+
+def set_params(model: FirstOrderModel, perturbation: float = 1.1):
+    """Sets model parameters to the true values, lifetimes are multiplied by perturbation."""
+    for name, value in TRUE_PARAMS.items():
+        model.params[name].value = value * perturbation if name.startswith('tau') else value
+
+
+@pytest.fixture
+def synthetic_dataset() -> Dataset:
+    """Three component first order data with chirp and gaussian IRF, 120 times x 40 wavelengths."""
+
+    rng = np.random.default_rng(0)
+    t = np.concatenate([np.linspace(-2, 5, 60), np.logspace(np.log10(5.1), 3, 60)])
+    w = np.linspace(400, 700, 40)
+
+    m = FirstOrderModel(None, n_species=3)
+    m.include_irf = True
+    m.include_chirp = True
+    m.dataset = Dataset(np.zeros((t.shape[0], w.shape[0])), t, w)
+    m._update_params()
+    set_params(m, 1)
+    m.calculate_C_profiles(m.params, t)
+
+    ST = np.vstack([np.sin(w / 40 + i) for i in range(3)])
+    D = np.einsum('wtk,kw->tw', m.C_opt, ST) + rng.normal(0, 1e-3, (t.shape[0], w.shape[0]))
+    return Dataset(D, t, w, name='synthetic')
+
+
+@pytest.fixture
+def model(synthetic_dataset) -> FirstOrderModel:
+    m = FirstOrderModel(synthetic_dataset, n_species=3, set_model=True)
+    m.include_irf = True
+    m.include_chirp = True
+    m._update_params()
+    set_params(m)
+    m.fitter_kwds['verbose'] = 0
+    return m
@@ -0,0 +1,95 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from backend.backend import BackendSession
+from backend.jobs import TabBusyError
+
+
+@pytest.fixture
+def session(synthetic_dataset):
+    session = BackendSession(None)
+    session.datasets.append(synthetic_dataset)
+    for tab_index in range(2):
+        session.add_dataset(0, tab_index)
+        session.set_model(tab_index, 'first_order')
+    return session
+
+
+def blocking_fit(model, release: threading.Event, started: threading.Event):
+    def fit(warm_start=False, iter_cb=None):
+        started.set()
+        release.wait(10)
+        model.simulate()
+    model.fit = fit
+
+
+def test_running_fit_does_not_hold_session_lock(session):
+    release, started = threading.Event(), threading.Event()
+    blocking_fit(session.tabs[0].model, release, started)
+
+    with session.lock:
+        job_id = session.submit_fit(0)['job_id']
+    assert started.wait(10)
+
+    # another request thread can take the session lock while the fit runs
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(session.lock.acquire(blocking=False)))
+    thread.start()
+    thread.join()
+    assert acquired == [True]
+
+    # other tab can be changed, the fitted one not
+    session.update_model_options(1, n_species=2)
+    for call in (lambda: session.update_model_options(0, n_species=2), lambda: session.simulate_model(0),
+                 lambda: session.perform_operation('crop', 0, t0=0), lambda: session.submit_fit(0)):
+        with pytest.raises(TabBusyError):
+            call()
+
+    release.set()
+    session.jobs.get(job_id)._thread.join(10)
+    state = session.get_job(job_id)
+    assert state['status'] == 'finished'
+    assert 'Dfit' in state['result']['matrices']
+
+    # the tab is usable again
+    session.update_model_options(0, n_species=2)
+
+
+def test_busy_tab_returns_409(session, monkeypatch):
+    flask_app = pytest.importorskip('backend.__main__')
+    monkeypatch.setitem(flask_app.sessions.sessions, 'default', session)
+    client = flask_app.app.test_client()
+
+    release, started = threading.Event(), threading.Event()
+    blocking_fit(session.tabs[0].model, release, started)
+    response = client.post('/api/fit_model_async/0')
+    assert response.status_code == 201
+    job_id = json.loads(response.data)['job_id']
+    assert started.wait(10)
+
+    assert client.post('/api/update_model_options/0', json=dict(n_species=2)).status_code == 409
+    assert client.post('/api/fit_model_async/0').status_code == 409
+    assert client.post('/api/update_model_options/1', json=dict(n_species=2)).status_code == 201
+    assert client.get(f'/api/jobs/{job_id}').status_code == 200
+
+    release.set()
+    session.jobs.get(job_id)._thread.join(10)
+    assert client.post('/api/update_model_options/0', json=dict(n_species=2)).status_code == 201
+
+
+def test_fit_job_result(session):
+    model = session.tabs[0].model
+    model.fitter_kwds['verbose'] = 0
+    model.fitter_kwds['max_nfev'] = 3
+
+    job_id = session.submit_fit(0)['job_id']
+    job = session.jobs.get(job_id)
+    job._thread.join(60)
+
+    state = session.get_job(job_id)
+    assert state['status'] == 'finished', state['error']
+    assert state['iteration'] > 0 and np.isfinite(state['cost'])
+    assert set(state['params']) == set(model.params)
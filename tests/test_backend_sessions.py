@@ -0,0 +1,96 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.sessions import SessionManager, session_memory
+
+
+@pytest.fixture
+def manager():
+    return SessionManager(None, idle_timeout=10, eviction_interval=1e9)
+
+
+def test_sessions_are_separate(manager, synthetic_dataset):
+    a, b = manager.get('a'), manager.get('b')
+    assert manager.get('a') is a and manager.get(None) is manager.get('default')
+
+    a.datasets.append(synthetic_dataset)
+    assert a.datasets.length() == 1 and b.datasets.length() == 0
+    assert session_memory(a) >= synthetic_dataset.matrix.nbytes and session_memory(b) == 0
+
+
+def test_idle_eviction(manager):
+    a, b = manager.get('a'), manager.get('b')
+    a.last_access -= 20
+    b.last_access -= 20
+
+    # sessions with a request in progress (lock held by other thread) or a running fit job are kept
+    locked, release = threading.Event(), threading.Event()
+
+    def handle_request():
+        with a.lock:
+            locked.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=handle_request)
+    thread.start()
+    locked.wait(10)
+    b.jobs.jobs['job'] = type('Job', (), {'done': False})()
+    try:
+        manager.evict()
+        assert set(manager.sessions) == {'a', 'b'}
+    finally:
+        release.set()
+        thread.join()
+
+    b.jobs.jobs['job'].done = True
+    manager.evict()
+    assert manager.sessions == {}
+
+
+def test_memory_eviction(manager, synthetic_dataset):
+    for i, name in enumerate(['old', 'new']):
+        session = manager.get(name)
+        session.datasets.append(synthetic_dataset.copy())
+        session.last_access = i + 1e12  # not idle
+
+    manager.max_memory = session_memory(manager.sessions['new']) + 1
+    manager.evict()
+    assert list(manager.sessions) == ['new']
+
+
+def test_close(manager):
+    session = manager.get('a')
+    assert manager.close('a') and not manager.close('a')
+    assert manager.get('a') is not session
+
+
+def test_changed_arrays_only(synthetic_dataset):
+    session = SessionManager(None).get()
+    session.datasets.append(synthetic_dataset)
+    session.add_dataset(0, 0)
+
+    data = session.perform_operation('crop', 0, t0=0)['data']
+    version = data['version']
+    assert {'times', 'matrix'} <= set(data['datasets'][0])
+
+    data = session.perform_operation('dimension_multiply', 0, since=version, z=2)['data']
+    assert 'matrix' in data['datasets'][0] and 'times' not in data['datasets'][0]
+    assert 'wavelengths' not in data['datasets'][0] and data['version'] > version
+
+    data = session.perform_operation('crop', 0, since=data['version'], w0=0)['data']
+    assert not {'times', 'wavelengths'} & set(data['datasets'][0])
+    np.testing.assert_array_equal(session.tabs[0][0].matrix, 2 * synthetic_dataset.matrix[synthetic_dataset.times >= 0])
+
+
+def test_session_in_use_is_not_evicted(manager):
+    with manager.use('a') as a:
+        # request has the session but did not take its lock yet
+        a.last_access -= 20
+        manager.evict()
+        assert manager.sessions == {'a': a}
+
+    a.last_access -= 20
+    manager.evict()
+    assert manager.sessions == {}
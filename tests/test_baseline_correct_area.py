@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from pyTSA import Dataset
+from pyTSA.mathfuncs import _find_nearest_idx, fi
+
+
+def test_fi():
+    rng = np.random.default_rng(7)
+    array = np.sort(rng.uniform(-5, 100, 200))
+    # values out of range, exact array values and midpoints (ties)
+    values = np.concatenate([rng.uniform(-10, 110, 500), array[::7], (array[1:] + array[:-1])[::5] / 2, [-np.inf, np.inf]])
+
+    np.testing.assert_array_equal(fi(array, values), [_find_nearest_idx(array, v) for v in values])
+    np.testing.assert_array_equal(fi(array, list(values[:10])), [_find_nearest_idx(array, v) for v in values[:10]])
+    assert fi(array, 50.0) == _find_nearest_idx(array, 50.0)
+
+
+def reference(d: Dataset, wls_vals, time_vals, t0=None):
+    """Original per-wavelength loop."""
+    from scipy.interpolate import interp1d
+    matrix = d.matrix.copy()
+    t_idx_start = fi(d.times, t0) if t0 is not None else 0
+    mu = interp1d(wls_vals, time_vals, kind='linear', fill_value='extrapolate')(d.wavelengths)
+    t_idx_ends = np.maximum(np.asarray([_find_nearest_idx(d.times, m) for m in mu]), t_idx_start)
+    for i in range(len(d.wavelengths)):
+        matrix[:, i] -= matrix[t_idx_start:t_idx_ends[i] + 1, i].mean()
+    return matrix
+
+
+@pytest.mark.parametrize('block_size', [None, 1, 5])
+@pytest.mark.parametrize('t0', [None, -0.5])
+def test_baseline_correct_area(tmp_path, block_size, t0):
+    rng = np.random.default_rng(8)
+    t = np.linspace(-1, 10, 40)
+    w = np.linspace(400, 600, 30)
+    d = Dataset(rng.normal(size=(t.shape[0], w.shape[0])), t, w)
+    d.block_size = block_size
+    wls_vals, time_vals = [450, 550], [0.5, 3]  # extrapolated outside of the range, ends before t0 for some wavelengths
+
+    expected = reference(d, wls_vals, time_vals, t0)
+    d.baseline_correct_area(wls_vals, time_vals, t0)
+
+    np.testing.assert_allclose(d.matrix, expected, rtol=1e-12, atol=1e-14)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from pyTSA.mathfuncs import blstsq
+
+
+def reference(A, B, alpha, w=None):
+    """Original numpy implementation, weights are applied as W^1/2 scaling of the rows."""
+    if w is not None:
+        A = A * np.sqrt(w)[None, :, None]
+    Bw = B if w is None else B * np.sqrt(w)[None, :]
+    AT = np.transpose(A, (0, 2, 1))
+    ATA = AT @ A + alpha * np.eye(A.shape[-1])[None, ...]
+    X = np.linalg.solve(ATA, AT @ Bw[..., None])
+    return X[..., 0].T
+
+
+@pytest.fixture
+def system():
+    rng = np.random.default_rng(3)
+    L, M, N = 20, 50, 4
+    return rng.normal(size=(L, M, N)), rng.normal(size=(L, M)), rng.uniform(0.5, 2, M)
+
+
+@pytest.mark.parametrize('alpha', [0, 1e-3, 1])
+@pytest.mark.parametrize('weighted', [False, True])
+def test_blstsq(system, alpha, weighted):
+    A, B, w = system
+    w = w if weighted else None
+
+    X, fit = blstsq(A, B, alpha, w)
+
+    np.testing.assert_allclose(X, reference(A, B, alpha, w), rtol=1e-8, atol=1e-12)
+    np.testing.assert_allclose(fit, np.einsum('lmn,nl->ml', A, X), rtol=1e-10, atol=1e-12)
+
+
+def test_blstsq_rank_deficient(system):
+    A, B, _ = system
+    # the last column is a combination of the first two, the column with zeros is singular for alpha=0
+    A = np.concatenate([A, A[..., :1] - 2 * A[..., 1:2], np.zeros_like(A[..., :1])], axis=2)
+
+    X, fit = blstsq(A, B, alpha=0)
+
+    assert np.isfinite(X).all() and np.isfinite(fit).all()
+    np.testing.assert_array_equal(X[-2:], 0)
+    # least squares fit is unique even if the coefficients are not
+    for l in range(A.shape[0]):
+        x, *_ = np.linalg.lstsq(A[l], B[l], rcond=None)
+        np.testing.assert_allclose(fit[:, l], A[l] @ x, rtol=1e-8, atol=1e-10)
+
+
+@pytest.mark.parametrize('singular', [False, True])
+@pytest.mark.parametrize('weighted', [False, True])
+def test_blstsq_vs_lstsq_per_column(system, weighted, singular):
+    A, B, w = system
+    if singular:
+        A = np.concatenate([A, np.zeros_like(A[..., :1])], axis=2)
+    w = w if weighted else None
+    sw = np.ones(A.shape[1]) if w is None else np.sqrt(w)
+
+    X, fit = blstsq(A, B, alpha=0, w=w)
+
+    n = A.shape[2] - 1 if singular else A.shape[2]
+    for l in range(A.shape[0]):
+        x, *_ = np.linalg.lstsq(A[l, :, :n] * sw[:, None], B[l] * sw, rcond=None)
+        np.testing.assert_allclose(X[:n, l], x, rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(fit[:, l], A[l, :, :n] @ x, rtol=1e-8, atol=1e-10)
+    if singular:
+        np.testing.assert_array_equal(X[-1], 0)
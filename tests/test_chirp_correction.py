@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy.interpolate import CubicSpline, PchipInterpolator
+
+from pyTSA.mathfuncs import chirp_correction, double_points
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(1)
+    times = np.concatenate([np.linspace(-1, 2, 40), np.logspace(np.log10(2.2), 2, 30)])
+    wavelengths = np.linspace(400, 600, 25)
+    mu = 0.2 + 1e-5 * (wavelengths - 500) ** 2
+    matrix = rng.normal(size=(times.shape[0], wavelengths.shape[0]))
+    return matrix, times, mu
+
+
+def reference(matrix, times, mu, t_smooth_order, method):
+    """Chirp correction of the original implementation, column by column."""
+    new_times = times - np.min(mu)
+    for _ in range(t_smooth_order):
+        new_times = double_points(new_times)
+
+    new_D = np.empty((new_times.shape[0], matrix.shape[1]))
+    for i in range(matrix.shape[1]):
+        x = times - mu[i]
+        if method == 'linear':
+            new_D[:, i] = np.interp(new_times, x, matrix[:, i])
+        else:
+            spline = PchipInterpolator(x, matrix[:, i]) if method == 'pchip' else CubicSpline(x, matrix[:, i], bc_type='natural')
+            # values outside of the time range are the edge values
+            new_D[:, i] = spline(np.clip(new_times, x[0], x[-1]))
+    return new_D, new_times
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+@pytest.mark.parametrize('method', ['linear', 'pchip', 'cubic'])
+@pytest.mark.parametrize('t_smooth_order', [0, 1])
+def test_chirp_correction(data, method, parallel, t_smooth_order):
+    matrix, times, mu = data
+    D, new_times = chirp_correction(matrix, times, mu, t_smooth_order, method=method, parallel=parallel)
+    D_ref, times_ref = reference(matrix, times, mu, t_smooth_order, method)
+
+    np.testing.assert_allclose(new_times, times_ref)
+    np.testing.assert_allclose(D, D_ref, rtol=1e-10, atol=1e-12)
+
+
+def test_chirp_correction_scalar_mu(data):
+    matrix, times, _ = data
+    D, new_times = chirp_correction(matrix, times, 0.3)
+
+    assert D is matrix
+    np.testing.assert_allclose(new_times, times - 0.3)
+
+
+def test_chirp_correction_invalid_method(data):
+    with pytest.raises(ValueError):
+        chirp_correction(*data, method='quadratic')
+
+
+@pytest.mark.parametrize('method', ['linear', 'pchip', 'cubic'])
+def test_chirp_correction_repeated_times(data, method):
+    matrix, times, mu = data
+    times = np.sort(np.concatenate([times, times[[5, 20, 20, 50]]]))
+    matrix = np.random.default_rng(2).normal(size=(times.shape[0], matrix.shape[1]))
+
+    D, new_times = chirp_correction(matrix, times, mu, method=method)
+
+    assert np.isfinite(D).all()
+    if method == 'linear':
+        np.testing.assert_allclose(D, reference(matrix, times, mu, 1, method)[0], rtol=1e-10, atol=1e-12)
+    elif method == 'pchip':
+        # monotone interpolant does not overshoot the data
+        assert np.abs(D).max() <= np.abs(matrix).max()
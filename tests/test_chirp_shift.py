@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from pyTSA.mathfuncs import exp_dist, exp_dist_shifted, fold_exp_vec, quantize_shifts, square_conv_exp_vec
+
+
+def test_quantize_shifts():
+    mu = np.linspace(-0.3, 0.7, 200)
+    levels, index, dmu = quantize_shifts(mu, 0.05)
+
+    np.testing.assert_allclose(levels[index] + dmu, mu, atol=1e-15)
+    assert np.abs(dmu).max() <= 0.025 + 1e-12
+    assert levels.shape[0] == 21
+
+
+@pytest.mark.parametrize('f_exp', [fold_exp_vec, square_conv_exp_vec])
+@pytest.mark.parametrize('tol', [1e-2, 1e-3])
+def test_exp_dist_shifted_vs_exact(f_exp, tol):
+    t = np.concatenate([np.linspace(-1, 5, 120), np.logspace(np.log10(5.1), 3, 50)])
+    k = np.asarray([3.0, 0.5, 0.02])
+    b = np.asarray([0.0, 0.3, 0.0])
+    width = 0.2
+    mu = 0.1 + 0.05 * np.linspace(-1, 1, 300) ** 2
+
+    C = exp_dist(f_exp, t, k, width, b, mu).reshape(mu.shape[0], t.shape[0], -1)
+    C_shifted = exp_dist_shifted(f_exp, t, k, width, b, mu, tol)
+
+    if f_exp is fold_exp_vec:
+        # second derivative is bounded by ~ 4 k / width^2 for the fastest decay
+        bound = tol ** 2 / 8 * 4 * k.max() / width ** 2
+    else:
+        # first derivative jumps by 1 / width at the edges of the pulse, the error is first order there
+        bound = tol / 2 / width
+    assert C_shifted.shape == C.shape
+    assert np.abs(C_shifted - C).max() < bound
+
+
+def test_exp_dist_shifted_falls_back():
+    t = np.linspace(-1, 5, 50)
+    k = np.asarray([1.0, 0.1])
+    mu = np.linspace(0, 0.1, 10)
+
+    # levels are not shared, exact evaluation is used
+    np.testing.assert_array_equal(exp_dist_shifted(fold_exp_vec, t, k, 0.2, None, mu, 1e-6),
+                                  exp_dist(fold_exp_vec, t, k, 0.2, None, mu))
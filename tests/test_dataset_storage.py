@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from pyTSA import Dataset
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(4)
+    t = np.linspace(-1, 10, 30)
+    w = np.linspace(400, 500, 12)
+    return rng.normal(size=(t.shape[0], w.shape[0])), t, w
+
+
+def test_caller_matrix_is_copied(arrays):
+    matrix, t, w = arrays
+    original = matrix.copy()
+    d = Dataset(matrix, t, w)
+
+    matrix[:] = 0  # changes of the caller's array do not change the dataset
+    np.testing.assert_array_equal(d.matrix, original)
+
+    d.dimension_multiply(z=2)
+    d.restore_original_data()
+    d.matrix[0, 0] = 1
+    np.testing.assert_array_equal(matrix, 0)
+
+
+def test_npy_matrix_is_shared(arrays, tmp_path):
+    matrix, t, w = arrays
+    Dataset(matrix, t, w, name='data').save_npy(str(tmp_path / 'data'))
+
+    d = Dataset.from_npy(str(tmp_path / 'data'))
+    assert isinstance(d.matrix, np.memmap) and d.matrix is d.matrix_o
+    assert not d.matrix.flags.writeable
+
+    d.baseline_correct(-1, 0)
+    d.dimension_multiply(z=2)
+    assert d.matrix.flags.writeable and not np.shares_memory(d.matrix, d.matrix_o)
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'data' / 'matrix.npy')), matrix)
+
+    d.undo()
+    expected = Dataset(matrix, t, w)
+    expected.baseline_correct(-1, 0)
+    np.testing.assert_array_equal(d.matrix, expected.matrix)
+    d.restore_original_data()
+    assert d.matrix is d.matrix_o
+    np.testing.assert_array_equal(d.matrix, matrix)
+
+
+def test_copy_is_independent(arrays):
+    d = Dataset(*arrays)
+    c = d.copy()
+
+    c.dimension_multiply(z=3)
+    np.testing.assert_array_equal(d.matrix, arrays[0])
+    np.testing.assert_array_equal(c.matrix, 3 * arrays[0])
+
+    d.dimension_multiply(z=2)
+    np.testing.assert_array_equal(c.matrix, 3 * arrays[0])
+    c.restore_original_data()
+    np.testing.assert_array_equal(c.matrix, arrays[0])
+
+
+def test_out_of_core_copy(arrays, tmp_path):
+    matrix, t, w = arrays
+    Dataset(matrix, t, w, name='data').save_npy(str(tmp_path / 'data'))
+    d = Dataset.from_npy(str(tmp_path / 'data'), out_of_core=True, block_size=7)
+    d.dimension_multiply(z=2)
+
+    c = d.copy()
+    assert isinstance(c.matrix, np.memmap) and c.matrix is c.matrix_o
+
+    d.dimension_multiply(z=2)
+    c.dimension_multiply(z=3)
+    np.testing.assert_allclose(d.matrix, 4 * matrix)
+    np.testing.assert_allclose(c.matrix, 6 * matrix)
+    c.restore_original_data()
+    np.testing.assert_allclose(c.matrix, 2 * matrix)
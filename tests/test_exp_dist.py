@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from scipy.integrate import quad
+
+from pyTSA.mathfuncs import adaptive_hermite_nodes_count, exp_dist, fold_exp_vec, square_conv_exp_vec, N_HERM
+
+
+def reference(t: np.ndarray, k: float, b: float) -> np.ndarray:
+    """Exponential decay with log-normal distribution of rates integrated by adaptive quadrature."""
+    def integrand(x, s):
+        with np.errstate(over='ignore'):  # rates of far nodes overflow, their contribution is zero
+            return np.exp(-k * np.exp(np.sqrt(2) * b * x) * s - x * x) / np.sqrt(np.pi)
+    return np.asarray([quad(integrand, -np.inf, np.inf, args=(s,), epsabs=1e-15, epsrel=1e-13, limit=400)[0]
+                       for s in t])
+
+
+@pytest.mark.parametrize('b, tol', [(0.1, 1e-12), (0.3, 1e-12), (0.7, 1e-11), (1.0, 1e-8), (1.5, 1e-6)])
+def test_adaptive_nodes_error(b, tol):
+    t = np.logspace(-3, 4, 60)
+    x, w = np.polynomial.hermite.hermgauss(adaptive_hermite_nodes_count(b))
+    C = (w[:, None] * np.exp(-np.exp(np.sqrt(2) * b * x)[:, None] * t[None, :])).sum(0) / np.sqrt(np.pi)
+
+    assert np.abs(C - reference(t, 1.0, b)).max() < tol
+
+
+@pytest.mark.parametrize('f_exp', [fold_exp_vec, square_conv_exp_vec])
+def test_exp_dist_adaptive_vs_fixed_nodes(f_exp):
+    t = np.concatenate([np.linspace(-1, 5, 100), np.logspace(np.log10(5.1), 3, 50)])
+    k = np.asarray([2.0, 0.3, 0.05])
+    b = np.asarray([0.0, 0.4, 0.6])
+
+    C = exp_dist(f_exp, t, k, 0.2, b)
+    C_fixed = exp_dist(f_exp, t, k, 0.2, b, n_nodes=N_HERM)  # number of nodes used before
+
+    np.testing.assert_allclose(C, C_fixed, rtol=0, atol=1e-8)
+    np.testing.assert_array_equal(C[..., 0], f_exp(t, k[0], 0.2))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from pyTSA.fileio import load_matrix
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(2)
+    t = np.linspace(-1, 10, 15)
+    w = np.linspace(400, 500, 6)
+    return t, w, rng.normal(size=(t.shape[0], w.shape[0]))
+
+
+def write(path, t, w, mat, delimiter='\t', corner='0', header_lines=()):
+    lines = list(header_lines)
+    lines.append(delimiter.join([corner] + [repr(float(x)) for x in w]))
+    lines.extend(delimiter.join([repr(float(t[i]))] + [repr(float(x)) for x in mat[i]]) for i in range(t.shape[0]))
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def reference(fname, **kwargs):
+    """Original loader of Dataset.from_file."""
+    data = np.genfromtxt(fname, dtype=np.float64, filling_values=np.nan, **kwargs)
+    return data[1:, 0], data[0, 1:], data[1:, 1:]
+
+
+def assert_loaded(loaded, expected):
+    for a, b in zip(loaded, expected):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('delimiter', ['\t', ',', ';', ' '])
+def test_delimiters(tmp_path, matrix, delimiter):
+    fname = write(tmp_path / 'data.txt', *matrix, delimiter=delimiter)
+    assert_loaded(load_matrix(fname), matrix)
+    assert_loaded(load_matrix(fname), reference(fname, delimiter=None if delimiter == ' ' else delimiter))
+
+
+def test_transpose(tmp_path, matrix):
+    t, w, mat = matrix
+    fname = write(tmp_path / 'data.txt', t, w, mat)
+    assert_loaded(load_matrix(fname, transpose=True), (w, t, mat.T))
+
+
+def test_missing_values(tmp_path, matrix):
+    t, w, mat = matrix
+    fname = write(tmp_path / 'data.txt', t, w, mat, delimiter=',', corner='')
+    text = (tmp_path / 'data.txt').read_text().splitlines()
+    text[3] = ','.join(text[3].split(',')[:3] + ['', *text[3].split(',')[4:]])
+    (tmp_path / 'data.txt').write_text('\n'.join(text))
+
+    loaded = load_matrix(fname)
+    assert np.isnan(loaded[2][2, 2])
+    assert_loaded(loaded, reference(fname, delimiter=','))
+
+
+def test_comments_and_title(tmp_path, matrix):
+    fname = write(tmp_path / 'data.txt', *matrix, header_lines=['# comment', '', 'Sample in toluene'])
+    assert_loaded(load_matrix(fname), matrix)
+
+
+def test_skip_header(tmp_path, matrix):
+    fname = write(tmp_path / 'data.txt', *matrix, header_lines=['Sample measured at 298 K', '2024-01-01'])
+    assert_loaded(load_matrix(fname, skip_header=2), matrix)
+    # genfromtxt path with the same skipped lines
+    assert_loaded(load_matrix(fname, skip_header=2, filling_values=0.0), matrix)
+    assert_loaded(load_matrix(fname, skip_header=2, dtype=np.float32), [x.astype(np.float32) for x in matrix])
+
+
+def test_no_data(tmp_path):
+    (tmp_path / 'data.txt').write_text('# only comment\n')
+    with pytest.raises(ValueError):
+        load_matrix(str(tmp_path / 'data.txt'))
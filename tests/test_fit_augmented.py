@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from lmfit import Parameters
+
+from pyTSA import Datasets, FirstOrderModel
+
+from conftest import set_params
+
+
+def make_datasets(dataset, n=2, nan=False) -> Datasets:
+    ds = Datasets()
+    for i in range(n):
+        d = dataset.copy()
+        if nan:
+            d.matrix[3 + i, 5] = np.nan
+        m = FirstOrderModel(d, n_species=3, set_model=True)
+        m.include_irf = True
+        m.include_chirp = True
+        m._update_params()
+        set_params(m)
+        ds.append(d)
+    ds.fitter_kwds['verbose'] = 0
+    return ds
+
+
+@pytest.mark.parametrize('use_jac_sparsity', [True, False])
+def test_fit_with_nan_in_data(synthetic_dataset, use_jac_sparsity):
+    ds = make_datasets(synthetic_dataset, nan=True)
+    ds.use_jac_sparsity = use_jac_sparsity
+
+    result = ds.fit_augmented(global_param_names=['tau_1', 'tau_2', 'tau_3'])
+
+    assert result.success
+    assert result.params['tau_2'].value == pytest.approx(12, rel=1e-2)
+
+
+def test_block_jacobian_matches_dense(synthetic_dataset):
+    results = []
+    for use_jac_sparsity in (True, False):
+        ds = make_datasets(synthetic_dataset)
+        ds.use_jac_sparsity = use_jac_sparsity
+        results.append(ds.fit_augmented(global_param_names=['tau_1', 'tau_2', 'tau_3']))
+
+    for name in ('tau_1', 'tau_2', 'tau_3'):
+        assert results[0].params[name].value == pytest.approx(results[1].params[name].value, rel=1e-6)
+
+
+def test_block_jacobian_follows_constraints(synthetic_dataset):
+    # tau_3 is constrained by the parameter log_tau_3 which is not a parameter of any model
+    ds = make_datasets(synthetic_dataset)
+    global_params = Parameters()
+    global_params.add('log_tau_3', value=2, min=0, max=4)
+    global_params.add('tau_3', expr='10 ** log_tau_3')
+
+    result = ds.fit_augmented(global_params=global_params)
+
+    assert result.params['log_tau_3'].value == pytest.approx(np.log10(300), abs=1e-2)
+    assert result.params['log_tau_3'].stderr is not None
+
+
+@pytest.mark.parametrize('executor_type', ['THREAD', 'PROCESS'])
+def test_concurrent_residuals_match_serial(synthetic_dataset, executor_type):
+    results = []
+    for executor in ('SERIAL', executor_type):
+        ds = make_datasets(synthetic_dataset, n=3)
+        ds.executor_type = executor
+        ds.n_workers = 2
+        ds.fitter_kwds['max_nfev'] = 5
+        results.append(ds.fit_augmented(global_param_names=['tau_1', 'tau_2', 'tau_3']))
+
+    np.testing.assert_array_equal(results[0].residual, results[1].residual)
+    assert results[0].nfev == results[1].nfev
+
+
+def test_grouped_params_are_mapped_to_models(synthetic_dataset):
+    ds = make_datasets(synthetic_dataset, n=3)
+    ds.fitter_kwds['max_nfev'] = 20
+
+    result = ds.fit_augmented(global_param_names=['tau_1', 'tau_2'], group_params={'tau_3': ((0, 1),)})
+
+    assert 'tau_3_01' in result.params and 'tau_3_2' in result.params and 'tau_3_0' not in result.params
+    for i, name, aug_name in ((0, 'tau_3', 'tau_3_01'), (1, 'tau_3', 'tau_3_01'), (2, 'tau_3', 'tau_3_2'),
+                              (2, 'tau_2', 'tau_2'), (2, 'irf_FWHM_1', 'irf_FWHM_1_2')):
+        par = ds[i].model.params[name]
+        assert par.value == result.params[aug_name].value
+        assert par.stderr == result.params[aug_name].stderr
+
+
+def test_block_jacobian_reuses_last_residuals(synthetic_dataset):
+    ds = make_datasets(synthetic_dataset)
+    ds.fitter_kwds['max_nfev'] = 10
+    # parameters of all datasets at each evaluation of the residuals, datasets are simulated in order
+    current, evaluated = [None, None], []
+
+    for i, d in enumerate(ds):
+        def recording_simulate(params=None, i=i, model=d.model, simulate=d.model.simulate):
+            current[i] = np.array(model.get_param_vector(params).array)
+            if i == len(current) - 1:
+                evaluated.append(np.concatenate(current))
+            return simulate(params)
+        d.model.simulate = recording_simulate
+
+    ds.fit_augmented(global_param_names=['tau_1', 'tau_2', 'tau_3'])
+    evaluated = evaluated[:-1]  # models are simulated once more after the fit
+
+    # the Jacobian does not evaluate again the residuals the fitter has just evaluated
+    assert len(evaluated) > 3
+    assert not any(np.array_equal(a, b) for a, b in zip(evaluated[:-1], evaluated[1:]))
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pytest
+from lmfit import Parameters
+
+from backend.jobs import JobManager, TabBusyError
+
+
+def fake_fit(n_iter: int, step: threading.Event | None = None):
+    """Target calling iter_cb as lmfit does, stops when iter_cb returns True."""
+    def target(iter_cb):
+        params = Parameters()
+        params.add('tau', value=1.0)
+        for i in range(n_iter):
+            if step is not None:
+                step.wait(10)
+            if iter_cb(params, i + 1, np.full(4, 1.0 / (i + 1))):
+                return 'aborted'
+        return 'result'
+    return target
+
+
+def test_job_finishes():
+    job = JobManager().submit(fake_fit(3), 0)
+    states = list(job.events(min_interval=0))
+
+    assert states[-1]['status'] == 'finished' and states[-1]['result'] == 'result'
+    assert states[-1]['iteration'] == 3 and states[-1]['cost'] == pytest.approx(0.5 * 4 / 9)
+    assert states[-1]['params'] == {'tau': 1.0}
+
+
+def test_job_cancel():
+    step = threading.Event()
+    jobs = JobManager()
+    job = jobs.submit(fake_fit(100, step), 0)
+
+    with pytest.raises(TabBusyError):
+        jobs.submit(fake_fit(1), 0)
+    other = jobs.submit(fake_fit(1), 1)  # other tab
+
+    jobs.cancel(job.id)
+    step.set()
+    job._thread.join(10)
+    other._thread.join(10)
+
+    assert job.state()['status'] == 'cancelled' and job.state()['iteration'] == 1
+    assert other.state()['status'] == 'finished'
+    assert jobs.submit(fake_fit(1), 0).id != job.id
+
+
+def test_job_failure():
+    def target(iter_cb):
+        raise ValueError('fit failed')
+
+    job = JobManager().submit(target, 0)
+    job._thread.join(10)
+
+    state = job.state()
+    assert state['status'] == 'failed' and 'fit failed' in state['error'] and state['result'] is None
+
+
+def test_finished_jobs_are_removed():
+    jobs = JobManager(max_finished=2)
+    ids = []
+    for _ in range(4):
+        job = jobs.submit(fake_fit(1), 0)
+        job._thread.join(10)
+        ids.append(job.id)
+
+    assert jobs.get(ids[0]) is None and all(jobs.get(i) is not None for i in ids[-2:])
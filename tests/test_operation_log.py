@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from pyTSA import Dataset
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(10)
+    t = np.linspace(-2, 20, 60)
+    w = np.linspace(400, 600, 41)
+    return Dataset(rng.normal(size=(t.shape[0], w.shape[0])), t, w)
+
+
+def process(d: Dataset):
+    d.crop(t0=-1, w1=580)
+    d.reduce(2, 1)
+    d.remove_scan(5)
+    d.baseline_correct(-1, 0)
+    d.remove_trace(450)
+    d.dimension_multiply(z=3)
+    return d
+
+
+def reference(d: Dataset):
+    """The same operations applied eagerly to copies of the arrays."""
+    t, w, D = d.times.copy(), d.wavelengths.copy(), d.matrix.copy()
+    rows, cols = (t >= t[np.abs(t + 1).argmin()]), (w <= w[np.abs(w - 580).argmin()])
+    t, w, D = t[rows], w[cols], D[rows][:, cols]
+    t, D = t[::2], D[::2]
+    keep = np.arange(t.shape[0]) != np.abs(t - 5).argmin()
+    t, D = t[keep], D[keep]
+    D = D - D[np.abs(t + 1).argmin():np.abs(t).argmin() + 2].mean(axis=0)  # end index as in baseline_correct
+    keep = np.arange(w.shape[0]) != np.abs(w - 450).argmin()
+    return t, w[keep], 3 * D[:, keep]
+
+
+def test_lazy_selection(dataset):
+    t, w, D = reference(dataset)
+    process(dataset)
+
+    np.testing.assert_array_equal(dataset.times, t)
+    np.testing.assert_array_equal(dataset.wavelengths, w)
+    np.testing.assert_allclose(dataset.matrix, D, rtol=1e-12, atol=1e-14)
+
+
+def test_evenly_spaced_selection_is_view(dataset):
+    full = dataset.matrix
+    dataset.crop(t0=0, w0=450)
+    dataset.reduce(3, 2)
+    assert np.shares_memory(dataset.matrix, full)
+    original = dataset.matrix_o[np.abs(dataset.times_o).argmin()::3, np.abs(dataset.wavelengths_o - 450).argmin()::2]
+    np.testing.assert_array_equal(dataset.matrix, original)
+
+
+def test_replay(dataset, tmp_path):
+    other = Dataset(dataset.matrix.copy(), dataset.times.copy(), dataset.wavelengths.copy())
+    process(dataset)
+
+    fname = str(tmp_path / 'operations.json')
+    dataset.save_operations(fname)
+    other.replay(fname)
+
+    assert other.operations == dataset.operations
+    np.testing.assert_array_equal(other.times, dataset.times)
+    np.testing.assert_array_equal(other.matrix, dataset.matrix)
+
+    with pytest.raises(ValueError):
+        other.replay([dict(op='restore_original_data')])
+
+
+def test_undo(dataset):
+    process(dataset)
+    times = dataset.times.copy()
+    matrix = dataset.matrix.copy()
+
+    dataset.transpose()
+    dataset.dimension_multiply(z=2)
+    dataset.undo(2)
+
+    np.testing.assert_array_equal(dataset.times, times)
+    np.testing.assert_allclose(dataset.matrix, matrix, rtol=1e-12)
+    assert [op['op'] for op in dataset.operations][-1] == 'dimension_multiply'
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyTSA import Dataset, FirstOrderModel
+from pyTSA.mathfuncs import lstsq
+
+from conftest import TRUE_PARAMS
+
+
+def process(d: Dataset):
+    d.baseline_correct(-2, -1)
+    d.crop(t0=-1.5)
+    d.dimension_multiply(z=2)
+    d.baseline_correct_area([400, 700], [-1, -0.5])
+    return d
+
+
+def test_out_of_core_processing(synthetic_dataset, tmp_path):
+    dirpath = str(tmp_path / 'data')
+    synthetic_dataset.save_npy(dirpath)
+    files = set(os.listdir(dirpath))
+
+    d = process(Dataset.from_npy(dirpath, out_of_core=True, block_size=7))
+    expected = process(synthetic_dataset.copy())
+
+    # modified matrix is memory-mapped to an anonymous temporary file, the stored matrix is not changed
+    assert isinstance(d.matrix, np.memmap) and set(os.listdir(dirpath)) == files
+    np.testing.assert_array_equal(np.load(os.path.join(dirpath, 'matrix.npy')), synthetic_dataset.matrix)
+    np.testing.assert_allclose(d.matrix, expected.matrix, rtol=1e-12, atol=1e-14)
+    np.testing.assert_array_equal(d.times, expected.times)
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_blocked_lstsq(weighted):
+    rng = np.random.default_rng(11)
+    A, B = rng.normal(size=(50, 4)), rng.normal(size=(50, 9))
+    w = rng.uniform(0.5, 2, 50) if weighted else None
+
+    np.testing.assert_allclose(lstsq(A, B, 1e-4, w, block_size=6), lstsq(A, B, 1e-4, w), rtol=1e-10, atol=1e-13)
+
+
+@pytest.mark.parametrize('include_chirp', [False, True])
+def test_out_of_core_model(synthetic_dataset, tmp_path, include_chirp):
+    dirpath = str(tmp_path / 'data')
+    synthetic_dataset.save_npy(dirpath)
+
+    fits = []
+    for d in (synthetic_dataset, Dataset.from_npy(dirpath, out_of_core=True, block_size=16)):
+        m = FirstOrderModel(d, n_species=3, set_model=True)
+        m.include_irf = True
+        m.include_chirp = include_chirp  # without chirp, the spectra are fitted by blocked lstsq
+        m._update_params()
+        for name, par in m.params.items():
+            par.value = TRUE_PARAMS.get(name, par.value)
+        m.simulate()
+        fits.append(m.matrix_opt)
+
+    np.testing.assert_allclose(fits[1], fits[0], rtol=1e-10, atol=1e-12)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from lmfit import Parameters
+
+from pyTSA import ParameterLayout, ParameterVector, SingletFissionModel
+
+
+def make_params() -> Parameters:
+    params = Parameters()
+    params.add('tau_1', value=1.0)
+    params.add('tau_2', value=10.0)
+    params.add('tau_3', value=100.0)
+    params.add('ratio', expr='tau_2 / tau_1')
+    return params
+
+
+def test_layout_is_shared():
+    assert ParameterLayout.from_names(('a', 'b')) is ParameterLayout.from_names(('a', 'b'))
+    vector = ParameterVector(make_params())
+    np.testing.assert_array_equal(vector.layout.block('tau_', 2, 2), [1, 2])
+
+
+def test_values_and_constraints():
+    params = make_params()
+    vector = ParameterVector(params)
+
+    assert list(vector) == list(params.keys())
+    assert vector.valuesdict() == pytest.approx(params.valuesdict())
+
+    vector.set_values(np.asarray([2.0, 30.0]), np.asarray([0, 1]))
+
+    assert vector['tau_1'].value == 2.0
+    assert vector['ratio'].value == pytest.approx(15.0)
+    np.testing.assert_array_equal(vector.block('tau_', 3), [2.0, 30.0, 100.0])
+
+
+def test_simulate_with_vector_matches_parameters(model):
+    model.simulate()
+    matrix = model.matrix_opt.copy()
+
+    model.simulate(ParameterVector(model.params))
+
+    np.testing.assert_array_equal(model.matrix_opt, matrix)
+
+
+def test_named_values():
+    vector = ParameterVector(make_params())
+    np.testing.assert_array_equal(vector.take('tau_3', 'tau_1'), [100.0, 1.0])
+    assert vector.layout.indexes(('tau_3', 'tau_1')) is vector.layout.indexes(('tau_3', 'tau_1'))
+
+
+@pytest.mark.parametrize('name', ['t0', 't0_mul_1', 't0_lam_1', 't0_mul_2', 't0_lam_2'])
+def test_mu_derivative(model, name):
+    h = 1e-6
+    params = model.params.copy()
+    mu = model.get_mu(params)
+    params[name].value += h
+
+    np.testing.assert_allclose(model.get_mu_derivative(name, ParameterVector(model.params)),
+                               (model.get_mu(params) - mu) / h, rtol=1e-4, atol=1e-8)
+
+
+def test_target_params_of_hand_written_models():
+    model = SingletFissionModel()
+    model._update_params()
+    tau_hot, tau_TT, tau_S1, alpha = (model.params[name].value for name in ('tau_S1_hot', 'tau_TT', 'tau_S1', 'alpha_S1_hot_TT'))
+
+    j, K = model.target_params(model.params)
+
+    np.testing.assert_array_equal(j, [1, 0, 0, 0])
+    np.testing.assert_allclose(K[:, 0], [-1 / tau_hot, (1 - alpha) / tau_hot, alpha / tau_hot, 0])
+    np.testing.assert_allclose(np.diag(K), [-1 / tau_hot, -1 / tau_S1, -1 / tau_TT, 0])
@@ -0,0 +1,41 @@
+from pyTSA.kineticmodel.kineticmodel import KernelBackend
+
+
+def test_repeated_simulate_hits_cache(model):
+    for _ in range(3):
+        model.simulate()
+
+    info = model.profile_cache_info()
+    assert info['kinetic'].hits == 2
+    assert info['kinetic'].misses == 1
+
+
+def test_disabled_blocks_are_not_cached(model):
+    model.simulate()
+
+    info = model.profile_cache_info()
+    assert 'artifacts' not in info
+    assert 'DOAS' not in info
+
+
+def test_option_change_misses_cache(model):
+    model.simulate()
+    C = model.C_opt.copy()
+
+    model.kernel_backend = KernelBackend.PARALLEL
+    model.simulate()
+    assert model.profile_cache_info()['kinetic'].misses == 2
+    assert abs(model.C_opt - C).max() < 1e-12
+
+
+def test_param_change_misses_cache(model):
+    tau = model.params['tau_2'].value
+    model.simulate()
+    model.params['tau_2'].value = 2 * tau
+    model.simulate()
+    model.params['tau_2'].value = tau
+    model.simulate()
+
+    info = model.profile_cache_info()
+    assert info['kinetic'].misses == 2
+    assert info['kinetic'].hits == 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backend.backend import BackendSession, parse_matrix_data, json2arr
+from backend.transport import pack_frame, unpack_frame
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(9)
+    matrix = rng.normal(size=(30, 20))
+    return {'c': matrix, 'f': np.asfortranarray(matrix), 't': matrix.T, 'v': rng.normal(size=7),
+            'i': np.arange(12, dtype=np.int32).reshape(3, 4), 'empty': np.empty((0, 5))}
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_round_trip(arrays, compression):
+    meta = dict(names=['a', 'b'], version=3)
+    unpacked, unpacked_meta = unpack_frame(pack_frame(arrays, meta, compression=compression, level=1))
+
+    assert unpacked_meta == meta
+    assert list(unpacked) == list(arrays)
+    for name, arr in arrays.items():
+        assert unpacked[name].dtype == arr.dtype
+        np.testing.assert_array_equal(unpacked[name], arr)
+
+
+def test_float32(arrays):
+    unpacked, _ = unpack_frame(pack_frame(arrays, dtype='float32'))
+
+    assert unpacked['c'].dtype == np.float32 and unpacked['i'].dtype == np.int32
+    np.testing.assert_array_equal(unpacked['t'], arrays['t'].astype(np.float32))
+
+
+def test_invalid_frames(arrays):
+    with pytest.raises(ValueError):
+        pack_frame(arrays, compression='lzma')
+    with pytest.raises(ValueError):
+        unpack_frame(b'JSON' + pack_frame(arrays)[4:])
+
+
+def test_datasets_json_and_binary(synthetic_dataset):
+    session = BackendSession(None)
+    session.post_datasets_frame(pack_frame({'0/matrix': synthetic_dataset.matrix, '0/times': synthetic_dataset.times,
+                                            '0/wavelengths': synthetic_dataset.wavelengths}, dict(names=['d'])))
+    d = session.datasets[0]
+    np.testing.assert_array_equal(d.matrix, synthetic_dataset.matrix)
+
+    data = session.get_datasets(session.datasets)['data']['datasets'][0]
+    arrays, meta = unpack_frame(session.get_datasets(session.datasets, dict(dtype=None, compression='zlib', level=1)))
+
+    np.testing.assert_array_equal(parse_matrix_data(data['matrix']), arrays['0/matrix'])
+    np.testing.assert_array_equal(json2arr(data['times']), arrays['0/times'])
+    assert meta['datasets'] == [dict(uid=d.uid, version=d.version)] and meta['names'] == ['d']
+
+
+def test_fit_matrices_json_and_binary(model):
+    model.simulate()
+    session = BackendSession(None)
+
+    data = session._put_fit_matrices(model, params=model.params)
+    arrays, meta = unpack_frame(session._put_fit_matrices(model, dict(dtype=None, compression=None, level=None),
+                                                          model.params))
+
+    assert set(data['matrices']) | {'chirpData'} == set(arrays)
+    for name, obj in data['matrices'].items():
+        np.testing.assert_array_equal(parse_matrix_data(obj), arrays[name])
+    np.testing.assert_array_equal(json2arr(data['chirpData']), arrays['chirpData'].ravel())
+    assert meta['params'] == data['params']
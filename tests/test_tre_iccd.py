@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from pyTSA.fileio import load_TRE_ICCD
+
+
+NW, NS = 8, 5
+
+
+@pytest.fixture
+def tre_file(tmp_path):
+    """TRE ICCD file, 10 accumulations and 0.5 s exposure in the name, exposure time of spectra 1 and 3 is missing."""
+    rng = np.random.default_rng(5)
+    lines = []
+    for i in range(NS):
+        exposure = '' if i in (1, 3) else str(0.2 * (i + 1))
+        for j in range(NW):
+            row = ['0', '1', '2', '3', repr(float(rng.integers(0, 1000))), repr(400.0 + 5 * j), '6', '7', '8',
+                   exposure, repr(10.0 * i)]
+            lines.append(','.join(row))
+    path = tmp_path / 'sample_10acc_0.5exp.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def reference(fname, nw):
+    """Original parser of Dataset.load_TRE_ICCD with detector width nw."""
+    data = np.genfromtxt(fname, delimiter=',', dtype=np.float64, usecols=(4, 5, 9, 10))
+    ns = int(data.shape[0] / nw)
+    times = np.empty(ns)
+    D = np.empty((ns, nw))
+    acc, exp_time = 10, 0.5
+    for i in range(ns):
+        exp_time_from_data = data[i * nw, -2]
+        exp_time = exp_time if np.isnan(exp_time_from_data) else exp_time_from_data
+        times[i] = data[i * nw, -1]
+        D[i, :] = data[i * nw:(i + 1) * nw, 0] / (exp_time * acc)
+    return times, data[:nw, 1], D
+
+
+@pytest.mark.parametrize('nw', [None, NW])
+@pytest.mark.parametrize('chunk_size', [1, 2, 256])
+def test_load_TRE_ICCD(tre_file, nw, chunk_size):
+    loaded = load_TRE_ICCD(tre_file, nw=nw, chunk_size=chunk_size)
+    for a, b in zip(loaded, reference(tre_file, NW)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_load_TRE_ICCD_out(tre_file, tmp_path):
+    times, wavelengths, D = load_TRE_ICCD(tre_file, out=str(tmp_path / 'matrix.npy'), chunk_size=2)
+    assert isinstance(D, np.memmap)
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'matrix.npy')), reference(tre_file, NW)[2])
+
+    with pytest.raises(ValueError):
+        load_TRE_ICCD(tre_file, out=np.empty((NS + 1, NW)))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 256])
+def test_load_TRE_ICCD_extra_lines(tre_file, tmp_path, chunk_size):
+    # comments, blank lines and an incomplete last spectrum are not counted as spectra
+    with open(tre_file) as f:
+        lines = f.read().splitlines()
+    lines = ['# header'] + lines[:NW + 3] + ['', '   '] + lines[NW + 3:] + lines[:NW // 2] + [''] * (2 * NW)
+    path = tmp_path / 'extra_10acc_0.5exp.csv'
+    path.write_text('\n'.join(lines) + '\n')
+
+    loaded = load_TRE_ICCD(str(path), chunk_size=chunk_size)
+    for a, b in zip(loaded, reference(tre_file, NW)):
+        np.testing.assert_array_equal(a, b)
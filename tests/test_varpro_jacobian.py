@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from pyTSA.kineticmodel.kineticmodel import JacobianType, KernelBackend, ResidualType
+
+from conftest import TRUE_PARAMS
+
+
+def finite_difference_C(model, name):
+    model.simulate()
+    # the analytic derivatives are disabled, C profiles are differentiated numerically
+    model.C_profiles_derivative = lambda name, params=None: None
+    try:
+        return model.C_full_derivative(name)
+    finally:
+        del model.C_profiles_derivative
+
+
+@pytest.mark.parametrize('name', ['tau_2', 't0', 'irf_FWHM_1'])
+@pytest.mark.parametrize('backend', list(KernelBackend))
+def test_C_derivative(model, name, backend):
+    model.simulate()
+    dC = model.C_full_derivative(name)  # analytic, float64 kernels
+    scale = np.abs(dC).max()
+
+    model.kernel_backend = backend
+    dC_fd = finite_difference_C(model, name)
+
+    # forward differences are accurate to sqrt(eps) of the kernel precision
+    tol = 2e-3 if backend is KernelBackend.PARALLEL_FLOAT32 else 1e-6
+    assert np.abs(dC_fd - dC).max() < tol * scale
+
+
+@pytest.mark.parametrize('jacobian_type', [JacobianType.KAUFMAN, JacobianType.GOLUB_PEREYRA])
+def test_jacobian_numerical(model, jacobian_type):
+    model.residual_type = ResidualType.VARPRO_QR
+    model.jacobian_type = jacobian_type
+
+    J = model.jacobian()
+    J_num = model._numerical_jacobian(model.projected_residuals, model.params, '3-point', None)
+
+    scale = np.linalg.norm(J_num, axis=0)
+    error = np.linalg.norm(J - J_num, axis=0) / scale
+    # Kaufman approximation neglects a term which is small near the optimum
+    assert error.max() < (0.1 if jacobian_type is JacobianType.KAUFMAN else 1e-3)
+
+
+def test_jacobian_of_full_residuals(model):
+    # full residuals are equal to the projected ones at the linear least squares solution, so is the Jacobian
+    model.jacobian_type = JacobianType.GOLUB_PEREYRA
+    J = model.jacobian()
+    J_num = model._numerical_jacobian(model.residuals, model.params, '3-point', None)
+
+    error = np.linalg.norm(J - J_num, axis=0) / np.linalg.norm(J_num, axis=0)
+    assert error.max() < 1e-3
+
+
+def test_fit_with_analytic_jacobian(model):
+    model.residual_type = ResidualType.VARPRO_QR
+    model.jacobian_type = JacobianType.KAUFMAN
+    model.fit()
+
+    for name in ('tau_1', 'tau_2', 'tau_3'):
+        assert model.params[name].value == pytest.approx(TRUE_PARAMS[name], rel=0.02)
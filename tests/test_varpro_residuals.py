@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from pyTSA.mathfuncs import glstsq, varpro_residuals
+from pyTSA.kineticmodel.kineticmodel import ResidualType
+
+
+@pytest.mark.parametrize('method', ['qr', 'svd'])
+@pytest.mark.parametrize('tensor', [False, True])
+@pytest.mark.parametrize('weighted', [False, True])
+def test_varpro_residuals(method, tensor, weighted):
+    rng = np.random.default_rng(12)
+    n_t, n_w, k = 60, 15, 3
+    C = rng.normal(size=(n_w, n_t, k) if tensor else (n_t, k))
+    D = rng.normal(size=(n_t, n_w))
+    w = rng.uniform(0.5, 2, n_t) if weighted else None
+
+    _, fit = glstsq(C, D, 1e-4, w)
+    R = varpro_residuals(C, D, 1e-4, w, method)
+
+    np.testing.assert_allclose(R.reshape(D.shape), D - fit.reshape(D.shape), rtol=1e-8, atol=1e-10)
+
+
+@pytest.mark.parametrize('residual_type', [ResidualType.VARPRO_QR, ResidualType.VARPRO_SVD])
+def test_projected_residuals(model, residual_type):
+    model.residual_type = residual_type
+    R_full = model.residuals(model.params)
+    R = model.projected_residuals(model.params)
+
+    np.testing.assert_allclose(np.ravel(R), np.ravel(R_full), rtol=1e-6, atol=1e-9)
+
+
+def test_fit_projected(model):
+    model.residual_type = ResidualType.VARPRO_QR
+    model.fit()
+    params = model.params.valuesdict()
+    matrix_opt = model.matrix_opt
+
+    assert matrix_opt is not None  # the fit matrix is calculated once after the fit
+    model.residual_type = ResidualType.FULL
+    model.fit()
+    for name, value in model.params.valuesdict().items():
+        assert params[name] == pytest.approx(value, rel=1e-4, abs=1e-6)
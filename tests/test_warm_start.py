@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pyTSA.kineticmodel.kineticmodel import ResidualType
+
+
+@pytest.mark.parametrize('residual_type', [ResidualType.FULL, ResidualType.VARPRO_QR])
+def test_warm_start_after_crop(model, residual_type):
+    model.residual_type = residual_type
+    model.fit()
+    model.dataset.crop(t0=-1)
+    model.fit(warm_start=True)  # the stored Jacobian has more rows than the new residuals
+
+    assert model.fit_result.success
+    assert model.params['tau_2'].value == pytest.approx(12, rel=0.05)
+
+
+def test_warm_start_after_nan(model):
+    model.fit()
+    model.dataset.matrix[10:20, 5] = np.nan
+    model.fit(warm_start=True)
+
+    assert model.fit_result.success
+
+
+def test_warm_start_uses_last_jacobian(model):
+    model.fit()
+    fun = model.residuals
+    kwds = model._warm_start_kwds(model._get_fitter_kwds(), fun)
+    assert callable(kwds['jac'])
+    np.testing.assert_array_equal(kwds['jac'](model.params), model.fit_result.jac)
+
+    model.residual_type = ResidualType.VARPRO_QR
+    assert model._warm_start_kwds({}, model.projected_residuals) == {}
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from pyTSA import WeightType
+
+
+@pytest.mark.parametrize('shape, separable', [((), True), ((120, 1), True), ((1, 40), True), ((40,), True),
+                                              ((120, 40), False)])
+def test_noise_floor_weights(model, shape, separable):
+    rng = np.random.default_rng(1)
+    model.weight_type = WeightType.PROP_NOISE_FLOOR
+    model.weighting_noise_floor = rng.uniform(1e-3, 1e-2, shape) if shape else 5e-3
+    model.add_weight(500, 600, 2)
+
+    assert (model.get_weights_separable() is not None) == separable
+    np.testing.assert_allclose(model.get_weights(), model._calc_weights(), rtol=1e-14)
+
+
+def test_weights_follow_in_place_data_changes(model):
+    model.weight_type = WeightType.PROP_THRESH
+    model.calc_weights_from_fit_matrix = False
+    weights = model.get_weights().copy()
+
+    model.dataset.matrix[5, 3] = -model.dataset.matrix[5, 3] + 1
+    model.dataset.matrix[6, 3] = np.nan
+
+    assert not np.array_equal(model.get_weights(), weights, equal_nan=True)
+    np.testing.assert_array_equal(model.get_weights(), model._calc_weights())
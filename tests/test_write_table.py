@@ -0,0 +1,82 @@
+import io
+
+import numpy as np
+import pytest
+
+from pyTSA import Dataset
+from pyTSA.fileio import load_matrix, write_table
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(6)
+    t = np.linspace(-1, 10, 23)
+    w = np.linspace(400, 500, 7)
+    d = Dataset(rng.normal(size=(t.shape[0], w.shape[0])), t, w, filepath=str(tmp_path / 'data.txt'))
+    return d
+
+
+def reference_text(D, row_labels, header, delimiter='\t', header_lines=()):
+    """Text written by the original save_matrix and save_to_GTA."""
+    mat = np.vstack((row_labels, D.T))
+    buffer = ''.join(line + '\n' for line in header_lines)
+    buffer += delimiter + delimiter.join(f"{num}" for num in header) + '\n'
+    buffer += '\n'.join(delimiter.join(f"{num}" for num in row) for row in mat.T)
+    return buffer
+
+
+@pytest.mark.parametrize('transpose', [False, True])
+def test_save_matrix(dataset, tmp_path, transpose):
+    fname = str(tmp_path / 'matrix.txt')
+    dataset.save_matrix(fname, transpose=transpose, precision=None)
+
+    D, labels, header = ((dataset.matrix, dataset.times, dataset.wavelengths) if transpose else
+                         (dataset.matrix.T, dataset.wavelengths, dataset.times))
+    with open(fname, encoding='utf8') as f:
+        assert f.read().rstrip('\n') == reference_text(D, labels, header)
+
+    # default precision round-trips exactly
+    dataset.save_matrix(fname, transpose=transpose)
+    t, w, mat = load_matrix(fname, transpose=not transpose)
+    np.testing.assert_array_equal(mat, dataset.matrix)
+    np.testing.assert_array_equal(t, dataset.times)
+    np.testing.assert_array_equal(w, dataset.wavelengths)
+
+
+def test_save_to_GTA(dataset, tmp_path):
+    fname = str(tmp_path / 'data.ascii')
+    dataset.save_to_GTA(fname, t0=0, w1=450, precision=None)
+
+    t_slice, w_slice = dataset._crop_indexes(0, None, None, 450)
+    times, wavelengths = dataset.times[t_slice], dataset.wavelengths[w_slice]
+    header_lines = ['Header', 'Original filename: fname', 'Time explicit', f'intervalnr {times.shape[0]}']
+    expected = reference_text(dataset.matrix[t_slice, w_slice].T, wavelengths, times, header_lines=header_lines)
+    with open(fname, encoding='utf8') as f:
+        assert f.read().rstrip('\n') == expected
+
+
+@pytest.mark.parametrize('ext', ['.npy', '.npz'])
+def test_save_matrix_binary(dataset, tmp_path, ext):
+    fname = str(tmp_path / f'matrix{ext}')
+    dataset.save_matrix(fname, transpose=True)
+
+    if ext == '.npy':
+        table = np.load(fname)
+        np.testing.assert_array_equal(table[1:, 1:], dataset.matrix)
+        np.testing.assert_array_equal(table[1:, 0], dataset.times)
+        np.testing.assert_array_equal(table[0, 1:], dataset.wavelengths)
+    else:
+        with np.load(fname) as f:
+            np.testing.assert_array_equal(f['data'], dataset.matrix)
+            np.testing.assert_array_equal(f['row_labels'], dataset.times)
+            np.testing.assert_array_equal(f['header'], dataset.wavelengths)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 256])
+def test_write_table_precision(chunk_size):
+    data = np.asarray([[1 / 3, 2e-10], [np.pi, -1e5], [np.nan, 1.0]])
+    f = io.StringIO()
+    write_table(f, data, row_labels=np.asarray([1, 2, 3]), header=['a', 'b'], corner='x', delimiter=',', precision=4,
+                chunk_size=chunk_size)
+
+    assert f.getvalue() == 'x,a,b\n1,0.3333,2e-10\n2,3.142,-1e+05\n3,nan,1\n'